@@ -0,0 +1,483 @@
+"""
+End-to-end analyzer throughput, replayed offline from a trade API cassette.
+
+Measures:
+- analyze_gap: bases/minute and trade requests per base
+- analyze_distribution: wall time per base
+- analyze_items_logic and PriceAnalyzer._extract_modifiers: items/second over
+  every listing in the cassette
+- t1_listing_pass: items/second for what analyze_gap does per fetched magic
+  listing (parse, T1 extraction, _is_t1_magic, price)
+- modifier_memory: bytes held by the extracted modifiers of one 100-item
+  distribution bucket sample, as records and as the dicts they convert to
+- fetch_decode: time to decode one full 10-listing fetch body (with the icon,
+  hash, account and description fields the live site sends) with json and
+  orjson, and the bytes each result keeps alive
+
+Politeness sleeps (between fetch batches, buckets and retries) are skipped so
+the numbers reflect the code, not the configured delays; --latency-ms adds a
+simulated network round trip per request instead.
+
+The default cassette, fixtures/trade/benchmark.jsonl.gz, was recorded from the
+deterministic SyntheticTradeSite below (--regenerate rebuilds it). A cassette
+recorded from the live site with TRADE_RECORD_PATH works too, with --bases and
+--distribution-bases naming what it contains.
+
+    python -m backend.benchmarks.analyzer --output bench.json --compare baseline.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.currency_service import CurrencyService
+from backend.item_index import ItemIndex
+from backend.price_analyzer import PriceAnalyzer
+from backend.trade_replay import Cassette, RecordingTransport, ReplayResponse, ReplayTransport, split_url
+import backend.query_analysis as query_analysis
+import backend.trade_api as trade_api
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CASSETTE = os.path.join(BACKEND_DIR, "fixtures", "trade", "benchmark.jsonl.gz")
+DEFAULT_BASES = ["Gemini Bow", "Expert Dualnaught Bow", "Attuned Wand", "Expert Bombard Crossbow"]
+DEFAULT_DISTRIBUTION_BASES = ["Gemini Bow"]
+
+# (affix name, mod text with {v}, min, max); the first value of each mod decides its tier
+MOD_POOL = [
+    ("Heavy", "{v}% increased Physical Damage", 40, 179),
+    ("Glinting", "Adds {v} to {w} Physical Damage", 4, 30),
+    ("Flaring", "Adds {v} to {w} Fire Damage", 6, 40),
+    ("Frozen", "Adds {v} to {w} Cold Damage", 6, 40),
+    ("Humming", "Adds 1 to {v} Lightning Damage", 20, 60),
+    ("of Skill", "{v}% increased Attack Speed", 5, 28),
+    ("of Accuracy", "+{v} to Accuracy Rating", 50, 400),
+    ("of the Sniper", "+{v}% to Critical Damage Bonus", 10, 39),
+    ("of Incision", "+{v}% to Critical Hit Chance", 1, 5),
+    ("of the Bear", "+{v} to Strength", 5, 33),
+    ("Shocking", "{v}% increased Spell Damage", 25, 109),
+    ("of Ferocity", "+{v} to Level of all Projectile Skills", 1, 5),
+]
+
+
+class SyntheticTradeSite:
+    """
+    Deterministic trade API: every search gets up to `per_search` listings priced
+    at or above its price.min, with rarity from the query and random affixes.
+    Used as a transport (see TradeAPI(transport=...)).
+    """
+
+    def __init__(self, seed=7, per_search=100):
+        self.seed = seed
+        self.per_search = per_search
+        self.listings = {}
+
+    def __call__(self, method, url, **kwargs):
+        path, params = split_url(url, kwargs.get("params"))
+        if path.startswith("search/"):
+            return ReplayResponse(200, self._search(kwargs.get("json") or {}), url=url)
+        ids = path[len("fetch/"):].split(",")
+        return ReplayResponse(200, {"result": [self.listings.get(i) for i in ids]}, url=url)
+
+    def _search(self, payload):
+        query = payload.get("query", {})
+        digest = hashlib.sha1(json.dumps([self.seed, payload], sort_keys=True).encode()).hexdigest()[:12]
+        rng = random.Random(digest)
+        filters = query.get("filters", {})
+        rarity = filters.get("type_filters", {}).get("filters", {}).get("rarity", {}).get("option", "normal")
+        price = filters.get("trade_filters", {}).get("filters", {}).get("price", {})
+        low = float(price.get("min", 1))
+        high = float(price.get("max", low * 50 + 100))
+        base_type = query.get("type") or query.get("term") or "Unknown"
+
+        count = rng.randint(self.per_search // 2, self.per_search)
+        prices = sorted(round(rng.uniform(low, high), 1) for _ in range(count))
+        if (payload.get("sort") or {}).get("price") == "desc":
+            prices.reverse()
+        ids = []
+        for i, amount in enumerate(prices):
+            listing_id = f"{digest}{i:03d}"
+            self.listings[listing_id] = self._listing(rng, listing_id, base_type, rarity, amount)
+            ids.append(listing_id)
+        return {"id": digest, "result": ids, "total": count * 3}
+
+    @staticmethod
+    def _listing(rng, listing_id, base_type, rarity, amount):
+        currency = rng.choice(["exalted", "exalted", "exalted", "chaos", "divine"])
+        if currency == "divine":
+            amount = round(amount / 150, 2) or 0.01
+        mods, texts = [], []
+        if rarity != "normal":
+            for j, (name, template, lo, hi) in enumerate(rng.sample(MOD_POOL, rng.randint(1, 2))):
+                tier = rng.choice([1, 1, 2, 3, 4])
+                span = (hi - lo) / 4
+                t_lo = round(hi - span * tier)
+                t_hi = round(t_lo + span)
+                value = rng.randint(t_lo, max(t_lo, t_hi))
+                prefix = not name.startswith("of ")
+                mods.append({
+                    "name": name,
+                    "tier": f"{'P' if prefix else 'S'}{tier}",
+                    "magnitudes": [{"hash": f"explicit.stat_{j}", "min": t_lo, "max": t_hi}]
+                })
+                texts.append(template.format(v=value, w=value * 2))
+        return {
+            "id": listing_id,
+            "listing": {"price": {"type": "~price", "amount": amount, "currency": currency}},
+            "item": {
+                "baseType": base_type,
+                "typeLine": base_type,
+                "rarity": rarity.capitalize(),
+                "name": "",
+                "ilvl": rng.randint(70, 82),
+                "identified": True,
+                "sockets": [{"group": 0, "type": "rune"} for _ in range(rng.randint(0, 2))],
+                "properties": [{"name": "Quality", "values": [[f"+{rng.randint(0, 20)}%", 1]]}],
+                "explicitMods": texts,
+                "extended": {
+                    "mods": {"explicit": mods},
+                    "prefixes": sum(1 for m in mods if m["tier"].startswith("P")),
+                    "suffixes": sum(1 for m in mods if m["tier"].startswith("S"))
+                }
+            }
+        }
+
+
+_real_sleep = time.sleep
+
+
+@contextmanager
+def no_politeness_delays():
+    time.sleep = lambda seconds: None
+    try:
+        yield
+    finally:
+        time.sleep = _real_sleep
+
+
+class CountingTransport:
+    """Counts requests and adds simulated latency (real sleep, unaffected by no_politeness_delays)."""
+
+    def __init__(self, transport, latency=0.0):
+        self.transport = transport
+        self.latency = latency
+        self.calls = 0
+
+    def __call__(self, method, url, **kwargs):
+        self.calls += 1
+        if self.latency:
+            _real_sleep(self.latency)
+        return self.transport(method, url, **kwargs)
+
+
+@contextmanager
+def using_transport(transport):
+    original = trade_api.default_transport
+    trade_api.default_transport = lambda: transport
+    try:
+        yield
+    finally:
+        trade_api.default_transport = original
+
+
+def regenerate(path, bases, distribution_bases):
+    """Record a fresh cassette from SyntheticTradeSite."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+    recorder = RecordingTransport(path, transport=SyntheticTradeSite())
+    analyzer = PriceAnalyzer(currency_service=CurrencyService())
+    with using_transport(recorder), no_politeness_delays(), quiet():
+        for base in bases:
+            analyzer.analyze_gap(base)
+        for base in distribution_bases:
+            analyzer.analyze_distribution(base)
+    print(f"Recorded {len(Cassette.load(path))} exchanges to {path}")
+
+
+@contextmanager
+def quiet():
+    """The analyzer prints per-item debug lines; keep them out of the timings."""
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        yield
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def cassette_items(cassette):
+    items = []
+    for exchange in cassette.exchanges:
+        if exchange["path"].startswith("fetch/") and isinstance(exchange.get("response"), dict):
+            items.extend(i for i in exchange["response"].get("result") or [] if isinstance(i, dict))
+    return items
+
+
+def bench_gap(cassette, bases, repeat, latency):
+    analyzer = PriceAnalyzer(currency_service=CurrencyService())
+    best, requests_per_base, misses = float("inf"), {}, 0
+    for _ in range(repeat):
+        cassette.reset()
+        elapsed = 0.0
+        misses = 0
+        for base in bases:
+            replay = ReplayTransport(cassette)
+            transport = CountingTransport(replay, latency)
+            with using_transport(transport), no_politeness_delays(), quiet():
+                start = time.perf_counter()
+                analyzer.analyze_gap(base)
+                elapsed += time.perf_counter() - start
+            requests_per_base[base] = transport.calls
+            misses += replay.misses
+        best = min(best, elapsed)
+    return {
+        "bases": len(bases),
+        "seconds": round(best, 4),
+        "bases_per_minute": round(len(bases) * 60 / best, 1),
+        "requests_per_base": round(sum(requests_per_base.values()) / len(bases), 2),
+        "requests_by_base": requests_per_base,
+        # Requests the cassette could not answer: the analyzer's queries drifted from the recording
+        "replay_misses": misses
+    }
+
+
+def bench_distribution(cassette, bases, repeat, latency):
+    analyzer = PriceAnalyzer(currency_service=CurrencyService())
+    results = {}
+    for base in bases:
+        best, calls = float("inf"), 0
+        for _ in range(repeat):
+            cassette.reset()
+            transport = CountingTransport(ReplayTransport(cassette), latency)
+            with using_transport(transport), no_politeness_delays(), quiet():
+                start = time.perf_counter()
+                analyzer.analyze_distribution(base)
+                best = min(best, time.perf_counter() - start)
+            calls = transport.calls
+        results[base] = {"seconds": round(best, 4), "requests": calls}
+    return results
+
+
+def bench_items(items, func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        with quiet():
+            start = time.perf_counter()
+            func(items)
+            best = min(best, time.perf_counter() - start)
+    return {"items": len(items), "seconds": round(best, 4), "items_per_s": round(len(items) / best, 1)}
+
+
+def t1_listing_pass(analyzer):
+    """Per-listing work of analyze_gap's magic search, over a list of fetched listings."""
+    from backend.item_parser import parse_listing
+
+    def run(items):
+        for item in items:
+            listing = parse_listing(item)
+            analyzer._extract_modifiers(listing)
+            analyzer._is_t1_magic(listing)
+            listing.price
+    return run
+
+
+def bench_modifier_memory(items, sample_size=100):
+    """Retained bytes of _extract_all_modifiers output for a sample_size-listing sample (records vs dicts)."""
+    import tracemalloc
+    from backend.records import to_dicts
+
+    analyzer = PriceAnalyzer(currency_service=CurrencyService())
+    sample = [items[i % len(items)] for i in range(sample_size)]
+
+    def retained(build):
+        tracemalloc.start()
+        with quiet():
+            before = tracemalloc.get_traced_memory()[0]
+            held = build()
+            after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return held, after - before
+
+    records, record_bytes = retained(lambda: [analyzer._extract_all_modifiers(i) for i in sample])
+    _, dict_bytes = retained(lambda: [to_dicts(mods) for mods in records])
+    return {
+        "items": sample_size,
+        "modifiers": sum(len(mods) for mods in records),
+        "record_bytes": record_bytes,
+        "dict_bytes": dict_bytes,
+    }
+
+
+def live_listing(listing):
+    """listing padded with the fields a live fetch carries and the analyzer never reads."""
+    listing = json.loads(json.dumps(listing))
+    item = listing["item"]
+    stat_hashes = [[m["magnitudes"][0]["hash"], [i]] for i, m in enumerate(item["extended"]["mods"].get("explicit", []))]
+    listing["listing"].update({
+        "method": "psapi",
+        "indexed": "2026-01-01T00:00:00Z",
+        "stash": {"name": "~price trade", "x": 3, "y": 7},
+        "whisper": "@{0} Hi, I would like to buy your " + item["typeLine"] + " listed for {1} in {2}",
+        "account": {"name": "seller#1234", "online": {"league": "Standard"}, "lastCharacterName": "SomeRanger",
+                    "language": "en_US", "realm": "poe2"},
+    })
+    item.update({
+        "realm": "poe2", "verified": True, "w": 2, "h": 4, "league": "Standard", "frameType": 2,
+        "icon": "https://web.poecdn.com/gen/image/" + "WzI1LDE0LHsiZiI6IjJESXRlbXMvV2VhcG9ucy9Ud29IYW5k" * 4 + "/bow.png",
+        "id": hashlib.sha256(listing["id"].encode()).hexdigest(),
+        "requirements": [{"name": "Level", "values": [["78", 0]], "displayMode": 0, "type": 62},
+                         {"name": "Dex", "values": [["163", 0]], "displayMode": 1, "type": 64}],
+        "descrText": "Place into an allocated Jewel Socket on the Passive Skill Tree. Right click to remove from the Socket.",
+        "flavourText": ["The trees stood tall and proud,\r", "until the arrows found them."],
+    })
+    item["extended"].update({
+        "dps": 212.4, "pdps": 180.1, "edps": 32.3, "dps_aug": True,
+        "hashes": {"explicit": stat_hashes, "implicit": []},
+    })
+    return listing
+
+
+def bench_fetch_decode(items, repeat=200, batch_size=10):
+    """Per-body decode time and retained bytes for one batch_size-listing fetch response."""
+    import tracemalloc
+    from backend.trade_json import orjson
+
+    body = json.dumps({"result": [live_listing(items[i % len(items)]) for i in range(batch_size)]}).encode()
+    decoders = {"json": json.loads}
+    if orjson is not None:
+        decoders["orjson"] = orjson.loads
+
+    results = {"listings": batch_size, "body_bytes": len(body)}
+    for name, decode in decoders.items():
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            decode(body)
+            best = min(best, time.perf_counter() - start)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        held = decode(body)
+        retained = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del held
+        results[name] = {"us": round(best * 1e6, 1), "retained_bytes": retained}
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def throughput_metrics(results):
+    """Flat {metric: value} of the higher-is-better numbers, for comparisons."""
+    metrics = {
+        "analyze_gap.bases_per_minute": results["analyze_gap"]["bases_per_minute"],
+        "analyze_items_logic.items_per_s": results["analyze_items_logic"]["items_per_s"],
+        "extract_modifiers.items_per_s": results["extract_modifiers"]["items_per_s"],
+    }
+    if "t1_listing_pass" in results:
+        metrics["t1_listing_pass.items_per_s"] = results["t1_listing_pass"]["items_per_s"]
+    for base, row in results.get("analyze_distribution", {}).items():
+        metrics[f"analyze_distribution.{base}.runs_per_minute"] = round(60 / row["seconds"], 1) if row["seconds"] else None
+    return metrics
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} ({baseline.get('commit') or 'unknown commit'}):")
+    before, after = throughput_metrics(baseline), throughput_metrics(results)
+    for metric, value in after.items():
+        old = before.get(metric)
+        if old and value:
+            print(f"  {metric:<55} {old:>10} -> {value:>10}  ({(value / old - 1) * 100:+.1f}%)")
+    print(f"  {'analyze_gap.requests_per_base':<55} {baseline['analyze_gap']['requests_per_base']:>10} -> "
+          f"{results['analyze_gap']['requests_per_base']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyzer throughput from an offline trade cassette.")
+    parser.add_argument("--cassette", default=DEFAULT_CASSETTE)
+    parser.add_argument("--bases", nargs="+", default=DEFAULT_BASES)
+    parser.add_argument("--distribution-bases", nargs="*", default=DEFAULT_DISTRIBUTION_BASES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated round trip per trade request")
+    parser.add_argument("--regenerate", action="store_true", help="Re-record --cassette from the synthetic site first")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--compare", help="Earlier --output file to compare against")
+    args = parser.parse_args()
+
+    # Replayed requests do not count against the trade site's limits
+    trade_api._budget = trade_api.RateBudget(rate=0, burst=1)
+
+    if args.regenerate or not os.path.exists(args.cassette):
+        regenerate(args.cassette, args.bases, args.distribution_bases)
+    cassette = Cassette.load(args.cassette)
+    latency = args.latency_ms / 1000.0
+
+    # Categorize against the bundled catalog fixture instead of fetching the live one
+    with open(os.path.join(BACKEND_DIR, "fixtures", "items.json"), encoding="utf-8") as f:
+        index = ItemIndex(json.load(f), version="fixture")
+    query_analysis._analysis_item_index = lambda: index
+
+    items = cassette_items(cassette)
+    analyzer = PriceAnalyzer(currency_service=CurrencyService())
+    extractor = analyzer._extract_modifiers
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "cassette": os.path.relpath(args.cassette, BACKEND_DIR),
+        "exchanges": len(cassette),
+        "latency_ms": args.latency_ms,
+        "analyze_gap": bench_gap(cassette, args.bases, args.repeat, latency),
+        "analyze_distribution": bench_distribution(cassette, args.distribution_bases, args.repeat, latency),
+        "analyze_items_logic": bench_items(items, query_analysis.analyze_items_logic, args.repeat),
+        "extract_modifiers": bench_items(items, lambda rows: [extractor(i) for i in rows], args.repeat),
+        "t1_listing_pass": bench_items(items, t1_listing_pass(analyzer), args.repeat),
+        "modifier_memory": bench_modifier_memory(items),
+        "fetch_decode": bench_fetch_decode(items),
+    }
+
+    gap = results["analyze_gap"]
+    print(f"analyze_gap:          {gap['bases_per_minute']:>10} bases/min  {gap['requests_per_base']} requests/base"
+          f"  {gap['replay_misses']} replay misses")
+    for base, row in results["analyze_distribution"].items():
+        print(f"analyze_distribution: {row['seconds'] * 1000:>10.1f} ms  {row['requests']} requests  ({base})")
+    for name in ("analyze_items_logic", "extract_modifiers", "t1_listing_pass"):
+        row = results[name]
+        print(f"{name + ':':<22}{row['items_per_s']:>11} items/s  ({row['items']} items)")
+    memory = results["modifier_memory"]
+    print(f"{'modifier_memory:':<22}{memory['record_bytes']:>11} bytes as records, {memory['dict_bytes']} as dicts"
+          f"  ({memory['modifiers']} modifiers, {memory['items']} items)")
+
+    decode = results["fetch_decode"]
+    for name in ("json", "orjson"):
+        if name in decode:
+            print(f"{'fetch_decode:':<22}{decode[name]['us']:>11} us/body, {decode[name]['retained_bytes']} bytes kept"
+                  f"  ({name}, {decode['listings']} listings, {decode['body_bytes']} byte body)")
+
+    if args.compare:
+        compare(results, args.compare)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Serialization throughput for a 1,000-analysis /api/db/analyses response.
+
+before: AnalysisResult documents -> to_dict() -> Flask's default JSON provider
+after:  as_pymongo() rows -> analysis_wire() -> FastJSONProvider (orjson when installed)
+
+Runs against an in-memory mongomock database by default, or --uri for a real MongoDB.
+
+    python -m backend.benchmarks.serialization --analyses 1000 --modifiers 40
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from mongoengine import connect, disconnect
+
+from backend.database import AnalysisResult, Modifier, PriceSample
+from backend.serialization import FastJSONProvider, serialize_analyses, orjson
+
+
+def seed(count, modifiers_per_analysis):
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    docs = []
+    for i in range(count):
+        mods = [
+            Modifier(
+                name=f"+# to Stat {rng.randint(1, 200)}",
+                tier=f"{rng.choice('PS')}{rng.randint(1, 8)}",
+                mod_type="explicit",
+                rarity=rng.choice(["normal", "magic"]),
+                item_name=f"Base {i % 50}",
+                display_text=f"+{rng.randint(1, 99)} to Stat",
+                price_ex=round(rng.uniform(1, 500), 2),
+                magnitude_min=1.0,
+                magnitude_max=99.0
+            )
+            for _ in range(modifiers_per_analysis)
+        ]
+        docs.append(AnalysisResult(
+            base_type=f"Base {i % 50}",
+            created_at=now - timedelta(minutes=i),
+            normal_avg_ex=10.0, crafting_avg_ex=12.0, magic_avg_ex=40.0, gap_ex=28.0,
+            modifiers=mods,
+            price_samples=[PriceSample(kind="magic", amount=1.0, currency="divine")],
+            raw_data="x" * 2000
+        ))
+    AnalysisResult.objects.insert(docs, load_bulk=False)
+
+
+def measure(func, repeat):
+    best = float("inf")
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(func())
+        best = min(best, time.perf_counter() - start)
+    return best, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare API serialization paths.")
+    parser.add_argument("--analyses", type=int, default=1000)
+    parser.add_argument("--modifiers", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--uri", help="MongoDB URI (default: in-memory mongomock)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    disconnect()
+    if args.uri:
+        connect(host=args.uri)
+    else:
+        import mongomock
+        connect("serialization_benchmark", mongo_client_class=mongomock.MongoClient)
+
+    AnalysisResult.objects.delete()
+    seed(args.analyses, args.modifiers)
+    queryset = AnalysisResult.objects.order_by("-created_at").limit(args.analyses)
+
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    fast_provider = FastJSONProvider(app)
+
+    def before():
+        data = [a.to_dict() for a in queryset.clone()]
+        return default_provider.dumps({"success": True, "data": data, "count": len(data)}).encode("utf-8")
+
+    def after():
+        data = serialize_analyses(queryset.clone())
+        return fast_provider.dumps_bytes({"success": True, "data": data, "count": len(data)})
+
+    results = {"analyses": args.analyses, "modifiers": args.modifiers, "encoder": "orjson" if orjson else "json"}
+    for name, func in (("before", before), ("after", after)):
+        seconds, size = measure(func, args.repeat)
+        results[name] = {
+            "seconds": round(seconds, 4),
+            "analyses_per_s": round(args.analyses / seconds, 1),
+            "bytes": size
+        }
+        print(f"{name:>6}: {seconds * 1000:8.1f} ms  {args.analyses / seconds:10.1f} analyses/s  {size} bytes")
+
+    results["speedup"] = round(results["before"]["seconds"] / results["after"]["seconds"], 2)
+    print(f"speedup: {results['speedup']}x ({results['encoder']})")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    AnalysisResult.objects.delete()
+    disconnect()
+
+
+if __name__ == "__main__":
+    main()
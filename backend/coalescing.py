@@ -0,0 +1,159 @@
+"""
+Coalescing of identical base analyses across jobs.
+
+An analysis is identified by analysis_key(base_type, league, exclusions). For a
+given key, coalesced_analysis():
+
+1. reuses the newest AnalysisResult with that key if it is younger than the
+   freshness window (ANALYSIS_FRESHNESS_MINUTES, 0 disables reuse);
+2. otherwise joins a run of the same key already in progress: in this process
+   through a shared Future, in other processes through an AnalysisInFlight
+   marker document, waiting for that run's result instead of querying the trade
+   site again;
+3. otherwise runs the analysis itself, holding the marker while it does.
+
+A marker whose owner died stops blocking after ANALYSIS_INFLIGHT_TTL_SECONDS,
+after which the next waiter takes the run over.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+from mongoengine.errors import NotUniqueError
+
+from backend.database import AnalysisInFlight, AnalysisResult
+from backend.metrics import CACHE_REQUESTS
+
+
+ANALYSIS_FRESHNESS_MINUTES = float(os.getenv('ANALYSIS_FRESHNESS_MINUTES', '10'))
+ANALYSIS_INFLIGHT_TTL_SECONDS = float(os.getenv('ANALYSIS_INFLIGHT_TTL_SECONDS', '900'))
+ANALYSIS_INFLIGHT_POLL_SECONDS = float(os.getenv('ANALYSIS_INFLIGHT_POLL_SECONDS', '2'))
+
+# Sources reported by coalesced_analysis()
+ANALYZED = 'analyzed'
+FRESH = 'fresh'
+COALESCED = 'coalesced'
+
+_inflight = {}  # analysis key -> Future of the run owned by this process
+_inflight_lock = threading.Lock()
+
+
+def _exclusion_rule(exclusion):
+    """The fields of an exclusion (dict or ExcludedModifier) that affect an analysis."""
+    get = exclusion.get if isinstance(exclusion, dict) else lambda f: getattr(exclusion, f, None)
+    return [get('mod_name_pattern') or '', get('mod_tier') or '', get('mod_type') or '']
+
+
+def analysis_key(base_type, league, exclusions=None):
+    """Stable key for (base_type, league, exclusion set); exclusion order and ids do not matter."""
+    rules = sorted(_exclusion_rule(e) for e in exclusions or [])
+    payload = json.dumps([base_type, league, rules], separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def find_fresh_analysis(key, max_age_minutes=None):
+    """Newest full AnalysisResult for key younger than max_age_minutes, or None."""
+    max_age_minutes = ANALYSIS_FRESHNESS_MINUTES if max_age_minutes is None else max_age_minutes
+    if max_age_minutes <= 0:
+        return None
+    since = datetime.utcnow() - timedelta(minutes=max_age_minutes)
+    return AnalysisResult.objects(analysis_key=key, compacted=False, created_at__gte=since) \
+        .order_by('-created_at').first()
+
+
+def _acquire_marker(key, base_type, owner):
+    """Take the cross-process marker for key. Returns None if another live run holds it, else the marker."""
+    now = datetime.utcnow()
+    AnalysisInFlight.objects(key=key, expires_at__lt=now).delete()
+    marker = AnalysisInFlight(
+        key=key, base_type=base_type, owner=owner, started_at=now,
+        expires_at=now + timedelta(seconds=ANALYSIS_INFLIGHT_TTL_SECONDS)
+    )
+    try:
+        marker.save(force_insert=True)
+    except NotUniqueError:
+        return None
+    return marker
+
+
+def _release_marker(marker):
+    AnalysisInFlight.objects(key=marker.key, owner=marker.owner).delete()
+
+
+def _wait_for_other_process(key, poll_seconds):
+    """
+    Wait while another process holds the marker for key. Returns that run's
+    AnalysisResult, or None if it ended without one (failed or expired).
+    """
+    started_at = None
+    while True:
+        marker = AnalysisInFlight.objects(key=key).first()
+        if marker is None or marker.expires_at < datetime.utcnow():
+            break
+        started_at = started_at or marker.started_at
+        time.sleep(poll_seconds)
+    if started_at is None:
+        return None
+    return AnalysisResult.objects(analysis_key=key, created_at__gte=started_at).order_by('-created_at').first()
+
+
+def _run_with_marker(key, base_type, run, owner, poll_seconds):
+    while True:
+        marker = _acquire_marker(key, base_type, owner)
+        if marker is not None:
+            try:
+                return run(key), ANALYZED
+            finally:
+                _release_marker(marker)
+
+        print(f"Analysis of {base_type} already running in another process, waiting for it...")
+        analysis = _wait_for_other_process(key, poll_seconds)
+        if analysis is not None:
+            return analysis, COALESCED
+        # The other run failed or its owner died; run it ourselves
+
+
+def _counted(analysis, source):
+    CACHE_REQUESTS.inc(cache='analysis', result=source)
+    return analysis, source
+
+
+def coalesced_analysis(base_type, run, league, exclusions=None, max_age_minutes=None,
+                       owner=None, poll_seconds=None):
+    """
+    Return (AnalysisResult, source) for base_type, where source is 'fresh' (reused
+    a recent result), 'coalesced' (waited for an identical run in progress) or
+    'analyzed' (ran it). run(analysis_key) performs and saves the analysis; it must
+    tag the AnalysisResult with that key. A failed run raises in every waiter.
+    """
+    poll_seconds = ANALYSIS_INFLIGHT_POLL_SECONDS if poll_seconds is None else poll_seconds
+    key = analysis_key(base_type, league, exclusions)
+
+    fresh = find_fresh_analysis(key, max_age_minutes)
+    if fresh is not None:
+        return _counted(fresh, FRESH)
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        is_owner = future is None
+        if is_owner:
+            future = _inflight[key] = Future()
+
+    if not is_owner:
+        print(f"Analysis of {base_type} already running in this process, waiting for it...")
+        return _counted(future.result(), COALESCED)
+
+    try:
+        analysis, source = _run_with_marker(key, base_type, run, owner or 'local', poll_seconds)
+        future.set_result(analysis)
+        return _counted(analysis, source)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
@@ -4,3 +4,6 @@ import os
 
 # Add backend to sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The trade site is mocked in tests; don't pace requests through the rate budget
+os.environ.setdefault("TRADE_RATE_PER_SECOND", "0")
@@ -1,3 +1,64 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+
+class CurrencyRegistry:
+    """
+    Interns currency codes to small integer IDs shared by every CurrencyService.
+    ID 0 is reserved for missing/unknown currencies and always has rate 0.
+    IDs are append-only, so arrays of IDs stay valid across rate refreshes.
+    """
+
+    def __init__(self):
+        self._ids = {None: 0, "": 0}
+        self._codes = [None]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._codes)
+
+    def intern(self, code):
+        """Return the ID for a raw currency string (case-insensitive)."""
+        currency_id = self._ids.get(code)
+        if currency_id is not None:
+            return currency_id
+        with self._lock:
+            normalized = str(code).lower()
+            currency_id = self._ids.get(normalized)
+            if currency_id is None:
+                currency_id = len(self._codes)
+                self._codes.append(normalized)
+                self._ids[normalized] = currency_id
+            # Remember the raw spelling too so "DIVINE" is lowercased only once
+            self._ids[code] = currency_id
+        return currency_id
+
+    def code(self, currency_id):
+        return self._codes[currency_id]
+
+    def ids(self, currencies):
+        import numpy as np
+
+        intern = self.intern
+        return np.fromiter((intern(c) for c in currencies), dtype=np.intp, count=len(currencies))
+
+    def rate_vector(self, rates):
+        """Dense array of rates indexed by currency ID (0 for unknown codes)."""
+        import numpy as np
+
+        for code in rates:
+            self.intern(code)
+        vector = np.zeros(len(self._codes), dtype=np.float64)
+        for code, rate in rates.items():
+            vector[self._ids[code]] = rate
+        return vector
+
+
+CURRENCY_IDS = CurrencyRegistry()
+
+
 class CurrencyService:
     DEFAULT_RATES = {
         "exalted": 1.0,
@@ -17,10 +78,20 @@ class CurrencyService:
         "blessed": 39.0,        # ~5 Chaos
         "mirror": 1500000.0,    # Mirror shards
     }
-    
+
     def __init__(self, custom_rates=None):
-        # Use custom rates if provided (from poe.ninja fetch), otherwise defaults
-        self.rates = custom_rates if custom_rates else self.DEFAULT_RATES.copy()
+        # Use custom rates if provided (from poe.ninja fetch), otherwise defaults.
+        # self.rates is never mutated in place: updates swap in a new dict, so
+        # readers on other threads always see one complete set of rates.
+        self.rates = self._clean_rates(custom_rates) if custom_rates else self.DEFAULT_RATES.copy()
+        self._rate_vector = None  # (rates dict, vector) built lazily for batch normalization
+        self.source = "defaults"
+        self.updated_at = None
+        self._write_lock = threading.Lock()
+
+    @staticmethod
+    def _clean_rates(rates):
+        return {str(k).lower(): float(v) for k, v in rates.items()}
 
     def get_rates(self):
         """
@@ -36,26 +107,235 @@ class CurrencyService:
         """
         if not currency_type:
             return 0.0
-            
+
         currency_type = currency_type.lower()
-        rates = self.get_rates()
-        
+        rates = self.rates
+
         if currency_type in rates:
             return amount * rates[currency_type]
-        
+
         # Fallback/Unknown currency
         return 0.0
 
-    def refresh_from_poe_ninja(self, fetched_rates):
+    def rate_vector(self):
+        """
+        Rates as a dense array indexed by CURRENCY_IDS, rebuilt after a refresh
+        or when new currency codes have been interned since it was built.
+        """
+        rates = self.rates
+        cached = self._rate_vector
+        if cached is not None and cached[0] is rates and len(cached[1]) == len(CURRENCY_IDS):
+            return cached[1]
+        vector = CURRENCY_IDS.rate_vector(rates)
+        self._rate_vector = (rates, vector)
+        return vector
+
+    def normalize_batch(self, amounts, currencies):
+        """
+        Vectorized normalize_to_exalted for a batch of listings.
+        Missing amounts and missing/unknown currencies normalize to 0.
+        Returns a float64 numpy array aligned with the inputs.
+        """
+        import numpy as np
+
+        # Intern first: the vector is built afterwards, so it covers every ID
+        ids = CURRENCY_IDS.ids(currencies)
+        values = np.array([0.0 if a is None else a for a in amounts], dtype=np.float64)
+        return values * self.rate_vector()[ids]
+
+    def refresh_from_poe_ninja(self, fetched_rates, source="manual", persist=False):
         """
         Update rates from fetched poe.ninja data.
         Expects dict with currency -> rate (Exalted normalized).
+        When persist is True the new rates are stored as a snapshot in MongoDB.
         """
         if fetched_rates and isinstance(fetched_rates, dict):
-            self.rates = fetched_rates
+            try:
+                rates = self._clean_rates(fetched_rates)
+            except (TypeError, ValueError):
+                return False
+            with self._write_lock:
+                self.rates = rates
+                self.source = source
+                self.updated_at = datetime.utcnow()
+                if persist:
+                    self._persist()
             return True
         return False
 
     def reset_to_defaults(self):
         """Reset rates to poe.ninja defaults."""
-        self.rates = self.DEFAULT_RATES.copy()
+        with self._write_lock:
+            self.rates = self.DEFAULT_RATES.copy()
+            self.source = "defaults"
+            self.updated_at = None
+
+    def refresh_from_source(self, source):
+        """
+        Pull rates from a rate source (see FileRateSource/HttpRateSource) and persist them.
+        """
+        rates = source.fetch_rates()
+        return self.refresh_from_poe_ninja(rates, source=source.name, persist=True)
+
+    def load_latest(self):
+        """
+        Load the most recent persisted snapshot from MongoDB.
+        Returns True if a snapshot was found.
+        """
+        from backend.database import CurrencyRateSnapshot
+
+        snapshot = CurrencyRateSnapshot.objects.order_by('-created_at').first()
+        if not snapshot or not snapshot.rates:
+            return False
+        with self._write_lock:
+            self.rates = self._clean_rates(snapshot.rates)
+            self.source = snapshot.source or "snapshot"
+            self.updated_at = snapshot.created_at
+        return True
+
+    def sync_latest(self):
+        """
+        Load the newest persisted snapshot when it is newer than the rates in use,
+        so rates posted to or refreshed in another process (web worker, job worker)
+        reach this one. Returns True if the rates changed.
+        """
+        from backend.database import CurrencyRateSnapshot
+
+        latest = CurrencyRateSnapshot.objects.order_by('-created_at').only('created_at').first()
+        if latest is None or (self.updated_at is not None and latest.created_at <= self.updated_at):
+            return False
+        return self.load_latest()
+
+    def _persist(self):
+        from backend.database import CurrencyRateSnapshot
+
+        try:
+            CurrencyRateSnapshot(
+                rates=self.rates,
+                source=self.source,
+                created_at=self.updated_at
+            ).save()
+        except Exception as e:
+            print(f"Failed to persist currency rates: {e}")
+
+    def status(self):
+        return {
+            "source": self.source,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "currencies": len(self.rates)
+        }
+
+
+class FileRateSource:
+    """
+    Reads rates from a JSON file: either {"rates": {...}} or a flat currency -> rate map.
+    Used as the offline stand-in for a live price feed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = f"file:{os.path.basename(path)}"
+
+    def fetch_rates(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data.get("rates", data) if isinstance(data, dict) else None
+
+
+class HttpRateSource:
+    """
+    Fetches rates from an HTTP endpoint returning the same JSON shape as FileRateSource.
+    """
+
+    def __init__(self, url, timeout=15):
+        self.url = url
+        self.timeout = timeout
+        self.name = f"http:{url}"
+
+    def fetch_rates(self):
+        import requests
+
+        response = requests.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        return data.get("rates", data) if isinstance(data, dict) else None
+
+
+def rate_source_from_config(value):
+    """
+    Build a rate source from a CURRENCY_RATES_SOURCE value (file path or http(s) URL).
+    Returns None when no source is configured.
+    """
+    if not value:
+        return None
+    if value.startswith("http://") or value.startswith("https://"):
+        return HttpRateSource(value)
+    return FileRateSource(value)
+
+
+_shared_service = None
+_shared_lock = threading.Lock()
+_refresh_task = None
+_sync_task = None
+
+
+def get_currency_service():
+    """
+    Process-wide CurrencyService shared by the API routes and every PriceAnalyzer.
+    """
+    global _shared_service
+    if _shared_service is None:
+        with _shared_lock:
+            if _shared_service is None:
+                _shared_service = CurrencyService()
+    return _shared_service
+
+
+def init_currency_service(source_config=None, refresh_minutes=None, sync_seconds=None):
+    """
+    Load persisted rates at startup, schedule refreshes from the configured source,
+    and keep following the newest persisted snapshot so rates posted to any process
+    reach every process.
+    Loading happens on a background thread so a slow or missing MongoDB never blocks startup;
+    analyses use the defaults until the snapshot is in.
+    CURRENCY_RATES_SOURCE: file path or URL (unset disables scheduled refresh)
+    CURRENCY_REFRESH_MINUTES: refresh interval (default 60)
+    CURRENCY_SYNC_SECONDS: how often to check for a newer snapshot (default 30, 0 disables)
+    """
+    from backend.periodic import PeriodicTask
+
+    service = get_currency_service()
+    source_config = source_config if source_config is not None else os.getenv("CURRENCY_RATES_SOURCE")
+    refresh_minutes = refresh_minutes if refresh_minutes is not None else float(os.getenv("CURRENCY_REFRESH_MINUTES", "60"))
+    sync_seconds = sync_seconds if sync_seconds is not None else float(os.getenv("CURRENCY_SYNC_SECONDS", "30"))
+    source = rate_source_from_config(source_config)
+
+    def load_and_schedule():
+        global _refresh_task, _sync_task
+        try:
+            if service.load_latest():
+                print(f"Loaded currency rates snapshot from {service.updated_at}")
+        except Exception as e:
+            print(f"Could not load currency rates snapshot: {e}")
+
+        if source and refresh_minutes > 0 and _refresh_task is None:
+            # Refresh immediately when nothing was persisted yet, otherwise wait one interval
+            initial_delay = 0 if service.updated_at is None else refresh_minutes * 60
+            # One process fetches and persists; the others pick the snapshot up through the sync below
+            _refresh_task = PeriodicTask(
+                "currency-refresh",
+                refresh_minutes * 60,
+                lambda: service.refresh_from_source(source),
+                initial_delay=initial_delay,
+                exclusive=True
+            ).start()
+
+        if sync_seconds > 0 and _sync_task is None:
+            _sync_task = PeriodicTask("currency-sync", sync_seconds, service.sync_latest).start()
+
+    threading.Thread(target=load_and_schedule, name="currency-init", daemon=True).start()
+    return service
+
+
+def get_rate_source():
+    return rate_source_from_config(os.getenv("CURRENCY_RATES_SOURCE"))
@@ -2,12 +2,16 @@
 Database models and session management for PoE2 Trade Analysis.
 Uses MongoDB with MongoEngine for flexible document storage.
 """
+import os
+import threading
+import time
 from datetime import datetime
 from mongoengine import (
     connect, Document, EmbeddedDocument, StringField, FloatField, 
     DateTimeField, ListField, EmbeddedDocumentField, BooleanField,
     DictField, IntField
 )
+from pymongo import MongoClient, monitoring
 import json
 
 
@@ -52,6 +56,26 @@ class Modifier(EmbeddedDocument):
         }
 
 
+class PriceSample(EmbeddedDocument):
+    """
+    One listing price as quoted on the trade site, before currency normalization.
+    kind: which average it contributed to (normal, crafting, magic).
+    created_at: when the analysis that quoted it ran; only set on samples merged
+    into a compacted daily roll-up, whose own created_at is its last analysis.
+    """
+    kind = StringField(required=True)
+    amount = FloatField(required=True)
+    currency = StringField(required=True)
+    created_at = DateTimeField()
+
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'amount': self.amount,
+            'currency': self.currency
+        }
+
+
 class AnalysisResult(Document):
     """
     Stores a complete analysis run for a specific base type.
@@ -77,10 +101,27 @@ class AnalysisResult(Document):
     # Embedded modifiers
     modifiers = ListField(EmbeddedDocumentField(Modifier))
 
+    # Original listing prices, so averages can be re-priced against historical rates
+    price_samples = ListField(EmbeddedDocumentField(PriceSample))
+    repriced_at = DateTimeField()
+
+    # Retention: compacted documents are daily roll-ups without modifiers/raw_data
+    compacted = BooleanField(default=False)
+    sample_count = IntField(default=1)
+
+    # Identity of the run for coalescing: hash of (base_type, league, exclusion set), see backend/coalescing.py
+    league = StringField()
+    analysis_key = StringField()
+
+    # Trade requests this run cost (trade_api.RequestStats.to_dict())
+    request_stats = DictField()
+
     meta = {
         'indexes': [
             'base_type',
-            '-created_at'
+            '-created_at',
+            ('compacted', 'created_at'),
+            ('analysis_key', '-created_at')
         ]
     }
 
@@ -99,11 +140,68 @@ class AnalysisResult(Document):
             'magic_search_id': self.magic_search_id,
             'crafting_search_id': self.crafting_search_id,
             'modifiers': all_mods,
+            'compacted': self.compacted,
+            'sample_count': self.sample_count,
+            'price_samples': [p.to_dict() for p in self.price_samples],
+            'repriced_at': self.repriced_at.isoformat() if self.repriced_at else None,
+            'request_stats': self.request_stats or None,
             'normal_modifiers': [m for m in all_mods if str(m['rarity']).lower() in ['normal', 'unknown']],
             'magic_modifiers': [m for m in all_mods if str(m['rarity']).lower() == 'magic']
         }
 
 
+class ModifierObservation(Document):
+    """
+    One modifier seen on one priced listing, flattened out of AnalysisResult
+    so frequency/price questions can be answered with indexed aggregations.
+    """
+    base_type = StringField(required=True)
+    name = StringField(required=True)
+    tier = StringField()
+    tier_rank = IntField()  # Numeric part of the tier: P1/S1 -> 1
+    mod_type = StringField()
+    rarity = StringField()
+    price_ex = FloatField()
+    price_amount = FloatField()
+    price_currency = StringField()
+    listing_id = StringField()
+    analysis_id = StringField()
+    ts = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'modifier_observation',
+        'indexes': [
+            ('base_type', 'rarity', 'tier_rank', 'price_ex'),
+            ('base_type', 'rarity', 'name', 'tier'),
+            ('name', 'tier'),
+            '-ts'
+        ]
+    }
+
+    def to_dict(self):
+        return {
+            'id': str(self.id),
+            'base_type': self.base_type,
+            'name': self.name,
+            'tier': self.tier,
+            'tier_rank': self.tier_rank,
+            'mod_type': self.mod_type,
+            'rarity': self.rarity,
+            'price_ex': self.price_ex,
+            'price_amount': self.price_amount,
+            'price_currency': self.price_currency,
+            'listing_id': self.listing_id,
+            'analysis_id': self.analysis_id,
+            'ts': self.ts.isoformat()
+        }
+
+
+def _tier_rank(tier):
+    """Extract the numeric tier from strings like "P1" or "S12"."""
+    digits = ''.join(ch for ch in (tier or '') if ch.isdigit())
+    return int(digits) if digits else None
+
+
 class Bucket(EmbeddedDocument):
     """
     Represents a price bucket in the distribution analysis.
@@ -136,6 +234,7 @@ class ItemAnalysis(Document):
     max_price = FloatField()
     currency = StringField(default="exalted")
     buckets = ListField(EmbeddedDocumentField(Bucket))
+    compacted = BooleanField(default=False)
 
     meta = {
         'indexes': [
@@ -152,7 +251,8 @@ class ItemAnalysis(Document):
             'min_price': self.min_price,
             'max_price': self.max_price,
             'currency': self.currency,
-            'buckets': [b.to_dict() for b in self.buckets]
+            'buckets': [b.to_dict() for b in self.buckets],
+            'compacted': self.compacted
         }
 
 
@@ -254,6 +354,29 @@ class SearchHistory(Document):
         }
 
 
+class CurrencyRateSnapshot(Document):
+    """
+    Currency rates (normalized to Exalted) in effect from created_at onwards.
+    """
+    rates = DictField(required=True)
+    source = StringField()
+    created_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'indexes': [
+            '-created_at'
+        ]
+    }
+
+    def to_dict(self):
+        return {
+            'id': str(self.id),
+            'rates': self.rates,
+            'source': self.source,
+            'created_at': self.created_at.isoformat()
+        }
+
+
 class CustomCategory(Document):
     """
     User-defined item categories for grouping items.
@@ -276,56 +399,382 @@ class CustomCategory(Document):
         }
 
 
+class AnalysisInFlight(Document):
+    """
+    Marker for an analysis currently running in some process, keyed by analysis_key.
+    Lets jobs in other processes wait for that run instead of repeating it.
+    """
+    key = StringField(primary_key=True)
+    base_type = StringField()
+    owner = StringField()
+    started_at = DateTimeField(default=datetime.utcnow)
+    expires_at = DateTimeField(required=True)  # A crashed owner's marker stops blocking after this
+
+    meta = {
+        'indexes': [
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0}
+        ]
+    }
+
+
+class TaskLease(Document):
+    """
+    Cross-process lease on a recurring task (see backend/periodic.py), so work such
+    as maintenance runs in one process of a multi-worker deployment.
+    """
+    name = StringField(primary_key=True)
+    owner = StringField(required=True)
+    expires_at = DateTimeField(required=True)  # Another process takes the task over after this
+
+    meta = {
+        'indexes': [
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0}
+        ]
+    }
+
+
+class Profile(Document):
+    """
+    Profiler output for one profiled job run or request (see backend/profiling.py).
+    'collapsed' data is folded stacks ("outer;inner count" per line) for flamegraph
+    tools such as speedscope or flamegraph.pl; 'pstats' data is a cProfile report.
+    """
+    kind = StringField(required=True)  # job, request
+    target = StringField()  # Job kind or route
+    job_id = StringField()
+    mode = StringField()  # sample, cprofile
+    format = StringField()  # collapsed, pstats
+    data = StringField()
+    samples = IntField(default=0)
+    duration_ms = FloatField()
+    created_at = DateTimeField(default=datetime.utcnow)
+    expires_at = DateTimeField()
+
+    meta = {
+        'indexes': [
+            ('job_id', '-created_at'),
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0}
+        ]
+    }
+
+    def to_dict(self, include_data=False):
+        result = {
+            'id': str(self.id),
+            'kind': self.kind,
+            'target': self.target,
+            'job_id': self.job_id,
+            'mode': self.mode,
+            'format': self.format,
+            'samples': self.samples,
+            'duration_ms': self.duration_ms,
+            'created_at': self.created_at.isoformat()
+        }
+        if include_data:
+            result['data'] = self.data
+        return result
+
+
+# Job priority classes, most urgent first; Job.priority stores the index
+JOB_PRIORITIES = ('interactive', 'batch', 'background')
+
+
 class Job(Document):
     """
-    Background job for batch analysis.
+    Background analysis job, executed by a JobWorker (see backend/jobs.py).
     """
+    kind = StringField(default='batch_analysis')  # Handler name in backend.jobs.HANDLERS
+    params = DictField()  # Handler input; holds the session id, so never returned by the API
+    priority = IntField(default=1)  # Index into JOB_PRIORITIES; lower is claimed first
     status = StringField(default='queued')  # queued, processing, completed, failed
     progress = IntField(default=0)
     total = IntField(default=0)
     current_item = StringField()
     results = ListField(DictField())
+    partial = DictField()  # Latest partial aggregate of a running job (query_analysis)
+    partial_seq = IntField(default=0)  # Bumped on every partial update, so streams fetch it only when it changed
     error = StringField()
     created_at = DateTimeField(default=datetime.utcnow)
+    started_at = DateTimeField()
+    finished_at = DateTimeField()  # Set on completion/failure; drives the TTL index
+
+    # Queue lease (see backend/jobs.py): the claiming worker renews lease_expires_at while it runs
+    worker_id = StringField()
+    lease_token = StringField()
+    lease_expires_at = DateTimeField()
+    heartbeat_at = DateTimeField()
+    attempts = IntField(default=0)
+
+    # Trade requests made by the job's handler across all its runs (trade_api.RequestStats.to_dict())
+    request_stats = DictField()
 
     meta = {
         'indexes': [
             '-created_at',
-            'status'
+            'status',
+            ('status', 'created_at'),
+            ('status', 'priority', 'created_at'),
+            ('status', 'lease_expires_at')
         ]
     }
 
+    def hold_lease(self, token):
+        """Make every later save() of this instance conditional on still holding the lease."""
+        self._held_lease = token
+
+    def held_lease(self):
+        return getattr(self, '_held_lease', None)
+
+    @property
+    def priority_class(self):
+        return JOB_PRIORITIES[min(max(self.priority or 0, 0), len(JOB_PRIORITIES) - 1)]
+
+    def save(self, *args, **kwargs):
+        token = self.held_lease()
+        if token and 'save_condition' not in kwargs:
+            kwargs['save_condition'] = {'lease_token': token}
+        return super().save(*args, **kwargs)
+
+    # Stored fields to_dict() reads: the job status ETag covers all of them (extend both together)
+    API_FIELDS = ('kind', 'priority', 'status', 'progress', 'total', 'current_item', 'results', 'partial',
+                  'partial_seq', 'error', 'attempts', 'request_stats', 'worker_id', 'heartbeat_at',
+                  'created_at', 'finished_at')
+
     def to_dict(self):
         return {
             'id': str(self.id),
+            'kind': self.kind,
+            'priority': self.priority_class,
             'status': self.status,
             'progress': self.progress,
             'total': self.total,
             'current_item': self.current_item,
             'results': self.results,
+            'partial': self.partial or None,
             'error': self.error,
-            'created_at': self.created_at.isoformat()
+            'attempts': self.attempts,
+            'request_stats': self.request_stats or None,
+            'worker_id': self.worker_id,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
         }
 
 
-def init_db(app):
+DEFAULT_MONGODB_URI = 'mongodb://localhost:27017/poe2_trade'
+DB_READY_POLL_SECONDS = float(os.getenv('DB_READY_POLL_SECONDS', '2'))
+
+
+def _write_concern(value):
+    return int(value) if value.isdigit() else value
+
+
+# pymongo client options and the environment variables that set them (unset: driver default).
+# Size the pool for the threads sharing a client: WEB_THREADS per web worker, JOB_WORKERS per job worker.
+MONGO_CLIENT_OPTIONS = {
+    'maxPoolSize': ('MONGO_MAX_POOL_SIZE', int),
+    'minPoolSize': ('MONGO_MIN_POOL_SIZE', int),
+    'maxIdleTimeMS': ('MONGO_MAX_IDLE_TIME_MS', int),
+    'maxConnecting': ('MONGO_MAX_CONNECTING', int),
+    'waitQueueTimeoutMS': ('MONGO_WAIT_QUEUE_TIMEOUT_MS', int),
+    'serverSelectionTimeoutMS': ('MONGO_SERVER_SELECTION_TIMEOUT_MS', int),
+    'connectTimeoutMS': ('MONGO_CONNECT_TIMEOUT_MS', int),
+    'socketTimeoutMS': ('MONGO_SOCKET_TIMEOUT_MS', int),
+    'w': ('MONGO_WRITE_CONCERN', _write_concern),
+    'wTimeoutMS': ('MONGO_WRITE_TIMEOUT_MS', int),
+    'appname': ('MONGO_APP_NAME', str),
+}
+
+
+def mongo_client_options(settings=None):
+    """Client options from MONGO_* variables, overridden by settings (e.g. app.config['MONGODB_SETTINGS'])."""
+    options = {}
+    for option, (env, parse) in MONGO_CLIENT_OPTIONS.items():
+        value = os.getenv(env)
+        if value not in (None, ''):
+            try:
+                options[option] = parse(value)
+            except ValueError:
+                raise ValueError(f"{env} must be an integer, got {value!r}")
+    options.update(settings or {})
+    return options
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters per server, fed by pymongo's connection pool events."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers = {}
+
+    def _server(self, address):
+        key = '%s:%s' % address if isinstance(address, tuple) else str(address)
+        server = self._servers.get(key)
+        if server is None:
+            server = self._servers[key] = {
+                'open': 0, 'in_use': 0, 'checkouts': 0, 'checkout_failures': 0,
+                'wait_seconds_total': 0.0, 'wait_seconds_max': 0.0, 'cleared': 0
+            }
+        return server
+
+    def _update(self, address, **deltas):
+        with self._lock:
+            server = self._server(address)
+            for key, delta in deltas.items():
+                server[key] += delta
+
+    def pool_created(self, event):
+        self._update(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._update(event.address, cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._update(event.address, open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event.address, open=-1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._update(event.address, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        waited = getattr(event, 'duration', None) or 0.0
+        with self._lock:
+            server = self._server(event.address)
+            server['in_use'] += 1
+            server['checkouts'] += 1
+            server['wait_seconds_total'] += waited
+            server['wait_seconds_max'] = max(server['wait_seconds_max'], waited)
+
+    def connection_checked_in(self, event):
+        self._update(event.address, in_use=-1)
+
+    def snapshot(self):
+        """{server: counters}; wait_seconds_avg is the mean time to check out a connection."""
+        with self._lock:
+            servers = {key: dict(value) for key, value in self._servers.items()}
+        for server in servers.values():
+            server['wait_seconds_avg'] = server['wait_seconds_total'] / server['checkouts'] if server['checkouts'] else 0.0
+        return servers
+
+
+_pool_stats = PoolStats()
+_db_state = {'ready': False, 'error': None, 'checked_at': None, 'ready_at': None, 'options': {}}
+_db_ready = threading.Event()
+_db_waiter = None
+
+
+def _mask_uri(uri):
+    return f"...@{uri.split('@')[-1]}" if '@' in uri else uri
+
+
+def connect_db(uri=None, settings=None, wait=False):
     """
-    Initialize the database connection.
+    Register the default MongoDB connection with the configured pool/timeout options.
+    pymongo connects lazily, so this returns at once; a background thread marks the
+    database ready once a writable server is known (db_status(), GET /readyz).
+    wait=True blocks until then. Invalid options raise instead of being ignored.
     """
-    mongodb_uri = app.config.get('MONGODB_URI') or app.config.get('MONGODB_SETTINGS', {}).get('host')
-    print(f"DEBUG: Initializing database with URI: {mongodb_uri}")
+    global _db_waiter
+    uri = uri or os.getenv('MONGODB_URI', DEFAULT_MONGODB_URI)
+    options = mongo_client_options(settings)
+    print(f"Initializing database at {_mask_uri(uri)} ({options or 'driver default options'})")
+    connect(host=uri, event_listeners=[_pool_stats], **options)
+    _db_state['options'] = options
+
+    if _db_waiter is None or not _db_waiter.is_alive():
+        _db_waiter = threading.Thread(target=_wait_for_db, name='db-ready', daemon=True)
+        _db_waiter.start()
+    if wait:
+        _db_ready.wait()
+
+
+def init_db(app, wait=False):
+    """
+    Connect using the app config: MONGODB_URI, plus MONGODB_SETTINGS for client
+    options (overriding the MONGO_* environment variables, see MONGO_CLIENT_OPTIONS).
+    """
+    settings = dict(app.config.get('MONGODB_SETTINGS') or {})
+    uri = app.config.get('MONGODB_URI') or settings.get('host')
+    settings.pop('host', None)
+    connect_db(uri, settings, wait)
+
+
+def _topology_error(description):
+    for server in description.server_descriptions().values():
+        if server.error is not None:
+            return str(server.error)
+    return 'No writable MongoDB server found yet'
+
+
+def check_db():
+    """
+    Update and return db_status() without blocking: the driver's view of the
+    topology (kept current by its monitor threads) decides readiness, so an
+    unreachable server is reported at once instead of after a selection timeout.
+    Clients without topology monitoring (mongomock) are pinged.
+    """
+    from mongoengine.connection import get_connection
+
+    _db_state['checked_at'] = datetime.utcnow()
     try:
-        if mongodb_uri:
-            connect(host=mongodb_uri)
-            print("MongoDB connected successfully.")
+        client = get_connection()
+        if isinstance(client, MongoClient):
+            description = client.topology_description
+            ready = description.has_writable_server()
+            error = None if ready else _topology_error(description)
         else:
-            # Default to localhost if no config found
-            connect(host='mongodb://localhost:27017/poe2_trade')
-            print("MongoDB connected to default localhost.")
+            client.admin.command('ping')
+            ready, error = True, None
     except Exception as e:
-        print(f"CRITICAL: MongoDB connection failed: {e}")
-        import traceback
-        traceback.print_exc()
+        ready, error = False, str(e)
+
+    if ready and not _db_state['ready']:
+        _db_state['ready_at'] = datetime.utcnow()
+        print("MongoDB connected successfully.")
+    _db_state.update(ready=ready, error=error)
+    if ready:
+        _db_ready.set()
+    else:
+        _db_ready.clear()
+    return db_status()
+
+
+def _wait_for_db():
+    reported = None
+    while not check_db()['ready']:
+        if _db_state['error'] != reported:
+            reported = _db_state['error']
+            print(f"MongoDB not reachable yet ({reported}), checking every {DB_READY_POLL_SECONDS}s")
+        time.sleep(DB_READY_POLL_SECONDS)
+
+
+def pool_stats():
+    """Per-server connection pool counters of this process (see PoolStats)."""
+    return _pool_stats.snapshot()
+
+
+def db_status():
+    return {
+        'ready': _db_state['ready'],
+        'error': _db_state['error'],
+        'checked_at': _db_state['checked_at'].isoformat() if _db_state['checked_at'] else None,
+        'ready_at': _db_state['ready_at'].isoformat() if _db_state['ready_at'] else None,
+        'options': {k: v for k, v in _db_state['options'].items() if k != 'event_listeners'},
+        'pool': pool_stats()
+    }
 
 
 def get_db():
@@ -336,17 +785,20 @@ def get_db():
 
 
 def save_analysis(analyzer, base_type: str, session_id: str = None,
-                  excluded_mods: list = None) -> AnalysisResult:
+                  excluded_mods: list = None, league: str = None,
+                  analysis_key: str = None) -> AnalysisResult:
     """
     Run a complete analysis for a base type and save all data to MongoDB.
+    league/analysis_key tag the result so later identical runs can reuse it.
     """
     from backend.price_analyzer import PriceAnalyzer
-    from backend.currency_service import CurrencyService
+    from backend.trade_api import request_accounting
 
-    analyzer = analyzer or PriceAnalyzer(CurrencyService())
+    analyzer = analyzer or PriceAnalyzer()
 
     # Run the analysis
-    result = analyzer.analyze_gap(base_type, session_id, exclusions=excluded_mods)
+    with request_accounting() as request_stats:
+        result = analyzer.analyze_gap(base_type, session_id, exclusions=excluded_mods)
 
     # Create embedded modifiers
     all_mods_data = result.get('normal_modifiers', []) + result.get('magic_modifiers', [])
@@ -366,6 +818,13 @@ def save_analysis(analyzer, base_type: str, session_id: str = None,
         )
         modifiers.append(mod)
 
+    price_samples = [
+        PriceSample(kind=kind, amount=float(amount), currency=currency)
+        for kind, pairs in (result.get('price_samples') or {}).items()
+        for amount, currency in pairs
+        if currency
+    ]
+
     # Create and save the analysis document
     analysis = AnalysisResult(
         base_type=base_type,
@@ -376,13 +835,175 @@ def save_analysis(analyzer, base_type: str, session_id: str = None,
         search_id=result.get('search_id'),
         magic_search_id=result.get('magic_search_id'),
         crafting_search_id=result.get('crafting_search_id'),
-        modifiers=modifiers
+        modifiers=modifiers,
+        price_samples=price_samples,
+        league=league,
+        analysis_key=analysis_key,
+        request_stats=request_stats.to_dict()
     )
 
     analysis.save()
+    save_modifier_observations(analysis, result.get('observations', []))
     return analysis
 
 
+def save_modifier_observations(analysis: AnalysisResult, observations: list) -> int:
+    """
+    Flatten per-listing observations into the modifier_observation collection.
+    Returns the number of rows inserted.
+    """
+    docs = []
+    for idx, obs in enumerate(observations or []):
+        listing_id = obs.get('listing_id') or f"{analysis.id}:{idx}"
+        for mod in obs.get('modifiers', []):
+            docs.append(ModifierObservation(
+                base_type=analysis.base_type,
+                name=mod.get('name', 'Unknown'),
+                tier=mod.get('tier'),
+                tier_rank=_tier_rank(mod.get('tier')),
+                mod_type=mod.get('mod_type'),
+                rarity=mod.get('rarity'),
+                price_ex=obs.get('price_ex'),
+                price_amount=obs.get('amount'),
+                price_currency=obs.get('currency'),
+                listing_id=listing_id,
+                analysis_id=str(analysis.id),
+                ts=analysis.created_at
+            ))
+    if docs:
+        ModifierObservation.objects.insert(docs, load_bulk=False)
+    return len(docs)
+
+
+def _observation_match(base_type=None, rarity=None, tier_rank=None, mod_type=None,
+                       min_price=None, since=None) -> dict:
+    match = {}
+    if base_type:
+        match['base_type'] = base_type
+    if rarity:
+        match['rarity'] = rarity
+    if tier_rank is not None:
+        match['tier_rank'] = tier_rank
+    if mod_type:
+        match['mod_type'] = mod_type
+    if min_price is not None:
+        match['price_ex'] = {'$gte': min_price}
+    if since is not None:
+        match['ts'] = {'$gte': since}
+    return match
+
+
+def get_top_modifiers_by_frequency(limit: int = 20, **filters) -> list:
+    """
+    Most frequently observed modifiers matching the filters, with the share of
+    listings carrying each one.
+    """
+    match = _observation_match(**filters)
+    listing_total = list(ModifierObservation.objects.aggregate([
+        {'$match': match},
+        {'$group': {'_id': '$listing_id'}},
+        {'$count': 'n'}
+    ]))
+    total = listing_total[0]['n'] if listing_total else 0
+
+    pipeline = [
+        {'$match': match},
+        {'$group': {
+            '_id': {'name': '$name', 'tier': '$tier', 'mod_type': '$mod_type'},
+            'count': {'$sum': 1},
+            'avg_price_ex': {'$avg': '$price_ex'}
+        }},
+        {'$sort': {'count': -1}},
+        {'$limit': limit}
+    ]
+    results = []
+    for row in ModifierObservation.objects.aggregate(pipeline):
+        results.append({
+            **row['_id'],
+            'count': row['count'],
+            'share': round(row['count'] / total, 4) if total else 0.0,
+            'avg_price_ex': round(row['avg_price_ex'] or 0.0, 2)
+        })
+    return results
+
+
+def get_top_modifiers_by_uplift(limit: int = 20, min_count: int = 3, **filters) -> list:
+    """
+    Modifiers whose listings are priced furthest above the baseline average
+    of all listings matching the filters.
+    """
+    match = _observation_match(**filters)
+    baseline_rows = list(ModifierObservation.objects.aggregate([
+        {'$match': match},
+        {'$group': {'_id': '$listing_id', 'price_ex': {'$first': '$price_ex'}}},
+        {'$group': {'_id': None, 'avg': {'$avg': '$price_ex'}}}
+    ]))
+    baseline = baseline_rows[0]['avg'] if baseline_rows else 0.0
+    baseline = baseline or 0.0
+
+    pipeline = [
+        {'$match': match},
+        {'$group': {
+            '_id': {'name': '$name', 'tier': '$tier', 'mod_type': '$mod_type'},
+            'count': {'$sum': 1},
+            'avg_price_ex': {'$avg': '$price_ex'}
+        }},
+        {'$match': {'count': {'$gte': min_count}}},
+        {'$addFields': {'uplift_ex': {'$subtract': ['$avg_price_ex', baseline]}}},
+        {'$sort': {'uplift_ex': -1}},
+        {'$limit': limit}
+    ]
+    results = []
+    for row in ModifierObservation.objects.aggregate(pipeline):
+        results.append({
+            **row['_id'],
+            'count': row['count'],
+            'avg_price_ex': round(row['avg_price_ex'] or 0.0, 2),
+            'baseline_ex': round(baseline, 2),
+            'uplift_ex': round(row['uplift_ex'] or 0.0, 2),
+            'uplift_ratio': round(row['avg_price_ex'] / baseline, 3) if baseline else None
+        })
+    return results
+
+
+REQUEST_COST_FIELDS = ('requests', 'searches', 'fetches', 'retries', 'status_429', 'status_502', 'errors', 'bytes',
+                       'rate_wait_seconds', 'network_seconds', 'parse_seconds', 'backoff_seconds', 'sleep_seconds')
+
+
+def get_request_costs(limit: int = 20, since=None, sort: str = 'requests') -> list:
+    """
+    Trade request cost per base type over stored analyses: totals of every
+    RequestStats field plus per-analysis averages, most expensive first.
+    """
+    if sort not in REQUEST_COST_FIELDS:
+        raise ValueError(f"Unknown cost field '{sort}'")
+    match = {'request_stats.requests': {'$exists': True}}
+    if since is not None:
+        match['created_at'] = {'$gte': since}
+
+    group = {'_id': '$base_type', 'analyses': {'$sum': 1}, 'last_analyzed': {'$max': '$created_at'}}
+    for field in REQUEST_COST_FIELDS:
+        group[field] = {'$sum': f'$request_stats.{field}'}
+    pipeline = [
+        {'$match': match},
+        {'$group': group},
+        {'$sort': {sort: -1}},
+        {'$limit': limit}
+    ]
+    results = []
+    for row in AnalysisResult.objects.aggregate(pipeline):
+        n = row['analyses']
+        totals = {field: round(row.get(field) or 0, 3) for field in REQUEST_COST_FIELDS}
+        results.append({
+            'base_type': row['_id'],
+            'analyses': n,
+            'last_analyzed': row['last_analyzed'].isoformat() if row.get('last_analyzed') else None,
+            'totals': totals,
+            'per_analysis': {field: round(value / n, 3) for field, value in totals.items()}
+        })
+    return results
+
+
 def get_analyses(base_type: str = None, limit: int = 100) -> list:
     """
     Get analysis results from MongoDB.
@@ -0,0 +1,46 @@
+"""
+Gunicorn settings for the production web process.
+
+    gunicorn -c backend/gunicorn.conf.py backend.server:app
+
+WEB_WORKERS processes x WEB_THREADS threads serve requests concurrently, so a
+slow call no longer blocks the dashboard. With JOB_MODE=thread every web worker
+also runs job threads; with JOB_MODE=worker jobs run in backend/worker.py.
+
+Each worker records its own metrics; with several workers they share
+METRICS_MULTIPROC_DIR (a fresh temporary directory unless set) so /metrics
+reports the whole server whichever worker answers (see backend/metrics.py).
+"""
+import multiprocessing
+import os
+import tempfile
+
+bind = os.getenv('BIND', f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv('WEB_WORKERS', str(min(4, multiprocessing.cpu_count() * 2 + 1))))
+threads = int(os.getenv('WEB_THREADS', '8'))
+worker_class = 'gthread'
+timeout = int(os.getenv('WEB_TIMEOUT', '120'))
+keepalive = 5
+
+# Give in-process jobs (JOB_MODE=thread) their drain window before the worker is killed
+graceful_timeout = int(float(os.getenv('JOB_DRAIN_SECONDS', '60'))) + 10
+
+accesslog = '-'
+errorlog = '-'
+
+# Set before the workers are forked so they all inherit it
+if workers > 1 and not os.getenv('METRICS_MULTIPROC_DIR'):
+    os.environ['METRICS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='poe2-metrics-')
+
+
+def on_starting(server):
+    from backend.metrics import clear_multiproc_dir
+    if os.getenv('METRICS_MULTIPROC_DIR'):
+        clear_multiproc_dir(os.environ['METRICS_MULTIPROC_DIR'])
+
+
+def worker_exit(server, worker):
+    from backend.jobs import shutdown_job_worker
+    from backend.metrics import flush
+    shutdown_job_worker()
+    flush()
@@ -0,0 +1,118 @@
+"""
+Response compression and cache validators for the JSON API.
+
+- init_compression(app) registers an after_request hook that gzip/brotli-encodes
+  compressible responses above COMPRESS_MIN_BYTES. Brotli is used when the
+  optional `brotli` package is installed and the client prefers it.
+- document_etag() derives an ETag from the identity/version fields of the
+  documents a response is built from, so conditional GETs can be answered with
+  304 before the full documents are loaded and serialized.
+"""
+import gzip
+import hashlib
+import os
+
+from flask import request
+
+from backend.metrics import CACHE_REQUESTS
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', '6'))
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/', 'application/javascript', 'image/svg+xml')
+
+# Fields that change a stored document's API representation (repricing, compaction, job progress)
+VERSION_FIELDS = ('created_at', 'repriced_at', 'compacted', 'status', 'progress', 'finished_at')
+
+
+def _encoding_for(response):
+    if response.status_code < 200 or response.status_code >= 300 or response.status_code == 204:
+        return None
+    if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers:
+        return None
+    if not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES):
+        return None
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def compress_response(response, min_size=None, level=None):
+    """Compress a response in place if the client accepts it and it is worth it."""
+    min_size = COMPRESS_MIN_BYTES if min_size is None else min_size
+    level = COMPRESS_LEVEL if level is None else level
+
+    encoding = _encoding_for(response)
+    response.vary.add('Accept-Encoding')
+    if encoding is None:
+        return response
+
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=min(level, 11))
+    else:
+        compressed = gzip.compress(body, compresslevel=level)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    # The compressed bytes differ from the identity representation, so a strong ETag becomes weak
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app, min_size=None, level=None):
+    """Register transparent response compression on a Flask app."""
+    @app.after_request
+    def _compress(response):
+        return compress_response(response, min_size=min_size, level=level)
+    return app
+
+
+def document_etag(rows, fields=VERSION_FIELDS):
+    """
+    ETag for a list of raw documents (as_pymongo rows) from their _id and version fields.
+    Order matters: the same documents in a different order are a different response.
+    """
+    digest = hashlib.sha1()
+    for row in rows:
+        digest.update(str(row.get('_id')).encode())
+        for field in fields:
+            digest.update(b'|')
+            digest.update(str(row.get(field)).encode())
+        digest.update(b';')
+    return digest.hexdigest()
+
+
+def queryset_etag(queryset, fields=VERSION_FIELDS):
+    """ETag for a mongoengine queryset, loading only the identity/version fields."""
+    model_fields = [f for f in fields if f in queryset._document._fields]
+    rows = queryset.clone().only('id', *model_fields).as_pymongo()
+    return document_etag(rows, model_fields)
+
+
+def is_not_modified(etag):
+    """True when the request's If-None-Match already matches etag (weak comparison)."""
+    matched = request.if_none_match.contains_weak(etag)
+    CACHE_REQUESTS.inc(cache='http_etag', result='hit' if matched else 'miss')
+    return matched
+
+
+def not_modified_response(app, etag):
+    response = app.response_class(status=304)
+    return with_etag(response, etag)
+
+
+def with_etag(response, etag):
+    """Attach etag and require revalidation on every use."""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
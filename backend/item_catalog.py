@@ -0,0 +1,238 @@
+"""
+Server-side cache of the PoE2 trade item catalog (/api/trade2/data/items).
+
+The catalog changes rarely, so it is fetched once, persisted to disk and
+revalidated upstream with If-None-Match/If-Modified-Since once it is older than
+ITEM_CATALOG_TTL_SECONDS. Revalidation runs in the background while the cached
+copy keeps being served. Each version is pre-serialized and pre-gzipped with a
+strong ETag so /api/items can answer conditional requests with 304.
+
+The bundled fixtures/items.json is only a partial stub. When it is all we have
+(cold start with upstream unreachable) the version is marked degraded and a
+background thread keeps retrying upstream with exponential backoff until a
+live catalog replaces it.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+
+
+ITEMS_URL = "https://www.pathofexile.com/api/trade2/data/items"
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "item_catalog.json")
+DEFAULT_FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "items.json")
+REQUEST_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:146.0) Gecko/20100101 Firefox/146.0",
+    "Accept": "*/*",
+    "X-Requested-With": "XMLHttpRequest"
+}
+RETRY_MIN_SECONDS = float(os.getenv("ITEM_CATALOG_RETRY_MIN_SECONDS", "5"))
+RETRY_MAX_SECONDS = float(os.getenv("ITEM_CATALOG_RETRY_MAX_SECONDS", "600"))
+
+
+class CatalogUnavailable(Exception):
+    """Raised when there is no cached catalog and the upstream fetch failed."""
+
+    def __init__(self, message, status_code=502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CatalogVersion:
+    """One version of the catalog, ready to serve. Only the revalidation timestamps change after creation."""
+
+    __slots__ = ("data", "body", "gzip_body", "etag", "upstream_etag", "upstream_last_modified",
+                 "fetched_at", "checked_at", "source")
+
+    def __init__(self, data, upstream_etag=None, upstream_last_modified=None,
+                 fetched_at=None, checked_at=None, source="upstream"):
+        self.data = data
+        self.body = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        self.gzip_body = gzip.compress(self.body, compresslevel=6)
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]  # Strong validator, unquoted
+        self.upstream_etag = upstream_etag
+        self.upstream_last_modified = upstream_last_modified
+        self.fetched_at = fetched_at or time.time()
+        self.checked_at = checked_at if checked_at is not None else self.fetched_at
+        self.source = source
+
+    def to_disk(self):
+        return {
+            "upstream_etag": self.upstream_etag,
+            "upstream_last_modified": self.upstream_last_modified,
+            "fetched_at": self.fetched_at,
+            "checked_at": self.checked_at,
+            "data": self.data
+        }
+
+    @property
+    def degraded(self):
+        """True for the bundled partial stub, served only until upstream answers."""
+        return self.source == "fixture"
+
+
+class ItemCatalog:
+    def __init__(self, url=ITEMS_URL, cache_path=None, fixture_path=None, ttl=None, timeout=30,
+                 retry_min=None, retry_max=None):
+        self.url = url
+        self.cache_path = cache_path if cache_path is not None else os.getenv("ITEM_CATALOG_CACHE", DEFAULT_CACHE_PATH)
+        self.fixture_path = fixture_path if fixture_path is not None else os.getenv("ITEM_CATALOG_FIXTURE", DEFAULT_FIXTURE_PATH)
+        self.ttl = ttl if ttl is not None else float(os.getenv("ITEM_CATALOG_TTL_SECONDS", "21600"))
+        self.timeout = timeout
+        self.retry_min = retry_min if retry_min is not None else RETRY_MIN_SECONDS
+        self.retry_max = retry_max if retry_max is not None else RETRY_MAX_SECONDS
+        self._retry_at = 0.0
+        self._failures = 0
+        self._current = None
+        self._lock = threading.Lock()
+        self._revalidating = False
+        self.stats = {"hits": 0, "revalidations": 0, "not_modified": 0, "refreshed": 0, "errors": 0}
+
+    def get(self):
+        """
+        Return the current CatalogVersion, loading it on first use.
+        Raises CatalogUnavailable if nothing is cached and upstream fails.
+        """
+        current = self._current
+        if current is None:
+            with self._lock:
+                if self._current is None:
+                    self._current = self._load_disk() or self._load_fixture() or self._fetch(None)
+                current = self._current
+        else:
+            self.stats["hits"] += 1
+
+        now = time.time()
+        if now - current.checked_at > self.ttl and now >= self._retry_at:
+            self._revalidate_in_background()
+        return current
+
+    def refresh(self):
+        """Revalidate against upstream now. Returns the (possibly unchanged) current version."""
+        current = self._current
+        try:
+            self._current = self._fetch(current)
+            self._failures = 0
+            self._retry_at = 0.0
+        except (CatalogUnavailable, ValueError) as e:  # ValueError: upstream sent a non-JSON body
+            self.stats["errors"] += 1
+            self._failures += 1
+            self._retry_at = time.time() + self._backoff()
+            print(f"Item catalog revalidation failed: {e}")
+        return self._current
+
+    def _backoff(self):
+        """Seconds to wait before the next upstream attempt after consecutive failures."""
+        return min(self.retry_max, self.retry_min * 2 ** (self._failures - 1))
+
+    def _revalidate_in_background(self):
+        with self._lock:
+            if self._revalidating:
+                return
+            self._revalidating = True
+
+        def run():
+            try:
+                current = self.refresh()
+                # Never settle for the stub: keep retrying until upstream answers
+                while current is not None and current.degraded:
+                    time.sleep(max(0.0, self._retry_at - time.time()))
+                    current = self.refresh()
+            except Exception as e:
+                print(f"Item catalog revalidation failed: {e}")
+            finally:
+                self._revalidating = False
+
+        threading.Thread(target=run, name="item-catalog-revalidate", daemon=True).start()
+
+    def _fetch(self, current):
+        headers = dict(REQUEST_HEADERS)
+        if current is not None:
+            if current.upstream_etag:
+                headers["If-None-Match"] = current.upstream_etag
+            if current.upstream_last_modified:
+                headers["If-Modified-Since"] = current.upstream_last_modified
+
+        self.stats["revalidations"] += 1
+        try:
+            response = requests.get(self.url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise CatalogUnavailable(str(e))
+
+        if response.status_code == 304 and current is not None:
+            self.stats["not_modified"] += 1
+            current.checked_at = time.time()
+            self._save_disk(current)
+            return current
+
+        if response.status_code != 200:
+            raise CatalogUnavailable(f"Failed to fetch items: {response.status_code}", response.status_code)
+
+        version = CatalogVersion(
+            response.json(),
+            upstream_etag=response.headers.get("ETag"),
+            upstream_last_modified=response.headers.get("Last-Modified")
+        )
+        if current is not None and version.etag == current.etag and not current.degraded:
+            # Upstream ignored our validators but the content is unchanged
+            current.upstream_etag = version.upstream_etag
+            current.upstream_last_modified = version.upstream_last_modified
+            current.checked_at = version.checked_at
+            version = current
+        else:
+            self.stats["refreshed"] += 1
+        self._save_disk(version)
+        return version
+
+    def _load_disk(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            return CatalogVersion(
+                stored["data"],
+                upstream_etag=stored.get("upstream_etag"),
+                upstream_last_modified=stored.get("upstream_last_modified"),
+                fetched_at=stored.get("fetched_at"),
+                checked_at=stored.get("checked_at"),
+                source="disk"
+            )
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _load_fixture(self):
+        if not self.fixture_path or not os.path.exists(self.fixture_path):
+            return None
+        try:
+            with open(self.fixture_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # checked_at=0 makes the fixture immediately stale, so a live catalog replaces it when reachable
+        return CatalogVersion(data, fetched_at=time.time(), checked_at=0, source="fixture")
+
+    def _save_disk(self, version):
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(version.to_disk(), f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Could not persist item catalog: {e}")
+
+
+_catalog = None
+
+
+def get_item_catalog():
+    """Process-wide ItemCatalog."""
+    global _catalog
+    if _catalog is None:
+        _catalog = ItemCatalog()
+    return _catalog
@@ -0,0 +1,197 @@
+"""
+Indexed views over the item catalog, rebuilt once per catalog version.
+
+- base type -> (category, item class) lookup for O(1) categorization
+- sorted word-prefix keys for fast /api/items/search?q= lookups
+- the category -> item class -> entries tree served by /api/items/tree
+"""
+import bisect
+import threading
+
+# Trailing keyword of a base type name -> item class.
+# Checked word by word from the end, so "Expert Talisman of the Wolf" is a Talisman
+# and "Expert Bombard Crossbow" is a Crossbow rather than a Bow.
+CLASS_KEYWORDS = {
+    "Bow": "Bow",
+    "Crossbow": "Crossbow",
+    "Wand": "Wand",
+    "Staff": "Staff",
+    "Quarterstaff": "Quarterstaff",
+    "Talisman": "Talisman",
+    "Quiver": "Quiver",
+    "Sceptre": "Sceptre",
+    "Focus": "Focus",
+    "Shield": "Shield",
+    "Buckler": "Buckler",
+    "Club": "Mace",
+    "Mace": "Mace",
+    "Hammer": "Mace",
+    "Sword": "Sword",
+    "Shortsword": "Sword",
+    "Spear": "Spear",
+    "Flail": "Flail",
+    "Axe": "Axe",
+    "Dagger": "Dagger",
+    "Claw": "Claw",
+    "Ring": "Ring",
+    "Amulet": "Amulet",
+    "Belt": "Belt",
+    "Charm": "Charm",
+    "Flask": "Flask",
+    "Waystone": "Waystone",
+    "Tablet": "Tablet",
+}
+
+# Item classes that analyze_items_logic groups together; other bases stay on their own
+ANALYSIS_GROUPS = {"Bow", "Wand", "Staff", "Crossbow", "Talisman", "Quiver"}
+
+
+def item_class_for(base_type):
+    """Derive the item class from a base type name (None if no keyword matches)."""
+    for word in reversed(base_type.replace("(", " ").replace(")", " ").split()):
+        item_class = CLASS_KEYWORDS.get(word)
+        if item_class:
+            return item_class
+    return None
+
+
+class ItemInfo:
+    __slots__ = ("name", "base_type", "category_id", "category", "item_class", "unique")
+
+    def __init__(self, name, base_type, category_id, category, item_class, unique):
+        self.name = name
+        self.base_type = base_type
+        self.category_id = category_id
+        self.category = category
+        self.item_class = item_class
+        self.unique = unique
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "base_type": self.base_type,
+            "category_id": self.category_id,
+            "category": self.category,
+            "item_class": self.item_class,
+            "unique": self.unique
+        }
+
+
+class ItemIndex:
+    def __init__(self, catalog_data, version=None):
+        self.version = version
+        self.entries = []
+        self.by_base_type = {}
+        self._keys = []  # Sorted (lowercased word-suffix, entry index) pairs
+        self._class_cache = {}
+        self.tree = []
+        self._build(catalog_data or {})
+
+    def _build(self, catalog_data):
+        seen = set()
+        keys = []
+        for category in catalog_data.get("result", []):
+            category_id = category.get("id")
+            label = category.get("label") or "Unknown"
+            for entry in category.get("entries", []):
+                base_type = entry.get("type")
+                if not base_type:
+                    continue
+                unique = bool(entry.get("flags", {}).get("unique"))
+                name = entry.get("name") if unique and entry.get("name") else base_type
+                if (name, base_type) in seen:
+                    continue
+                seen.add((name, base_type))
+
+                info = ItemInfo(name, base_type, category_id, label, item_class_for(base_type), unique)
+                idx = len(self.entries)
+                self.entries.append(info)
+                if not unique:
+                    self.by_base_type.setdefault(base_type, info)
+
+                words = name.lower().split()
+                for i in range(len(words)):
+                    keys.append((" ".join(words[i:]), idx))
+
+        keys.sort()
+        self._keys = keys
+        self.tree = self._build_tree()
+
+    def _build_tree(self):
+        categories = {}
+        for info in self.entries:
+            category = categories.setdefault(info.category, {
+                "id": info.category_id, "label": info.category, "count": 0, "classes": {}
+            })
+            category["count"] += 1
+            category["classes"].setdefault(info.item_class or "Other", []).append(info.name)
+
+        tree = []
+        for category in categories.values():
+            classes = [{"name": name, "items": items} for name, items in sorted(category["classes"].items())]
+            tree.append({**category, "classes": classes})
+        return tree
+
+    def lookup(self, base_type):
+        return self.by_base_type.get(base_type)
+
+    def item_class(self, base_type):
+        """Item class for a base type: catalog lookup, then memoized keyword rule."""
+        info = self.by_base_type.get(base_type)
+        if info is not None:
+            return info.item_class
+        if base_type not in self._class_cache:
+            self._class_cache[base_type] = item_class_for(base_type)
+        return self._class_cache[base_type]
+
+    def analysis_category(self, base_type):
+        """Grouping key used by analyze_items_logic."""
+        item_class = self.item_class(base_type)
+        return item_class if item_class in ANALYSIS_GROUPS else base_type
+
+    def search(self, query, limit=20):
+        """
+        Prefix search on any word of the item name, e.g. "hunt" finds "Expert Hunter Bow".
+        Full-name prefix matches are ranked first.
+        """
+        query = " ".join(query.lower().split())
+        if not query:
+            return []
+
+        start = bisect.bisect_left(self._keys, (query, -1))
+        full_matches, word_matches, seen = [], [], set()
+        for key, idx in self._keys[start:]:
+            if not key.startswith(query):
+                break
+            if idx in seen:
+                continue
+            seen.add(idx)
+            info = self.entries[idx]
+            if info.name.lower().startswith(query):
+                full_matches.append(info)
+            else:
+                word_matches.append(info)
+
+        ranked = sorted(full_matches, key=lambda i: i.name) + sorted(word_matches, key=lambda i: i.name)
+        return ranked[:limit]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_item_index():
+    """
+    ItemIndex for the current catalog version, rebuilt only when the catalog changes.
+    """
+    global _index
+    from backend.item_catalog import get_item_catalog
+
+    catalog = get_item_catalog().get()
+    index = _index
+    if index is None or index.version != catalog.etag:
+        with _index_lock:
+            if _index is None or _index.version != catalog.etag:
+                _index = ItemIndex(catalog.data, version=catalog.etag)
+            index = _index
+    return index
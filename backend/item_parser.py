@@ -0,0 +1,193 @@
+"""
+Single-pass parsing of fetched trade listings.
+
+PriceAnalyzer used to walk a listing's extended mods once in each extractor and
+again in _is_t1_magic, read the price separately, and re-run the number regex
+over explicitMods/implicitMods for every T1 modifier it labelled. parse_listing()
+visits the listing once: it reads the price, the item fields, every mod's group
+and tier, and the T1-magic verdict; magnitudes and display texts are resolved
+only for the mods an extractor emits. The numbers in each candidate string are
+parsed the first time a modifier needs them and reused for the rest of the item.
+
+The fetch loops parse each listing once and hand the ParsedListing to the
+extractors and validators; those also accept a raw listing dict and parse it.
+"""
+import re
+
+from backend.records import ItemRecord, ModRecord
+
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+
+MOD_GROUPS = ("explicit", "implicit", "fractured", "desecrated")
+# Groups _is_t1_magic judges (implicits do not make a magic item T1)
+T1_MAGIC_GROUPS = ("explicit", "fractured", "desecrated")
+# Top-level item lists that carry the rendered text of a mod group
+CANDIDATE_KEYS = {"explicit": "explicitMods", "implicit": "implicitMods"}
+# Read-only stand-in for missing objects
+_EMPTY = {}
+
+
+def is_t1(tier):
+    return bool(tier) and (tier.startswith("P1") or tier.startswith("S1"))
+
+
+def first_magnitude(raw):
+    """(min, max) of a mod's first magnitude, or None when it has none."""
+    magnitudes = raw.get("magnitudes", [])
+    if magnitudes and isinstance(magnitudes, list):
+        magnitude = magnitudes[0]
+        if isinstance(magnitude, dict):
+            return magnitude.get("min"), magnitude.get("max")
+    return None
+
+
+def own_text(raw):
+    """The mod's own text, else its magnitude range ('' when it has neither)."""
+    display_text = raw.get("text", "").strip()
+    if display_text:
+        return display_text
+    magnitude = first_magnitude(raw)
+    if magnitude is None:
+        return ""
+    low, high = magnitude
+    if low is not None and high is not None:
+        return f"{low} to {high}"
+    if low is not None:
+        return str(low)
+    if high is not None:
+        return str(high)
+    return ""
+
+
+class ParsedListing:
+    """
+    A fetched listing parsed once. item_data is None for a malformed item;
+    mods lists (group, tier, raw mod) for MOD_GROUPS in that order.
+    """
+
+    __slots__ = ('entry', 'listing_id', 'amount', 'currency', 'item_data', 'extended', 'mods',
+                 't1_magic', 'rejected_tier', '_item', '_numbers')
+
+    def __init__(self, entry):
+        self.entry = entry
+        self.listing_id = entry.get("id")
+
+        price_info = (entry.get("listing") or _EMPTY).get("price") or _EMPTY
+        amount = price_info.get("amount")
+        currency = price_info.get("currency")
+        if amount is None or not currency:
+            amount, currency = 0.0, None
+        self.amount = amount
+        self.currency = currency
+
+        self.mods = mods = []
+        self.t1_magic = False
+        self.rejected_tier = None
+        self._item = None
+        self._numbers = None
+        item_data = entry.get("item", _EMPTY)
+        if not isinstance(item_data, dict):
+            self.item_data = self.extended = None
+            return
+        self.item_data = item_data
+
+        extended = item_data.get("extended", _EMPTY)
+        self.extended = extended = extended if isinstance(extended, dict) else _EMPTY
+        groups = extended.get("mods")
+        if not groups or not isinstance(groups, dict):
+            return
+
+        judged = False
+        rejected_tier = None
+        for group in MOD_GROUPS:
+            group_mods = groups.get(group)
+            if not group_mods or not isinstance(group_mods, list):
+                continue
+            judge = group in T1_MAGIC_GROUPS
+            for raw in group_mods:
+                tier = raw.get("tier", "")
+                mods.append((group, tier, raw))
+                if judge:
+                    judged = True
+                    # is_t1(tier), inlined on the per-mod path
+                    if rejected_tier is None and not (tier and (tier.startswith("P1") or tier.startswith("S1"))):
+                        rejected_tier = tier
+        self.rejected_tier = rejected_tier
+        self.t1_magic = judged and rejected_tier is None
+
+    @property
+    def item(self):
+        """ItemRecord shared by the listing's ModRecords (None for a malformed item)."""
+        if self._item is None and self.item_data is not None:
+            self._item = ItemRecord.from_item_data(self.item_data)
+        return self._item
+
+    @property
+    def price(self):
+        """(amount, currency), or (0.0, None) when unpriced."""
+        return self.amount, self.currency
+
+    def group_count(self, group):
+        return sum(1 for mod in self.mods if mod[0] == group)
+
+    def candidate_numbers(self, group):
+        """[(text, numbers)] for the group's rendered mod texts that contain numbers, parsed once per item."""
+        if self._numbers is None:
+            self._numbers = {}
+        numbers = self._numbers.get(group)
+        if numbers is None:
+            key = CANDIDATE_KEYS.get(group)
+            candidates = (self.item_data.get(key) or []) if key else []
+            numbers = []
+            for candidate in candidates:
+                if isinstance(candidate, str):
+                    values = [float(x) for x in _NUMBER.findall(candidate)]
+                    if values:
+                        numbers.append((candidate, values))
+            self._numbers[group] = numbers
+        return numbers
+
+    def match_display_text(self, group, magnitude):
+        """
+        First rendered text of the group with a number in the magnitude range
+        ("reduced" mods are negative in data but positive in text), or None.
+        """
+        low = float(magnitude[0]) if magnitude[0] is not None else -999999
+        high = float(magnitude[1]) if magnitude[1] is not None else 999999
+        negative = low < 0 and high < 0
+        for candidate, values in self.candidate_numbers(group):
+            for value in values:
+                if low <= value <= high or (negative and -high <= value <= -low):
+                    return candidate
+        return None
+
+    def t1_modifiers(self):
+        """ModRecords (with magnitudes) of the T1 (P1/S1) mods, labelled from the rendered texts when they match."""
+        modifiers = []
+        for group, tier, raw in self.mods:
+            if not is_t1(tier):
+                continue
+            magnitude = first_magnitude(raw)
+            display_text = magnitude is not None and self.match_display_text(group, magnitude)
+            if not display_text:
+                display_text = own_text(raw) or raw.get("name", "Unknown Modifier")
+            if display_text:
+                low, high = magnitude or (None, None)
+                magnitudes = (float(low) if low else None, float(high) if high else None)
+                modifiers.append(ModRecord(raw.get("name", ""), tier, group, self.item, display_text, magnitudes))
+        return modifiers
+
+    def modifier_records(self):
+        """ModRecords (without magnitudes) of every mod, labelled from the mod data alone."""
+        return [ModRecord(raw.get("name", ""), tier, group, self.item,
+                          own_text(raw) or raw.get("name", "Unknown Modifier"))
+                for group, tier, raw in self.mods]
+
+
+def parse_listing(entry):
+    """ParsedListing for a fetched listing (returned as is if already parsed); None for a non-dict entry."""
+    if isinstance(entry, ParsedListing):
+        return entry
+    if not isinstance(entry, dict):
+        return None
+    return ParsedListing(entry)
@@ -0,0 +1,750 @@
+"""
+Background analysis jobs, decoupled from the request-serving process.
+
+Routes only enqueue a Job document (status 'queued', kind + params). A JobWorker
+claims queued jobs atomically and runs the handler registered for their kind:
+
+- JOB_MODE=thread (default): the web process runs a JobWorker on background
+  threads, started on the first enqueue.
+- JOB_MODE=worker: the web process only enqueues; `python -m backend.worker`
+  runs the JobWorker in its own process(es).
+
+The Job collection is the queue, so any number of worker processes/nodes can
+pull from it. A claim takes a lease (JOB_LEASE_SECONDS) identified by a fresh
+lease token; a heartbeat thread renews it while the job runs, and every write
+to a claimed job is conditioned on the token. When a worker dies its lease
+expires and the next claim picks the job up again, resuming after the last
+completed unit (e.g. the last analyzed base). A job whose lease expired
+JOB_MAX_ATTEMPTS times is failed instead of being retried forever.
+
+Jobs are claimed by priority class (interactive, then batch, then background),
+oldest first within a class. Long jobs checkpoint between units of work; at a
+preemptible checkpoint a job that has a more urgent job waiting for
+JOB_PREEMPT_GRACE_SECONDS goes back to 'queued' with its progress, so the
+urgent job runs next and the preempted one resumes after it. Trade requests
+made by a job are charged to its class in the process-wide rate budget
+(backend/trade_api.py), where a share is reserved for interactive work.
+
+A job enqueued with params['profile'] runs under a profiler and stores one
+Profile per run (backend/profiling.py).
+
+Shutdown drains: no new jobs are claimed, running jobs get JOB_DRAIN_SECONDS to
+finish. A job still running after that stops at its next checkpoint and goes
+back to 'queued', keeping its progress, so the next worker resumes it.
+"""
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from mongoengine.errors import SaveConditionError
+from pymongo import ReturnDocument
+
+from backend.database import Job, ItemAnalysis, Bucket, ExcludedModifier, JOB_PRIORITIES, save_analysis
+
+
+JOB_MODE = os.getenv('JOB_MODE', 'thread')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '1'))
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', '2'))
+JOB_DRAIN_SECONDS = float(os.getenv('JOB_DRAIN_SECONDS', '60'))
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', '90'))
+JOB_HEARTBEAT_SECONDS = float(os.getenv('JOB_HEARTBEAT_SECONDS', str(JOB_LEASE_SECONDS / 3)))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+# An idle worker normally picks urgent jobs up within a poll; only preempt running work after that
+JOB_PREEMPT_GRACE_SECONDS = float(os.getenv('JOB_PREEMPT_GRACE_SECONDS', str(JOB_POLL_SECONDS)))
+QUERY_ANALYSIS_DEFAULT_LIMIT = int(os.getenv('QUERY_ANALYSIS_DEFAULT_LIMIT', '100'))
+QUERY_ANALYSIS_MAX_LIMIT = int(os.getenv('QUERY_ANALYSIS_MAX_LIMIT', '5000'))
+QUERY_FETCH_DELAY_SECONDS = float(os.getenv('QUERY_FETCH_DELAY_SECONDS', '0.5'))
+QUERY_PARTIAL_EVERY = int(os.getenv('QUERY_PARTIAL_EVERY', '100'))  # Publish a partial aggregate every N listings
+JOB_STREAM_POLL_SECONDS = float(os.getenv('JOB_STREAM_POLL_SECONDS', '1'))
+JOB_STREAM_HEARTBEAT_SECONDS = float(os.getenv('JOB_STREAM_HEARTBEAT_SECONDS', '15'))
+
+HANDLERS = {}
+# Priority class of each kind when the caller does not choose one
+KIND_PRIORITIES = {
+    'query_analysis': 'interactive',
+    'distribution': 'interactive',
+    'batch_analysis': 'batch'
+}
+
+
+class JobInterrupted(Exception):
+    """Raised at a checkpoint when the worker is shutting down and the drain window is over."""
+
+
+class JobPreempted(JobInterrupted):
+    """Raised at a preemptible checkpoint when a more urgent job is waiting."""
+
+
+class JobLeaseLost(Exception):
+    """Raised when another worker has taken over the job (our lease expired)."""
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def job_handler(kind):
+    """Register a function(job, worker) as the handler for a job kind."""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue_job(kind, params=None, total=0, current_item=None, priority=None):
+    """
+    Create a queued job and wake the in-process worker (thread mode).
+    priority is one of JOB_PRIORITIES; defaults to KIND_PRIORITIES[kind], else 'batch'.
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    priority = priority or KIND_PRIORITIES.get(kind, 'batch')
+    if priority not in JOB_PRIORITIES:
+        raise ValueError(f"Unknown priority: {priority}")
+    job = Job(kind=kind, params=params or {}, total=total, current_item=current_item,
+              priority=JOB_PRIORITIES.index(priority), status='queued')
+    job.save()
+    if JOB_MODE == 'thread':
+        get_job_worker().start().notify()
+    return job
+
+
+def exclusion_rules(exclusions):
+    """
+    Exclusions stored in job params (dicts, see ExcludedModifier.to_dict) as
+    unsaved ExcludedModifier rules, the form PriceAnalyzer reads. JobWorker.run_job
+    exposes them to handlers as job.exclusions.
+    """
+    rules = []
+    for exclusion in exclusions or []:
+        if isinstance(exclusion, dict):
+            exclusion = ExcludedModifier(
+                mod_name_pattern=exclusion.get('mod_name_pattern'),
+                mod_tier=exclusion.get('mod_tier'),
+                mod_type=exclusion.get('mod_type'),
+                reason=exclusion.get('reason')
+            )
+        rules.append(exclusion)
+    return rules
+
+
+def _claimable(now):
+    """Queued jobs, plus processing jobs whose lease expired (their worker died) with attempts left."""
+    return {'$or': [
+        {'status': 'queued'},
+        {'status': 'processing', 'lease_expires_at': {'$lt': now}, 'attempts': {'$lt': JOB_MAX_ATTEMPTS}},
+        # Claimed before leases existed, or by a worker that never got to set one
+        {'status': 'processing', 'lease_expires_at': None}
+    ]}
+
+
+def claim_next_job(worker_id=None, lease_seconds=None):
+    """
+    Atomically claim the most urgent, then oldest, claimable job for worker_id and take a lease on it.
+    Returns None if the queue is empty. The returned Job only saves while the lease is held.
+    """
+    now = datetime.utcnow()
+    lease_seconds = JOB_LEASE_SECONDS if lease_seconds is None else lease_seconds
+    token = uuid.uuid4().hex
+    doc = Job._get_collection().find_one_and_update(
+        _claimable(now),
+        {
+            '$set': {
+                'status': 'processing',
+                'started_at': now,
+                'worker_id': worker_id or default_worker_id(),
+                'lease_token': token,
+                'lease_expires_at': now + timedelta(seconds=lease_seconds),
+                'heartbeat_at': now
+            },
+            '$inc': {'attempts': 1}
+        },
+        sort=[('priority', 1), ('created_at', 1)],
+        return_document=ReturnDocument.AFTER
+    )
+    if not doc:
+        return None
+    job = Job._from_son(doc)
+    job.hold_lease(token)
+    if job.attempts > 1:
+        print(f"Job {job.id}: lease recovered by {job.worker_id} (attempt {job.attempts}), resuming at {job.progress}/{job.total}")
+    return job
+
+
+def renew_lease(job_id, token, lease_seconds=None):
+    """Extend a held lease. Returns False if the lease was lost to another worker."""
+    now = datetime.utcnow()
+    lease_seconds = JOB_LEASE_SECONDS if lease_seconds is None else lease_seconds
+    result = Job._get_collection().update_one(
+        {'_id': job_id, 'lease_token': token, 'status': 'processing'},
+        {'$set': {'lease_expires_at': now + timedelta(seconds=lease_seconds), 'heartbeat_at': now}}
+    )
+    return result.matched_count == 1
+
+
+def fail_exhausted_jobs():
+    """Fail processing jobs whose lease expired after JOB_MAX_ATTEMPTS claims."""
+    now = datetime.utcnow()
+    result = Job._get_collection().update_many(
+        {'status': 'processing', 'lease_expires_at': {'$lt': now}, 'attempts': {'$gte': JOB_MAX_ATTEMPTS}},
+        {'$set': {
+            'status': 'failed',
+            'error': f'Job abandoned: worker lease expired {JOB_MAX_ATTEMPTS} times',
+            'finished_at': now,
+            'lease_token': None
+        }}
+    )
+    return result.modified_count
+
+
+def higher_priority_waiting(priority, grace_seconds=None):
+    """True if a job more urgent than priority has been queued for at least grace_seconds."""
+    if not priority:
+        return False
+    grace_seconds = JOB_PREEMPT_GRACE_SECONDS if grace_seconds is None else grace_seconds
+    waiting = Job._get_collection().find_one({
+        'status': 'queued',
+        'priority': {'$lt': priority},
+        'created_at': {'$lte': datetime.utcnow() - timedelta(seconds=grace_seconds)}
+    }, {'_id': 1})
+    return waiting is not None
+
+
+def queue_stats():
+    """Job counts per status and queued jobs per priority class, plus the workers currently holding leases."""
+    collection = Job._get_collection()
+    counts = {row['_id']: row['count'] for row in collection.aggregate([
+        {'$group': {'_id': '$status', 'count': {'$sum': 1}}}
+    ])}
+    queued = {row['_id']: row['count'] for row in collection.aggregate([
+        {'$match': {'status': 'queued'}},
+        {'$group': {'_id': '$priority', 'count': {'$sum': 1}}}
+    ])}
+    workers = collection.distinct('worker_id', {
+        'status': 'processing', 'lease_expires_at': {'$gte': datetime.utcnow()}
+    })
+    return {
+        'queued': counts.get('queued', 0),
+        'processing': counts.get('processing', 0),
+        'completed': counts.get('completed', 0),
+        'failed': counts.get('failed', 0),
+        'queued_by_priority': {name: queued.get(i, 0) for i, name in enumerate(JOB_PRIORITIES)},
+        'active_workers': sorted(w for w in workers if w)
+    }
+
+
+def stream_job_events(job_id, poll_seconds=None, heartbeat_seconds=None):
+    """
+    Tail a job and yield events as plain dicts until it finishes:
+    {'event': 'result', 'index': i, 'result': {...}} for each new result,
+    {'event': 'partial', 'data': {...}} when the job publishes a new partial aggregate,
+    {'event': 'progress', ...} when progress changes, {'event': 'heartbeat'}
+    while idle (keeps proxies from closing the connection), and a final
+    {'event': 'end', 'status': ..., 'error': ...}.
+    Only results not yet sent are read on each poll.
+    """
+    poll_seconds = JOB_STREAM_POLL_SECONDS if poll_seconds is None else poll_seconds
+    heartbeat_seconds = JOB_STREAM_HEARTBEAT_SECONDS if heartbeat_seconds is None else heartbeat_seconds
+    collection = Job._get_collection()
+    job_oid = ObjectId(job_id)
+    sent = 0
+    partial_seq = 0
+    last_progress = None
+    last_event = time.monotonic()
+
+    while True:
+        doc = collection.find_one(
+            {'_id': job_oid},
+            {'status': 1, 'progress': 1, 'total': 1, 'current_item': 1, 'error': 1, 'partial_seq': 1,
+             'results': {'$slice': [sent, 1000]}}
+        )
+        if doc is None:
+            yield {'event': 'end', 'status': 'missing', 'error': 'Job not found'}
+            return
+
+        if (doc.get('partial_seq') or 0) > partial_seq and doc.get('status') not in ('completed', 'failed'):
+            partial = collection.find_one({'_id': job_oid}, {'partial': 1, 'partial_seq': 1}) or {}
+            partial_seq = partial.get('partial_seq') or 0
+            last_event = time.monotonic()
+            yield {'event': 'partial', 'data': partial.get('partial') or {}}
+
+        for result in doc.get('results') or []:
+            yield {'event': 'result', 'index': sent, 'result': result}
+            sent += 1
+            last_event = time.monotonic()
+
+        progress = (doc.get('progress'), doc.get('total'), doc.get('current_item'))
+        if progress != last_progress:
+            last_progress = progress
+            last_event = time.monotonic()
+            yield {'event': 'progress', 'progress': progress[0], 'total': progress[1], 'current_item': progress[2]}
+
+        if doc.get('status') in ('completed', 'failed'):
+            yield {'event': 'end', 'status': doc['status'], 'error': doc.get('error')}
+            return
+
+        if time.monotonic() - last_event >= heartbeat_seconds:
+            last_event = time.monotonic()
+            yield {'event': 'heartbeat'}
+        time.sleep(poll_seconds)
+
+
+class JobWorker:
+    def __init__(self, workers=None, poll_seconds=None, worker_id=None):
+        self.workers = workers or JOB_WORKERS
+        self.poll_seconds = JOB_POLL_SECONDS if poll_seconds is None else poll_seconds
+        self.worker_id = worker_id or f"{default_worker_id()}:{uuid.uuid4().hex[:6]}"
+        self._threads = []
+        self._heartbeat = None
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._deadline = None
+        self._lock = threading.Lock()
+        self._leases = {}  # job id -> lease token, for jobs running on this worker
+        self._lost = set()  # job ids whose lease was taken over
+        self._current = threading.local()
+        self.running = 0
+
+    def start(self):
+        with self._lock:
+            if self._threads and not self._stopping.is_set():
+                return self
+            self._stopping.clear()
+            self._deadline = None
+            self._threads = [
+                threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            if self._heartbeat is None or not self._heartbeat.is_alive():
+                self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+                self._heartbeat.start()
+        return self
+
+    def notify(self):
+        self._wake.set()
+
+    @property
+    def stopping(self):
+        return self._stopping.is_set()
+
+    def checkpoint(self, preemptible=False):
+        """
+        Called by handlers between units of work. Stops the job if its lease was
+        lost, or once the drain window has passed during shutdown. Handlers that
+        resume from job.progress pass preemptible=True to also yield to more
+        urgent queued jobs.
+        """
+        if getattr(self._current, 'job_id', None) in self._lost:
+            raise JobLeaseLost()
+        if self._deadline is not None and time.monotonic() >= self._deadline:
+            raise JobInterrupted()
+        if preemptible and higher_priority_waiting(getattr(self._current, 'priority', 0)):
+            raise JobPreempted()
+
+    def _heartbeat_loop(self):
+        while not (self._stopping.is_set() and not self._leases):
+            time.sleep(JOB_HEARTBEAT_SECONDS if not self._stopping.is_set() else 0.5)
+            for job_id, token in list(self._leases.items()):
+                try:
+                    if not renew_lease(job_id, token):
+                        print(f"Job {job_id}: lease lost, stopping at the next checkpoint")
+                        self._lost.add(job_id)
+                except Exception as e:
+                    print(f"Job {job_id}: lease renewal failed: {e}")
+
+    def stop(self, drain_seconds=None):
+        """Stop claiming jobs and wait up to drain_seconds for running jobs to finish."""
+        drain_seconds = JOB_DRAIN_SECONDS if drain_seconds is None else drain_seconds
+        if not self._threads:
+            return
+        print(f"Job worker draining ({self.running} running, up to {drain_seconds}s)...")
+        self._deadline = time.monotonic() + drain_seconds
+        self._stopping.set()
+        self._wake.set()
+        for thread in self._threads:
+            # Handlers stop at their next checkpoint after the deadline; allow a little slack for it
+            thread.join(max(0.0, self._deadline - time.monotonic()) + 5)
+        self._threads = []
+        print("Job worker stopped")
+
+    def run_forever(self):
+        """Run the worker in the foreground until interrupted (used by backend/worker.py)."""
+        self.start()
+        try:
+            while any(t.is_alive() for t in self._threads):
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                job = claim_next_job(self.worker_id)
+                if job is None:
+                    fail_exhausted_jobs()
+            except Exception as e:
+                print(f"Job worker could not poll the queue: {e}")
+                job = None
+
+            if job is None:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+
+            with self._lock:
+                self.running += 1
+            try:
+                self.run_job(job)
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+    def run_job(self, job):
+        from backend.trade_api import RequestStats, request_accounting, request_priority
+        from backend.profiling import finish_profile
+
+        handler = HANDLERS.get(job.kind)
+        job_id = str(job.id)
+        token = job.held_lease()
+        if token:
+            self._leases[job.id] = token
+        self._current.job_id = job.id
+        self._current.priority = job.priority
+        try:
+            if handler is None:
+                raise ValueError(f"No handler for job kind '{job.kind}'")
+            self._sync_currency_rates()
+            # Params hold exclusions as dicts; handlers get the rules PriceAnalyzer reads
+            job.exclusions = exclusion_rules((job.params or {}).get('exclusions'))
+            # Totals accumulate across resumptions of the same job
+            stats = RequestStats(job.request_stats)
+            profiler = self._start_profiler(job)
+            try:
+                with request_priority(job.priority_class), request_accounting(stats):
+                    handler(job, self)
+            finally:
+                job.request_stats = stats.to_dict()
+                if profiler is not None:
+                    finish_profile(profiler, 'job', job.kind, job_id=job_id)
+            job.status = 'completed'
+            job.current_item = None
+            job.finished_at = datetime.utcnow()
+            job.lease_expires_at = None
+            job.save()
+            print(f"Job {job_id} completed successfully")
+        except (JobLeaseLost, SaveConditionError):
+            # Another worker owns the job now; leave the document to it
+            print(f"Job {job_id}: lease lost to another worker, abandoning")
+        except JobInterrupted as e:
+            job.status = 'queued'
+            job.lease_expires_at = None
+            job.attempts = max(0, (job.attempts or 1) - 1)  # A drain or preemption is not a failed attempt
+            self._save_quietly(job)
+            reason = 'preempted by a more urgent job' if isinstance(e, JobPreempted) else 'interrupted by shutdown'
+            print(f"Job {job_id} {reason} at {job.progress}/{job.total}, re-queued")
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            traceback.print_exc()
+            job.status = 'failed'
+            job.error = str(e)
+            job.finished_at = datetime.utcnow()
+            job.lease_expires_at = None
+            self._save_quietly(job)
+        finally:
+            self._leases.pop(job.id, None)
+            self._lost.discard(job.id)
+            self._current.job_id = None
+            self._current.priority = None
+
+    @staticmethod
+    def _sync_currency_rates():
+        """Price the job with the newest persisted rates, wherever they were posted."""
+        from backend.currency_service import get_currency_service
+
+        try:
+            get_currency_service().sync_latest()
+        except Exception as e:
+            print(f"Could not check for newer currency rates: {e}")
+
+    @staticmethod
+    def _start_profiler(job):
+        """Profiler for a job enqueued with params['profile'] (see backend/profiling.py), else None."""
+        from backend.profiling import PROFILING_ENABLED, profile_mode, start_profiler
+
+        try:
+            mode = profile_mode((job.params or {}).get('profile'))
+        except ValueError:
+            mode = None
+        if not mode or not PROFILING_ENABLED:
+            return None
+        return start_profiler(mode)
+
+    @staticmethod
+    def _save_quietly(job):
+        try:
+            job.save()
+        except SaveConditionError:
+            print(f"Job {job.id}: lease lost to another worker, not updating")
+
+
+@job_handler('batch_analysis')
+def run_batch_analysis(job, worker):
+    """
+    Analyze each base in params['bases'], resuming after the last completed base.
+    Identical analyses are coalesced (see backend/coalescing.py): a base analyzed
+    within params['max_age_minutes'] (default ANALYSIS_FRESHNESS_MINUTES) is reused,
+    and a base another job is analyzing right now is awaited instead of re-queried.
+    Reused results are marked with 'reused': 'fresh' | 'coalesced'.
+    """
+    from backend.price_analyzer import PriceAnalyzer
+    from backend.trade_api import DEFAULT_LEAGUE, pause
+    from backend.coalescing import coalesced_analysis, ANALYZED
+
+    params = job.params or {}
+    bases = params.get('bases', [])
+    league = params.get('league', DEFAULT_LEAGUE)
+    exclusions = job.exclusions  # Rebuilt from params by JobWorker.run_job
+    analyzer = PriceAnalyzer()
+
+    for base in bases[job.progress:]:
+        worker.checkpoint(preemptible=True)
+        job.current_item = base
+        job.save()
+
+        print(f"Job {job.id}: Analyzing {base}...")
+        source = None
+        try:
+            analysis, source = coalesced_analysis(
+                base,
+                lambda key, base=base: save_analysis(
+                    analyzer=analyzer,
+                    base_type=base,
+                    session_id=params.get('session_id'),
+                    excluded_mods=exclusions,
+                    league=league,
+                    analysis_key=key
+                ),
+                league=league,
+                exclusions=exclusions,
+                max_age_minutes=params.get('max_age_minutes'),
+                owner=worker.worker_id
+            )
+            result = analysis.to_dict()
+            if source != ANALYZED:
+                result['reused'] = source
+            job.results.append(result)
+        except Exception as e:
+            print(f"Job {job.id}: Error analyzing {base}: {e}")
+            job.results.append({"base_type": base, "error": str(e)})
+
+        job.progress += 1
+        job.save()
+
+        if job.progress < len(bases) and source in (None, ANALYZED):
+            pause(2)  # Rate limit politeness; reused results cost no trade requests
+
+
+@job_handler('distribution')
+def run_distribution_analysis(job, worker):
+    """
+    Price distribution (deep dive) analysis for params['base_type'].
+    """
+    from backend.price_analyzer import PriceAnalyzer
+
+    params = job.params or {}
+    base_type = params.get('base_type')
+    print(f"Job {job.id}: Analyzing distribution for {base_type}...")
+    dist_result = PriceAnalyzer().analyze_distribution(base_type, params.get('session_id'))
+
+    buckets = []
+    for b in dist_result['buckets']:
+        # common_stats is a list of modifier dicts from _extract_all_modifiers;
+        # display_text is used as the attribute name (includes the value)
+        attrs = {}
+        for stat in b.get('common_stats', []):
+            name = stat.get('display_text') or stat.get('name')
+            if name:
+                attrs[name] = attrs.get(name, 0) + 1
+
+        b_min = b['min']
+        b_max = b['max']
+        buckets.append(Bucket(
+            price_range=f"{b_min} - {b_max}" if b_max is not None else f"{b_min}+",
+            min_price=float(b_min),
+            max_price=float(b_max) if b_max is not None else None,
+            count=int(b['count']),
+            avg_price=float(b['avg_price']),
+            attributes=attrs
+        ))
+
+    analysis = ItemAnalysis(
+        base_type=base_type,
+        min_price=float(dist_result['min_price']),
+        max_price=float(dist_result['max_price']),
+        currency="exalted",
+        buckets=buckets
+    )
+    analysis.save()
+
+    job.progress = 1
+    job.results = [analysis.to_dict()]
+
+
+def _price_filter(query):
+    """filters.trade_filters.filters.price of a trade query, created if missing."""
+    return query.setdefault("filters", {}).setdefault("trade_filters", {}) \
+        .setdefault("filters", {}).setdefault("price", {})
+
+
+def _set_price_min(query, amount, option=None):
+    """Raise price.min on a trade query, keeping the user's max; option is only set when given."""
+    price = _price_filter(query)
+    price["min"] = amount
+    if option:
+        price["option"] = option
+
+
+@job_handler('query_analysis')
+def run_query_analysis(job, worker):
+    """
+    Modifier statistics for an ad-hoc trade query, over up to params['limit'] listings.
+
+    A trade search returns at most ~100 listing IDs, so larger limits walk the price
+    axis: results are sorted by price ascending, and when a page is used up the search
+    is repeated with price.min set to the price of the last listing fetched. Without a
+    price filter of the user's own, that is the listing's amount in its own currency
+    (price.option), so the site converts it with the same rates it sorts by. A user's
+    max and option are kept; their min is then expressed in the user's currency, which
+    goes through our CurrencyService rates when the listing was priced in another one,
+    and listings near the boundary can be missed where those rates disagree with the
+    site's. The walk stops once the next min passes the user's max. Listings already
+    counted are skipped. The search has no offset, so when a whole page ties at
+    price.min the walk steps just past that price instead of stalling on the same
+    page. Aggregates are built incrementally and published to job.partial every
+    QUERY_PARTIAL_EVERY listings.
+    """
+    import copy
+    import math
+    from backend.trade_api import TradeAPI, pause
+    from backend.currency_service import get_currency_service
+    from backend.query_analysis import ItemStatsAccumulator
+
+    params = job.params or {}
+    limit = min(int(params.get('limit') or QUERY_ANALYSIS_DEFAULT_LIMIT), QUERY_ANALYSIS_MAX_LIMIT)
+    league = params.get('league', "Fate of the Vaal")
+    api = TradeAPI(session_id=params.get('session_id'))
+    currency_service = get_currency_service()
+    accumulator = ItemStatsAccumulator()
+
+    user_price = _price_filter(copy.deepcopy(params.get('query') or {}))
+    # With a user price filter, min stays in its unit (unset option: the site's Exalted equivalent)
+    user_unit = user_price.get("option") if user_price else None
+    user_max = user_price.get("max")
+
+    def next_floor(items):
+        """(min, option) for the next page from the last priced listing, or None."""
+        for item in reversed(items):
+            price = (item.get("listing") or {}).get("price") or {}
+            amount, currency = price.get("amount"), price.get("currency")
+            if not amount or not currency:
+                continue
+            if not user_price:
+                return float(amount), currency
+            unit = user_unit or "exalted"
+            if currency == unit:
+                return float(amount), user_unit
+            per_unit = currency_service.normalize_to_exalted(1, unit)
+            if per_unit > 0:
+                return currency_service.normalize_to_exalted(amount, currency) / per_unit, user_unit
+        return None
+
+    # An interrupted query job restarts from scratch: the accumulator is not persisted
+    job.progress = 0
+    job.total = limit
+    seen = set()
+    floor = None  # (min, option) of the next search
+    stepped_past_tie = False
+    next_partial = QUERY_PARTIAL_EVERY
+    pages = 0
+
+    while len(seen) < limit:
+        worker.checkpoint()
+        if floor is not None and user_max is not None and floor[0] > user_max:
+            break
+        query = copy.deepcopy(params.get('query') or {})
+        query["sort"] = {"price": "asc"}
+        if floor is not None:
+            _set_price_min(query, *floor)
+
+        job.current_item = f"search page {pages + 1}"
+        job.save()
+        search_result = api.search(query, league)
+        pages += 1
+        result_ids = search_result.get("result", [])
+        query_id = search_result.get("id")
+        new_ids = [i for i in result_ids if i not in seen][:limit - len(seen)]
+        if not new_ids:
+            if pages == 1:
+                raise ValueError("No items found for this query")
+            more = len(result_ids) < (search_result.get("total") or 0)
+            if floor is None or not more or stepped_past_tie:
+                break
+            # A full page ties at the floor and the search cannot offset: step just past the tie
+            print(f"Query job {job.id}: page {pages} ties at {floor[0]} {floor[1] or 'exalted'}, stepping past it")
+            floor = (math.nextafter(floor[0], math.inf), floor[1])
+            stepped_past_tie = True
+            continue
+        stepped_past_tie = False
+
+        for start in range(0, len(new_ids), 10):
+            worker.checkpoint()
+            batch = new_ids[start:start + 10]
+            items = [i for i in api.fetch(batch, query_id).get("result", []) if i]
+            seen.update(batch)
+            accumulator.add(items)
+            # Listings come back in search order, so the last one is the highest price so far
+            floor = next_floor(items) or floor
+
+            job.progress = len(seen)
+            if job.progress >= next_partial:
+                next_partial = job.progress + QUERY_PARTIAL_EVERY
+                job.partial = {'items_analyzed': accumulator.items_seen, 'stats': accumulator.result()}
+                job.partial_seq += 1
+            job.save()
+            pause(QUERY_FETCH_DELAY_SECONDS)  # Politeness delay
+
+        # The search returned everything that matches: no need to walk further
+        if len(result_ids) >= (search_result.get("total") or 0):
+            break
+
+    job.progress = len(seen)
+    job.total = len(seen)
+    job.partial = {}
+    job.results = [accumulator.result()]
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_job_worker():
+    """Process-wide JobWorker."""
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = JobWorker()
+    return _worker
+
+
+def shutdown_job_worker(drain_seconds=None):
+    """Drain the in-process worker, if one was started."""
+    if _worker is not None:
+        _worker.stop(drain_seconds)
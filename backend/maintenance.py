@@ -0,0 +1,243 @@
+"""
+Retention policy and compaction for historical data.
+
+- Finished jobs expire through a TTL index on Job.finished_at.
+- AnalysisResult documents older than the raw retention window are rolled up
+  into one summary per (base_type, league, analysis_key, day): averages are kept
+  so the time series survives and request_stats are summed so cost reports still
+  count the deleted runs; embedded modifiers and raw_data are dropped.
+- ItemAnalysis documents older than the window lose their per-bucket attribute maps.
+- SearchHistory entries are deleted after their own (optional) retention window.
+
+All windows are configured through environment variables; 0 disables a rule.
+"""
+import os
+from datetime import datetime, timedelta
+
+import bson
+from pymongo.errors import OperationFailure
+
+from backend.database import AnalysisResult, ItemAnalysis, SearchHistory, Job
+
+
+JOB_RETENTION_DAYS = float(os.getenv('JOB_RETENTION_DAYS', '7'))
+ANALYSIS_RAW_RETENTION_DAYS = float(os.getenv('ANALYSIS_RAW_RETENTION_DAYS', '30'))
+ITEM_ANALYSIS_RAW_RETENTION_DAYS = float(os.getenv('ITEM_ANALYSIS_RAW_RETENTION_DAYS', '30'))
+SEARCH_HISTORY_RETENTION_DAYS = float(os.getenv('SEARCH_HISTORY_RETENTION_DAYS', '0'))
+MAINTENANCE_INTERVAL_HOURS = float(os.getenv('MAINTENANCE_INTERVAL_HOURS', '24'))
+
+AVERAGED_FIELDS = ('normal_avg_ex', 'crafting_avg_ex', 'magic_avg_ex', 'gap_ex')
+
+_last_report = None
+
+
+def _bson_size(doc) -> int:
+    return len(bson.encode(doc))
+
+
+def _day_cutoff(now: datetime, days: float) -> datetime:
+    """Cutoff aligned to midnight so a day is always compacted as a whole."""
+    cutoff = now - timedelta(days=days)
+    return cutoff.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def ensure_job_ttl_index(retention_days: float = None):
+    """
+    Create (or retune) the TTL index that expires finished jobs.
+    Jobs without finished_at (queued/processing) are never expired by Mongo.
+    """
+    retention_days = JOB_RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days <= 0:
+        return None
+
+    seconds = int(retention_days * 86400)
+    collection = Job._get_collection()
+    try:
+        return collection.create_index('finished_at', name='finished_at_ttl', expireAfterSeconds=seconds)
+    except OperationFailure:
+        # Index exists with a different expireAfterSeconds; adjust it in place
+        collection.database.command({
+            'collMod': collection.name,
+            'index': {'name': 'finished_at_ttl', 'expireAfterSeconds': seconds}
+        })
+        return 'finished_at_ttl'
+
+
+def _sum_request_stats(stats) -> dict:
+    """Field-wise sum of RequestStats dicts (counts and seconds)."""
+    total = {}
+    for entry in stats:
+        for field, value in (entry or {}).items():
+            if isinstance(value, (int, float)):
+                total[field] = total.get(field, 0) + value
+    return {field: round(value, 3) if isinstance(value, float) else value for field, value in total.items()}
+
+
+def compact_analyses(now: datetime = None, retention_days: float = None) -> dict:
+    """
+    Roll up old AnalysisResult documents into one summary per (base_type, league,
+    analysis_key, day), so runs with different leagues or exclusion sets are never
+    averaged together. The latest document of each group survives with averaged
+    prices, sample_count and summed request_stats; the others are deleted.
+    """
+    now = now or datetime.utcnow()
+    retention_days = ANALYSIS_RAW_RETENTION_DAYS if retention_days is None else retention_days
+    report = {'groups': 0, 'compacted': 0, 'deleted': 0, 'bytes_reclaimed': 0}
+    if retention_days <= 0:
+        return report
+
+    collection = AnalysisResult._get_collection()
+    cutoff = _day_cutoff(now, retention_days)
+    cursor = collection.find(
+        {'compacted': {'$ne': True}, 'created_at': {'$lt': cutoff}}
+    ).sort([('base_type', 1), ('league', 1), ('analysis_key', 1), ('created_at', 1)])
+
+    group_key = None
+    group = []
+
+    def flush(docs):
+        if not docs:
+            return
+        size_before = sum(_bson_size(d) for d in docs)
+        survivor = docs[-1]
+
+        updates = {
+            'compacted': True,
+            'sample_count': sum(d.get('sample_count') or 1 for d in docs),
+            # Keep every listing price of the day, stamped with its own analysis time,
+            # so re-pricing converts each at the rates in effect when it was quoted
+            'price_samples': [{**p, 'created_at': p.get('created_at') or d['created_at']}
+                              for d in docs for p in d.get('price_samples', [])]
+        }
+        for field in AVERAGED_FIELDS:
+            values = [d[field] for d in docs if d.get(field) is not None]
+            if values:
+                updates[field] = round(sum(values) / len(values), 2)
+        request_stats = _sum_request_stats(d.get('request_stats') for d in docs)
+        if request_stats:
+            updates['request_stats'] = request_stats
+
+        collection.update_one(
+            {'_id': survivor['_id']},
+            {'$set': updates, '$unset': {'modifiers': '', 'raw_data': ''}}
+        )
+        others = [d['_id'] for d in docs[:-1]]
+        if others:
+            collection.delete_many({'_id': {'$in': others}})
+
+        compacted = {k: v for k, v in survivor.items() if k not in ('modifiers', 'raw_data')}
+        compacted.update(updates)
+
+        report['groups'] += 1
+        report['compacted'] += 1
+        report['deleted'] += len(others)
+        report['bytes_reclaimed'] += size_before - _bson_size(compacted)
+
+    for doc in cursor:
+        key = (doc.get('base_type'), doc.get('league'), doc.get('analysis_key'), doc['created_at'].date())
+        if key != group_key:
+            flush(group)
+            group_key, group = key, []
+        group.append(doc)
+    flush(group)
+
+    return report
+
+
+def compact_item_analyses(now: datetime = None, retention_days: float = None) -> dict:
+    """Drop per-bucket attribute maps from old distribution analyses."""
+    now = now or datetime.utcnow()
+    retention_days = ITEM_ANALYSIS_RAW_RETENTION_DAYS if retention_days is None else retention_days
+    report = {'compacted': 0, 'bytes_reclaimed': 0}
+    if retention_days <= 0:
+        return report
+
+    collection = ItemAnalysis._get_collection()
+    cutoff = _day_cutoff(now, retention_days)
+    for doc in collection.find({'compacted': {'$ne': True}, 'created_at': {'$lt': cutoff}}):
+        size_before = _bson_size(doc)
+        buckets = [{k: v for k, v in b.items() if k != 'attributes'} for b in doc.get('buckets', [])]
+        collection.update_one({'_id': doc['_id']}, {'$set': {'buckets': buckets, 'compacted': True}})
+
+        doc.update({'buckets': buckets, 'compacted': True})
+        report['compacted'] += 1
+        report['bytes_reclaimed'] += size_before - _bson_size(doc)
+
+    return report
+
+
+def _delete_older_than(collection, query: dict) -> dict:
+    report = {'deleted': 0, 'bytes_reclaimed': 0}
+    ids = []
+    for doc in collection.find(query):
+        ids.append(doc['_id'])
+        report['bytes_reclaimed'] += _bson_size(doc)
+    if ids:
+        report['deleted'] = collection.delete_many({'_id': {'$in': ids}}).deleted_count
+    return report
+
+
+def purge_search_history(now: datetime = None, retention_days: float = None) -> dict:
+    now = now or datetime.utcnow()
+    retention_days = SEARCH_HISTORY_RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days <= 0:
+        return {'deleted': 0, 'bytes_reclaimed': 0}
+    cutoff = now - timedelta(days=retention_days)
+    return _delete_older_than(SearchHistory._get_collection(), {'created_at': {'$lt': cutoff}})
+
+
+def purge_finished_jobs(now: datetime = None, retention_days: float = None) -> dict:
+    """
+    Sweep finished jobs past retention. The TTL index does this in the background;
+    the sweep makes the reclaimed size visible and covers jobs from before
+    finished_at was recorded.
+    """
+    now = now or datetime.utcnow()
+    retention_days = JOB_RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days <= 0:
+        return {'deleted': 0, 'bytes_reclaimed': 0}
+    cutoff = now - timedelta(days=retention_days)
+    return _delete_older_than(Job._get_collection(), {'$or': [
+        {'finished_at': {'$lt': cutoff}},
+        {'finished_at': None, 'status': {'$in': ['completed', 'failed']}, 'created_at': {'$lt': cutoff}}
+    ]})
+
+
+def run_maintenance(now: datetime = None) -> dict:
+    """
+    Apply every retention rule and return a report of what was reclaimed.
+    """
+    global _last_report
+    now = now or datetime.utcnow()
+    started = datetime.utcnow()
+
+    ensure_job_ttl_index()
+    report = {
+        'analyses': compact_analyses(now),
+        'item_analyses': compact_item_analyses(now),
+        'search_history': purge_search_history(now),
+        'jobs': purge_finished_jobs(now),
+    }
+    report['bytes_reclaimed'] = sum(section['bytes_reclaimed'] for section in report.values())
+    report['ran_at'] = started.isoformat()
+    report['duration_s'] = round((datetime.utcnow() - started).total_seconds(), 3)
+
+    print(f"Maintenance finished: reclaimed {report['bytes_reclaimed']} bytes "
+          f"({report['analyses']['deleted']} analyses rolled up, {report['jobs']['deleted']} jobs expired)")
+    _last_report = report
+    return report
+
+
+def get_last_report():
+    return _last_report
+
+
+def start_maintenance_scheduler(interval_hours: float = None):
+    """Start the recurring maintenance task (one process at a time). Returns None when disabled."""
+    from backend.periodic import PeriodicTask
+
+    interval_hours = MAINTENANCE_INTERVAL_HOURS if interval_hours is None else interval_hours
+    if interval_hours <= 0:
+        return None
+    # Every web worker calls this; the lease lets only one of them compact
+    return PeriodicTask('maintenance', interval_hours * 3600, run_maintenance, exclusive=True).start()
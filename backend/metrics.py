@@ -0,0 +1,467 @@
+"""
+Prometheus metrics in the text exposition format (0.0.4), without a client library.
+
+init_metrics(app) times every Flask request per route and serves GET /metrics.
+Other modules record into the module-level metrics below:
+
+- http_request_duration_seconds{method,route,status}   Flask requests
+- trade_api_requests_total / trade_api_request_duration_seconds{endpoint,status}
+- trade_rate_limiter_wait_seconds{priority}              time spent in RateBudget.acquire
+- cache_requests_total{cache,result}                     ETag revalidations, analysis reuse
+- mongo_command_duration_seconds{command,status}         pymongo command monitoring
+
+Job queue depth, worker utilization, item catalog cache counters and MongoDB
+connection pool statistics are read when /metrics is scraped (register_collector).
+
+Values are recorded per process. With METRICS_MULTIPROC_DIR set (gunicorn.conf.py
+sets one up when it runs several workers) every process writes its samples to
+<dir>/metrics-<pid>.json every METRICS_FLUSH_SECONDS, and a scrape of any worker
+sums counters and histograms over all the files, so rate() sees one series per
+deployment whichever worker answers. Counters of exited workers keep counting
+toward the totals; per-process gauges carry a pid label and are dropped once
+the process is gone. Standalone job workers (backend/worker.py) expose their
+own registry on METRICS_PORT.
+"""
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+
+from flask import g, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list(extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0.0)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def combine(a, b):
+        return a + b
+
+    def render(self, values=None):
+        items = sorted((self.snapshot() if values is None else values).items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            idx = bisect.bisect_left(self.buckets, value)
+            if idx < len(self.buckets):
+                series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels):
+        series = self._values.get(self._key(labels))
+        return series[2] if series else 0
+
+    def snapshot(self):
+        with self._lock:
+            return {k: (list(v[0]), v[1], v[2]) for k, v in self._values.items()}
+
+    @staticmethod
+    def combine(a, b):
+        return [x + y for x, y in zip(a[0], b[0])], a[1] + b[1], a[2] + b[2]
+
+    def render(self, values=None):
+        items = sorted((self.snapshot() if values is None else values).items())
+        lines = self.header()
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(float(bound)))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', '+Inf')])} {n}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+def _render_family(name, kind, documentation, samples):
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+    return lines
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, func, per_process=False):
+        """
+        func() -> [(name, kind, help, [(labels dict, value), ...]), ...], called on every scrape.
+        per_process collectors report this process's state (thread pools, caches, connection
+        pools); in multiprocess mode they are written with the process's samples.
+        Others (e.g. queue depth read from MongoDB) are the same from any process.
+        """
+        self.collectors.append((func, per_process))
+        return func
+
+    def _collect(self, per_process):
+        families = []
+        for collector, local in self.collectors:
+            if local != per_process:
+                continue
+            try:
+                families.extend(collector())
+            except Exception as e:
+                print(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+        return families
+
+    def dump(self):
+        """This process's samples as a JSON-serializable dict (multiprocess file contents)."""
+        return {
+            "metrics": {m.name: [[list(k), v] for k, v in m.snapshot().items()] for m in self.metrics},
+            "families": [[name, kind, doc, [[labels, value] for labels, value in samples]]
+                         for name, kind, doc, samples in self._collect(per_process=True)],
+        }
+
+    def render(self, multiproc_dir=None):
+        if multiproc_dir:
+            return self._render_multiprocess(multiproc_dir)
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for family in self._collect(per_process=True) + self._collect(per_process=False):
+            lines.extend(_render_family(*family))
+        return "\n".join(lines) + "\n"
+
+    def _render_multiprocess(self, multiproc_dir):
+        write_process_file(multiproc_dir, self)
+        totals = {m.name: {} for m in self.metrics}
+        families = {}  # name -> [kind, help, {label tuple: value}]
+        for path in sorted(glob.glob(os.path.join(multiproc_dir, "metrics-*.json"))):
+            try:
+                pid = int(os.path.basename(path)[len("metrics-"):-len(".json")])
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (ValueError, OSError) as e:
+                print(f"Skipping metrics file {path}: {e}")
+                continue
+            alive = _pid_alive(pid)
+            for metric in self.metrics:
+                merged = totals[metric.name]
+                for key, value in data["metrics"].get(metric.name, []):
+                    key = tuple(key)
+                    merged[key] = metric.combine(merged[key], value) if key in merged else value
+            for name, kind, doc, samples in data.get("families", []):
+                if kind != "counter" and not alive:
+                    continue  # A gauge of an exited process no longer describes anything
+                family = families.setdefault(name, [kind, doc, {}])
+                for labels, value in samples:
+                    if kind != "counter":
+                        labels = dict(labels, pid=pid)
+                    key = tuple(sorted(labels.items()))
+                    family[2][key] = family[2].get(key, 0) + value
+
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render(totals[metric.name]))
+        for name, (kind, doc, samples) in families.items():
+            lines.extend(_render_family(name, kind, doc, [(dict(k), v) for k, v in sorted(samples.items())]))
+        for family in self._collect(per_process=False):
+            lines.extend(_render_family(*family))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+register_collector = REGISTRY.register_collector
+
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Flask request latency until the response is returned",
+    ("method", "route", "status")))
+TRADE_REQUESTS = REGISTRY.register(Counter(
+    "trade_api_requests_total", "HTTP requests sent to the trade API, including retries",
+    ("endpoint", "status")))
+TRADE_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "trade_api_request_duration_seconds", "Trade API round trip latency",
+    ("endpoint", "status")))
+TRADE_RATE_WAIT = REGISTRY.register(Histogram(
+    "trade_rate_limiter_wait_seconds", "Time trade requests waited for the rate budget",
+    ("priority",), buckets=(0.0, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit, miss, ...)",
+    ("cache", "result")))
+MONGO_COMMAND_DURATION = REGISTRY.register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency from pymongo command monitoring",
+    ("command", "status"), buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)))
+
+
+def multiproc_dir():
+    return os.getenv("METRICS_MULTIPROC_DIR") or None
+
+
+def render():
+    return REGISTRY.render(multiproc_dir())
+
+
+def write_process_file(directory, registry=None):
+    """Write this process's samples to <directory>/metrics-<pid>.json (atomically)."""
+    registry = registry or REGISTRY
+    path = os.path.join(directory, f"metrics-{os.getpid()}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(registry.dump(), f)
+    os.replace(tmp, path)
+
+
+def clear_multiproc_dir(directory):
+    """Remove every process file, e.g. when the gunicorn master starts (counters restart from 0)."""
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "metrics-*.json*")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_flusher = None
+
+
+def start_multiprocess_flush(interval=None):
+    """Periodically write this process's samples when METRICS_MULTIPROC_DIR is set."""
+    global _flusher
+    from backend.periodic import PeriodicTask
+
+    directory = multiproc_dir()
+    if not directory or _flusher is not None:
+        return _flusher
+    os.makedirs(directory, exist_ok=True)
+    interval = interval if interval is not None else float(os.getenv("METRICS_FLUSH_SECONDS", "1"))
+    _flusher = PeriodicTask("metrics-flush", interval, lambda: write_process_file(directory), initial_delay=0).start()
+    return _flusher
+
+
+def flush():
+    """Write this process's final samples (gunicorn worker_exit), so its counters outlive it."""
+    directory = multiproc_dir()
+    if directory:
+        write_process_file(directory)
+
+
+def _job_queue_families():
+    from backend.jobs import queue_stats
+
+    stats = queue_stats()
+    return [
+        ("job_queue_depth", "gauge", "Queued jobs per priority class",
+         [({"priority": p}, n) for p, n in stats["queued_by_priority"].items()]),
+        ("jobs_by_status", "gauge", "Jobs in the queue collection per status",
+         [({"status": s}, stats[s]) for s in ("queued", "processing", "completed", "failed")]),
+        ("job_active_workers", "gauge", "Workers currently holding a job lease (all processes)",
+         [({}, len(stats["active_workers"]))]),
+    ]
+
+
+def _job_worker_families():
+    import backend.jobs as jobs
+
+    worker = jobs._worker
+    threads = worker.workers if worker is not None and worker._threads else 0
+    busy = worker.running if worker is not None else 0
+    return [
+        ("job_worker_threads", "gauge", "Job worker threads in this process", [({}, threads)]),
+        ("job_worker_busy_threads", "gauge", "Job worker threads running a job in this process", [({}, busy)]),
+        ("job_worker_utilization", "gauge", "Busy share of this process's job worker threads",
+         [({}, round(busy / threads, 3) if threads else 0.0)]),
+    ]
+
+
+def _item_catalog_families():
+    import backend.item_catalog as item_catalog
+
+    catalog = item_catalog._catalog
+    if catalog is None:
+        return []
+    stats = dict(catalog.stats)
+    return [
+        ("item_catalog_cache_events_total", "counter", "Item catalog cache hits and upstream revalidation outcomes",
+         [({"event": event}, value) for event, value in sorted(stats.items())]),
+    ]
+
+
+def _mongo_pool_families():
+    from backend.database import pool_stats
+
+    servers = pool_stats()
+    return [
+        ("mongo_pool_connections", "gauge", "Open and checked-out MongoDB connections per server",
+         [({"server": server, "state": state}, stats[state]) for server, stats in servers.items()
+          for state in ("open", "in_use")]),
+        ("mongo_pool_checkouts_total", "counter", "Connections checked out of the pool",
+         [({"server": server}, stats["checkouts"]) for server, stats in servers.items()]),
+        ("mongo_pool_checkout_failures_total", "counter", "Failed connection checkouts (pool timeout, errors)",
+         [({"server": server}, stats["checkout_failures"]) for server, stats in servers.items()]),
+        ("mongo_pool_checkout_wait_seconds_total", "counter", "Time spent waiting to check out a connection",
+         [({"server": server}, round(stats["wait_seconds_total"], 6)) for server, stats in servers.items()]),
+    ]
+
+
+def install_mongo_monitoring():
+    """Time MongoDB commands. Only clients created after this call are monitored."""
+    from pymongo import monitoring
+
+    class CommandTimer(monitoring.CommandListener):
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            MONGO_COMMAND_DURATION.observe(event.duration_micros / 1e6, command=event.command_name, status="ok")
+
+        def failed(self, event):
+            MONGO_COMMAND_DURATION.observe(event.duration_micros / 1e6, command=event.command_name, status="error")
+
+    monitoring.register(CommandTimer())
+
+
+_installed = False
+_installed_lock = threading.Lock()
+
+
+def install_default_collectors():
+    """Register the job/catalog collectors and Mongo command timing once per process."""
+    global _installed
+    with _installed_lock:
+        if _installed:
+            return
+        _installed = True
+    register_collector(_job_queue_families)
+    register_collector(_job_worker_families, per_process=True)
+    register_collector(_item_catalog_families, per_process=True)
+    register_collector(_mongo_pool_families, per_process=True)
+    if os.getenv("METRICS_MONGO_COMMANDS", "true").lower() != "false":
+        install_mongo_monitoring()
+
+
+def serve_metrics(port, host="0.0.0.0"):
+    """Serve /metrics from a daemon thread, for processes without a Flask app (backend/worker.py)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    install_default_collectors()
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def init_metrics(app):
+    """
+    Time Flask requests per route, serve GET /metrics and register the scrape-time
+    collectors. With METRICS_MULTIPROC_DIR set, /metrics aggregates every process.
+    """
+    install_default_collectors()
+    start_multiprocess_flush()
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        started = g.pop("_metrics_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                method=request.method, route=route, status=response.status_code
+            )
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics_endpoint():
+        return app.response_class(render(), mimetype=CONTENT_TYPE)
+
+    return app
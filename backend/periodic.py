@@ -0,0 +1,90 @@
+"""
+Minimal background scheduler for recurring maintenance work.
+Each task runs on its own daemon thread so it never blocks request handling.
+
+An exclusive task runs in one process only: before each run it claims a
+TaskLease in MongoDB (lasting two intervals), and processes that do not hold
+the lease skip the run. When the holder dies its lease expires and the next
+process to try takes the task over.
+"""
+import os
+import socket
+import threading
+import traceback
+import uuid
+from datetime import datetime, timedelta
+
+
+def claim_task_lease(name, owner, seconds):
+    """Take or renew the lease on a task for `seconds`. Returns True when `owner` holds it."""
+    from mongoengine.errors import NotUniqueError
+    from backend.database import TaskLease
+
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=seconds)
+    if TaskLease.objects(name=name, owner=owner).update(set__expires_at=expires_at):
+        return True
+    TaskLease.objects(name=name, expires_at__lt=now).delete()
+    try:
+        TaskLease(name=name, owner=owner, expires_at=expires_at).save(force_insert=True)
+    except NotUniqueError:
+        return False
+    return True
+
+
+class PeriodicTask:
+    """
+    Runs `func` every `interval` seconds on a daemon thread.
+    The first run happens after `initial_delay` seconds (defaults to `interval`).
+    With exclusive=True only the process holding the task's lease runs it.
+    """
+
+    def __init__(self, name, interval, func, initial_delay=None, exclusive=False):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.initial_delay = interval if initial_delay is None else initial_delay
+        self.exclusive = exclusive
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.last_result = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"periodic-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def run_once(self):
+        """Run the task immediately on the calling thread."""
+        try:
+            self.last_result = self.func()
+        except Exception as e:
+            print(f"Periodic task '{self.name}' failed: {e}")
+            traceback.print_exc()
+        return self.last_result
+
+    def holds_lease(self):
+        """Whether this process should run the task now (always, unless exclusive)."""
+        if not self.exclusive:
+            return True
+        try:
+            return claim_task_lease(self.name, self.owner, self.interval * 2)
+        except Exception as e:
+            print(f"Periodic task '{self.name}' could not claim its lease: {e}")
+            return False
+
+    def _run(self):
+        delay = self.initial_delay
+        while not self._stop.wait(delay):
+            if self.holds_lease():
+                self.run_once()
+            delay = self.interval
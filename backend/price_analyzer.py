@@ -1,11 +1,14 @@
-import time
 import copy
-from backend.trade_api import TradeAPI
-from backend.currency_service import CurrencyService
+import numpy as np
+from backend.trade_api import TradeAPI, pause
+from backend.currency_service import get_currency_service
+from backend.item_parser import parse_listing
+from backend.records import ModRecord, ListingRecord, dedupe_mods, to_dicts
 
 class PriceAnalyzer:
     def __init__(self, currency_service=None):
-        self.currency_service = currency_service or CurrencyService()
+        # Share the process-wide rates unless a specific service is injected
+        self.currency_service = currency_service or get_currency_service()
 
     def analyze_gap(self, base_type, session_id=None, exclusions=None):
         """
@@ -26,7 +29,11 @@ class PriceAnalyzer:
             }
         }
         normal_result = self._get_search_result(api, normal_query)
-        normal_avg, normal_mods = self._calculate_average_from_result(api, normal_result, exclusions=exclusions)
+        normal_observations = []
+        normal_samples = []
+        normal_avg, normal_mods = self._calculate_average_from_result(
+            api, normal_result, exclusions=exclusions, observations=normal_observations, samples=normal_samples
+        )
         search_id = normal_result.get("id") if normal_result else None
         
         # 2. Search Normal with filters (ilvl 82, min 2 rune sockets) - for crafting base price
@@ -52,7 +59,10 @@ class PriceAnalyzer:
             }
         }
         normal_craft_result = self._get_search_result(api, normal_craft_query)
-        normal_craft_avg, _ = self._calculate_average_from_result(api, normal_craft_result, exclusions=exclusions)
+        craft_samples = []
+        normal_craft_avg, _ = self._calculate_average_from_result(
+            api, normal_craft_result, exclusions=exclusions, samples=craft_samples
+        )
         crafting_search_id = normal_craft_result.get("id") if normal_craft_result else None
         
         # 3. Search Magic
@@ -78,6 +88,8 @@ class PriceAnalyzer:
         magic_avg = 0.0
         magic_search_id = None
         magic_mods = []  # Initialize to avoid unbound error
+        magic_observations = []
+        magic_samples = []
         
         # Custom price progression
         price_progression = [1, 100, 250, 500, 1000, 5000]
@@ -114,15 +126,21 @@ class PriceAnalyzer:
             magic_result = self._get_search_result(api, filtered_query)
             magic_search_id = magic_result.get("id") if magic_result else None
 
+            attempt_observations = []
+            attempt_samples = []
             magic_avg, magic_mods = self._calculate_average_from_result(
                 api,
                 magic_result,
                 item_validator=self._is_t1_magic,
                 exclusions=exclusions,
-                min_mod_count=2
+                min_mod_count=2,
+                observations=attempt_observations,
+                samples=attempt_samples
             )
 
             if magic_avg > 0:
+                magic_observations = attempt_observations
+                magic_samples = attempt_samples
                 print(f"Found Magic items! Average price: {magic_avg}")
                 break
             else:
@@ -137,10 +155,31 @@ class PriceAnalyzer:
             "search_id": search_id,
             "magic_search_id": magic_search_id,
             "crafting_search_id": crafting_search_id,
-            "normal_modifiers": normal_mods,
-            "magic_modifiers": magic_mods
+            "normal_modifiers": to_dicts(normal_mods),
+            "magic_modifiers": to_dicts(magic_mods),
+            # Per-listing (price, modifiers) pairs, not deduplicated
+            "observations": to_dicts(normal_observations + magic_observations),
+            # Original (amount, currency) pairs behind each average, for re-pricing
+            "price_samples": {
+                "normal": normal_samples if normal_avg > 0 else [],
+                "crafting": craft_samples if normal_craft_avg > 0 else [],
+                "magic": magic_samples
+            }
         }
 
+    def _listing_prices(self, listings):
+        """
+        Normalize the listing prices of one parsed fetch batch with a single vectorized call.
+        Returns a list of Exalted values aligned with `listings` (0.0 when unpriced or malformed).
+        """
+        amounts = []
+        currencies = []
+        for listing in listings:
+            amount, currency = listing.price if listing is not None else (0.0, None)
+            amounts.append(amount)
+            currencies.append(currency)
+        return self.currency_service.normalize_batch(amounts, currencies).tolist()
+
     def _is_t1_magic(self, item_entry):
         """
         Validator to check if a magic item has ONLY Tier 1 (P1 or S1) modifiers.
@@ -148,38 +187,15 @@ class PriceAnalyzer:
         
         Only checks 'explicit', 'fractured', and 'desecrated' mod groups.
         """
-        # item_entry is the raw result from fetch()
-        item = item_entry.get("item", {})
-        if not isinstance(item, dict):
+        # item_entry is a raw result from fetch() or its ParsedListing
+        listing = parse_listing(item_entry)
+        if listing is None:
             return False
-            
-        extended = item.get("extended", {})
-        if not isinstance(extended, dict):
-            return False
-            
-        mods = extended.get("mods", {})
-        if not isinstance(mods, dict):
-            return False
-            
-        has_any_mod = False
-        target_groups = ["explicit", "fractured", "desecrated"]
-        
-        for group in target_groups:
-            group_mods = mods.get(group, [])
-            if not isinstance(group_mods, list):
-                continue
-                
-            for mod in group_mods:
-                has_any_mod = True
-                tier = mod.get("tier", "")
-                print(f"DEBUG: Found mod tier='{tier}' in group '{group}'")
-                # If any mod is NOT T1, return False immediately
-                if not (tier and (tier.startswith("P1") or tier.startswith("S1"))):
-                    print(f"DEBUG: Rejected - tier '{tier}' is not P1 or S1")
-                    return False
-        
-        print(f"DEBUG: Accepted - all mods are P1 or S1")
-        return has_any_mod
+        if listing.rejected_tier is not None:
+            print(f"DEBUG: Rejected - tier '{listing.rejected_tier}' is not P1 or S1")
+        elif listing.t1_magic:
+            print(f"DEBUG: Accepted - all mods are P1 or S1")
+        return listing.t1_magic
 
     def _get_search_result(self, api, query):
         """Execute search and return full result (includes search ID)."""
@@ -198,10 +214,13 @@ class PriceAnalyzer:
                 print(f"Error searching: {e}")
             return {}
 
-    def _calculate_average_from_result(self, api, search_result, item_validator=None, target_count=5, max_items_to_check=100, exclusions=None, min_mod_count=0, extractor_func=None):
+    def _calculate_average_from_result(self, api, search_result, item_validator=None, target_count=5, max_items_to_check=100, exclusions=None, min_mod_count=0, extractor_func=None, observations=None, samples=None):
         """
         Calculate average price and collect modifier data from a search result.
-        Returns tuple of (average_price, modifiers_list).
+        Returns tuple of (average_price, deduplicated ModRecords).
+        If `observations` is a list, every priced listing is appended to it as a
+        ListingRecord (modifiers after exclusions).
+        If `samples` is a list, the (amount, currency) of every averaged price is appended to it.
         """
         print(f"DEBUG: _calculate_average_from_result called with search_result type={type(search_result)}")
         print(f"DEBUG: search_result content (truncated): {str(search_result)[:500]}")
@@ -238,14 +257,18 @@ class PriceAnalyzer:
                     items = fetch_results.get("result", [])
                 
                 print(f"DEBUG: Processing {len(items)} items from fetch")
-                for idx, item in enumerate(items):
-                    print(f"DEBUG: Item[{idx}] type={type(item)}")
-                    if not isinstance(item, dict):
-                        print(f"DEBUG: Skipping non-dict item at index {idx}: {str(item)[:200]}")
+                # Parse each listing once; extractors, validators and prices all read the parse
+                listings = [parse_listing(item) for item in items]
+                batch_prices = self._listing_prices(listings)
+                for idx, item in enumerate(listings):
+                    print(f"DEBUG: Item[{idx}] type={type(items[idx])}")
+                    if item is None:
+                        print(f"DEBUG: Skipping non-dict item at index {idx}: {str(items[idx])[:200]}")
                         continue
                         
                     # Extract modifiers/attributes from this item
                     item_mods = extract_func(item)
+                    observed_mods = []
                     if item_mods:
                         # Filter exclusions
                         if exclusions:
@@ -254,15 +277,15 @@ class PriceAnalyzer:
                                 is_excluded = False
                                 for ex in exclusions:
                                     # Check type
-                                    if ex.mod_type and ex.mod_type != mod['mod_type']: continue
+                                    if ex.mod_type and ex.mod_type != mod.mod_type: continue
                                     # Check tier
-                                    if ex.mod_tier and ex.mod_tier != mod['tier']: continue
+                                    if ex.mod_tier and ex.mod_tier != mod.tier: continue
                                     # Check name pattern
                                     if ex.mod_name_pattern:
                                         import re
                                         # Convert SQL LIKE % to regex .*
                                         pattern = ex.mod_name_pattern.replace('%', '.*')
-                                        if not re.search(pattern, mod['name'], re.IGNORECASE): continue
+                                        if not re.search(pattern, mod.name, re.IGNORECASE): continue
                                     
                                     is_excluded = True
                                     break
@@ -281,49 +304,33 @@ class PriceAnalyzer:
                             continue
 
                         modifiers.extend(item_mods)
+                        observed_mods = item_mods
 
                     if item_validator and not item_validator(item):
                         continue
-                        
-                    listing = item.get("listing", {})
-                    price_info = listing.get("price", {})
-                    amount = price_info.get("amount")
-                    currency = price_info.get("currency")
-                    
-                    if amount is not None and currency:
-                        exalts_val = self.currency_service.normalize_to_exalted(amount, currency)
-                        if exalts_val > 0:
-                            prices.append(exalts_val)
-                            if len(prices) >= target_count:
-                                break
+
+                    exalts_val = batch_prices[idx]
+                    if exalts_val > 0:
+                        prices.append(exalts_val)
+                        amount, currency = item.price
+                        if samples is not None:
+                            samples.append((amount, currency))
+                        if observations is not None:
+                            observations.append(ListingRecord(item.listing_id, exalts_val, amount, currency, observed_mods))
+                        if len(prices) >= target_count:
+                            break
             
             # Sleep between batches
             if i + 10 < min(len(all_ids), max_items_to_check) and len(prices) < target_count:
-                time.sleep(0.5)
+                pause(0.5)
             
             if len(prices) < target_count:
                 return 0.0, []
                 
-            avg_price = sum(prices) / len(prices)
+            avg_price = float(np.mean(prices))
             
-            # Deduplicate modifiers
-            # Keep the one with the best display text (longest/most descriptive)
-            unique_mods = {}
-            for mod in modifiers:
-                key = (mod['name'], mod['tier'], mod['mod_type'])
-                if key not in unique_mods:
-                    unique_mods[key] = mod
-                else:
-                    # If existing has no display text (or just name), and new one has good text, replace
-                    current = unique_mods[key]
-                    curr_text = current.get('display_text', '')
-                    new_text = mod.get('display_text', '')
-                    
-                    # If new text is better (longer is a simple heuristic for "not just the name")
-                    if len(new_text) > len(curr_text):
-                        unique_mods[key] = mod
-                        
-            return avg_price, list(unique_mods.values())
+            # Deduplicate modifiers, keeping the most descriptive display text
+            return avg_price, dedupe_mods(modifiers)
         except AttributeError as e:
             import traceback
             print(f"CRITICAL AttributeError in _calculate_average_from_result: {e}")
@@ -338,7 +345,7 @@ class PriceAnalyzer:
     def _calculate_average_with_count(self, api, search_result, item_validator=None, target_count=5, max_items_to_check=100, exclusions=None, min_mod_count=0, extractor_func=None):
         """
         Calculate average price and collect modifier data from a search result.
-        Returns tuple of (average_price, modifiers_list, reviewed_count).
+        Returns tuple of (average_price, deduplicated ModRecords, reviewed_count).
         """
         reviewed_count = 0
         try:
@@ -369,8 +376,10 @@ class PriceAnalyzer:
                 else:
                     items = fetch_results.get("result", [])
 
-                for item in items:
-                    if not isinstance(item, dict):
+                listings = [parse_listing(item) for item in items]
+                batch_prices = self._listing_prices(listings)
+                for idx, item in enumerate(listings):
+                    if item is None:
                         continue
 
                     item_mods = extract_func(item)
@@ -380,12 +389,12 @@ class PriceAnalyzer:
                             for mod in item_mods:
                                 is_excluded = False
                                 for ex in exclusions:
-                                    if ex.mod_type and ex.mod_type != mod['mod_type']: continue
-                                    if ex.mod_tier and ex.mod_tier != mod['tier']: continue
+                                    if ex.mod_type and ex.mod_type != mod.mod_type: continue
+                                    if ex.mod_tier and ex.mod_tier != mod.tier: continue
                                     if ex.mod_name_pattern:
                                         import re
                                         pattern = ex.mod_name_pattern.replace('%', '.*')
-                                        if not re.search(pattern, mod['name'], re.IGNORECASE): continue
+                                        if not re.search(pattern, mod.name, re.IGNORECASE): continue
                                     is_excluded = True
                                     break
                                 if not is_excluded:
@@ -402,41 +411,22 @@ class PriceAnalyzer:
                     if item_validator and not item_validator(item):
                         continue
 
-                    listing = item.get("listing", {})
-                    price_info = listing.get("price", {})
-                    amount = price_info.get("amount")
-                    currency = price_info.get("currency")
-
-                    if amount is not None and currency:
-                        exalts_val = self.currency_service.normalize_to_exalted(amount, currency)
-                        if exalts_val > 0:
-                            prices.append(exalts_val)
-                            reviewed_count += 1  # Count this item as reviewed
-                            if len(prices) >= target_count:
-                                break
+                    exalts_val = batch_prices[idx]
+                    if exalts_val > 0:
+                        prices.append(exalts_val)
+                        reviewed_count += 1  # Count this item as reviewed
+                        if len(prices) >= target_count:
+                            break
 
                 if i + 10 < min(len(all_ids), max_items_to_check) and len(prices) < target_count:
-                    time.sleep(0.5)
+                    pause(0.5)
 
             if len(prices) < target_count:
                 return 0.0, [], reviewed_count
 
-            avg_price = sum(prices) / len(prices)
+            avg_price = float(np.mean(prices))
 
-            # Deduplicate modifiers
-            unique_mods = {}
-            for mod in modifiers:
-                key = (mod['name'], mod['tier'], mod['mod_type'])
-                if key not in unique_mods:
-                    unique_mods[key] = mod
-                else:
-                    current = unique_mods[key]
-                    curr_text = current.get('display_text', '')
-                    new_text = mod.get('display_text', '')
-                    if len(new_text) > len(curr_text):
-                        unique_mods[key] = mod
-
-            return avg_price, list(unique_mods.values()), reviewed_count
+            return avg_price, dedupe_mods(modifiers), reviewed_count
         except Exception as e:
             print(f"Error calculating average with count: {e}")
             return 0.0, [], reviewed_count
@@ -444,37 +434,23 @@ class PriceAnalyzer:
     def _extract_all_modifiers(self, item):
         """
         Extract ALL modifiers AND basic item attributes from an item (for distribution analysis).
-        Returns list of modifier objects with display text.
+        Returns a list of ModRecords (without magnitudes) with display text.
         Includes: rarity, ilvl, quality, sockets, links, corrupted, identified, mirrored.
         """
         modifiers = []
-        item_data = item.get("item", {})
+        listing = parse_listing(item)
 
         # Handle cases where item_data might be a list or non-dict
-        if not isinstance(item_data, dict):
+        if listing is None or listing.item_data is None:
             return []
 
-        rarity = item_data.get("rarity", "unknown")
-        item_name = item_data.get("name", "")
-
-        extended = item_data.get("extended", {})
-        if not isinstance(extended, dict):
-            extended = {}
-
-        mods = extended.get("mods", {})
-        if not isinstance(mods, dict):
-            mods = {}
+        item_data = listing.item_data
+        item_record = listing.item
+        extended = listing.extended
 
         # Helper to add attribute
         def add_prop(name, value, mod_type="property"):
-            modifiers.append({
-                "name": name,
-                "tier": "",
-                "mod_type": mod_type,
-                "rarity": rarity,
-                "item_name": item_name,
-                "display_text": str(value)
-            })
+            modifiers.append(ModRecord(name, "", mod_type, item_record, str(value)))
 
         # Basic Item Attributes (ALWAYS include these)
         # Rarity
@@ -514,8 +490,7 @@ class PriceAnalyzer:
             add_prop("Corrupted", "Yes")
             # Check for twice corrupted (has more than one implicit)
             # Implicit mods count can tell us if it's twice corrupted
-            implicit_mods = mods.get("implicit", [])
-            if isinstance(implicit_mods, list) and len(implicit_mods) > 1:
+            if listing.group_count("implicit") > 1:
                 add_prop("Twice Corrupted", "Yes")
 
         if item_data.get("identified"):
@@ -531,75 +506,27 @@ class PriceAnalyzer:
             add_prop("Suffix Count", extended["suffixes"], "stat")
 
         # Extract ALL modifiers (not just T1)
-        target_groups = ["explicit", "implicit", "fractured", "desecrated"]
-
-        for group in target_groups:
-            group_mods = mods.get(group, [])
-            if not isinstance(group_mods, list):
-                continue
-
-            for mod in group_mods:
-                tier = mod.get("tier", "")
-
-                # Get display text
-                display_text = mod.get("text", "").strip()
-
-                if not display_text:
-                    magnitudes = mod.get("magnitudes", [])
-
-                    if magnitudes and isinstance(magnitudes, list) and len(magnitudes) > 0:
-                        mag = magnitudes[0]
-                        if isinstance(mag, dict):
-                            min_val = mag.get("min")
-                            max_val = mag.get("max")
-
-                            if min_val is not None and max_val is not None:
-                                display_text = f"{min_val} to {max_val}"
-                            elif min_val is not None:
-                                display_text = str(min_val)
-                            elif max_val is not None:
-                                display_text = str(max_val)
-
-                if not display_text:
-                    display_text = mod.get("name", "Unknown Modifier")
-
-                modifiers.append({
-                    "name": mod.get("name", ""),
-                    "tier": tier,
-                    "mod_type": group,
-                    "rarity": rarity,
-                    "item_name": item_name,
-                    "display_text": display_text
-                })
+        modifiers.extend(listing.modifier_records())
 
         return modifiers
 
     def _extract_attributes(self, item):
         """
         Helper to capture non-mod data (ilvl, sockets, etc.) plus explicit modifiers.
-        Returns a list of modifier-like dictionaries.
+        Returns a list of ModRecords.
         """
         # Start with standard modifiers
         mods = self._extract_modifiers(item)
         
-        item_data = item.get("item", {})
-        if not isinstance(item_data, dict):
+        listing = parse_listing(item)
+        if listing is None or listing.item_data is None:
             return mods
             
-        rarity = item_data.get("rarity", "unknown")
-        item_name = item_data.get("name", "")
+        item_data = listing.item_data
+        item_record = listing.item
         
         def add_prop(name, value, p_type="property"):
-            mods.append({
-                "name": name,
-                "tier": "",
-                "mod_type": p_type,
-                "rarity": rarity,
-                "item_name": item_name,
-                "display_text": str(value),
-                "magnitude_min": None,
-                "magnitude_max": None
-            })
+            mods.append(ModRecord(name, "", p_type, item_record, str(value), (None, None)))
 
         # ILVL
         if "ilvl" in item_data:
@@ -640,12 +567,11 @@ class PriceAnalyzer:
                     add_prop("Quality", values[0][0])
                     
         # Prefixes/Suffixes count
-        extended = item_data.get("extended", {})
-        if isinstance(extended, dict):
-            if "prefixes" in extended:
-                add_prop("Prefix Count", extended["prefixes"], "stat")
-            if "suffixes" in extended:
-                add_prop("Suffix Count", extended["suffixes"], "stat")
+        extended = listing.extended
+        if "prefixes" in extended:
+            add_prop("Prefix Count", extended["prefixes"], "stat")
+        if "suffixes" in extended:
+            add_prop("Suffix Count", extended["suffixes"], "stat")
             
         return mods
 
@@ -730,13 +656,13 @@ class PriceAnalyzer:
                 "max": round(b_max, 2) if b_max is not None else None,
                 "count": reviewed_count,  # Only count what was actually reviewed
                 "avg_price": round(avg_val, 2),
-                "common_stats": common_stats
+                "common_stats": to_dicts(common_stats)
             })
             
             print(f"DEBUG BUCKET SAVED: min={b_min}, max={b_max}, count={reviewed_count}, avg={avg_val}, stats_count={len(common_stats)}")
             
             # Rate limit protection between buckets
-            time.sleep(2)
+            pause(2)
             
         return {
             "base_type": base_type,
@@ -749,133 +675,16 @@ class PriceAnalyzer:
     def _extract_modifiers(self, item):
         """
         Extract T1 (P1/S1) modifiers from an item with display labels.
-        Returns list of modifier objects with display text.
+        Returns a list of ModRecords with display text and magnitudes.
+
+        Display text prefers the item's rendered explicitMods/implicitMods line
+        whose numbers fall in the mod's magnitude range (Charms' extended data
+        lacks text), then the mod's own text or range, then its name.
         """
-        modifiers = []
-        item_data = item.get("item", {})
-        
-        # Handle cases where item_data might be a list or non-dict (malformed API response)
-        if not isinstance(item_data, dict):
+        listing = parse_listing(item)
+        if listing is None:
             return []
-            
-        rarity = item_data.get("rarity", "unknown")
-        item_name = item_data.get("name", "")
-        
-        extended = item_data.get("extended", {})
-        if not isinstance(extended, dict):
-            return []
-            
-        mods = extended.get("mods", {})
-        if not isinstance(mods, dict):
-            return []
-            
-        target_groups = ["explicit", "implicit", "fractured", "desecrated"]
-        
-        for group in target_groups:
-            group_mods = mods.get(group, [])
-            if not isinstance(group_mods, list):
-                continue
-            
-            for mod in group_mods:
-                tier = mod.get("tier", "")
-                
-                # Only capture T1 modifiers (P1 or S1)
-                if not (tier and (tier.startswith("P1") or tier.startswith("S1"))):
-                    continue
-                
-                # Get display text - prefer 'text' field, otherwise construct from magnitudes
-                display_text = mod.get("text", "").strip()
-                
-                if not display_text:
-                    # Construct display text from magnitudes only
-                    magnitudes = mod.get("magnitudes", [])
-                    
-                    if magnitudes and isinstance(magnitudes, list) and len(magnitudes) > 0:
-                        mag = magnitudes[0]
-                        if isinstance(mag, dict):
-                            min_val = mag.get("min")
-                            max_val = mag.get("max")
-                            
-                            if min_val is not None and max_val is not None:
-                                display_text = f"{min_val} to {max_val}"
-                            elif min_val is not None:
-                                display_text = str(min_val)
-                            elif max_val is not None:
-                                display_text = str(max_val)
-                
-                # Fallback: if still no display text, try to match with item.explicitMods
-                # This is common for Charms where extended data lacks text but top-level explicitMods has it
-                if True: # Always try to improve display text from explicitMods if it's just numbers
-                    magnitudes = mod.get("magnitudes", [])
-                    if magnitudes and len(magnitudes) > 0:
-                        mag = magnitudes[0]
-                        min_v = float(mag.get("min", 0)) if mag.get("min") is not None else -999999
-                        max_v = float(mag.get("max", 0)) if mag.get("max") is not None else 999999
-                        
-                        # Get candidate strings based on mod type
-                        # If mod_type is 'explicit', look in 'explicitMods'
-                        # If 'implicit', look in 'implicitMods'
-                        candidate_strings = []
-                        if group == 'explicit':
-                            candidate_strings = item_data.get('explicitMods', [])
-                        elif group == 'implicit':
-                            candidate_strings = item_data.get('implicitMods', [])
-                            
-                        # Try to match values
-                        import re
-                        for candidate in candidate_strings:
-                            # Extract all numbers from the string
-                            # Handle decimals and negative numbers
-                            nums = [float(x) for x in re.findall(r'-?\d+(?:\.\d+)?', candidate)]
-                            
-                            # Check if ANY number in the string falls within the magnitude range
-                            # Use a small epsilon for float comparison if needed, but exact match is usually fine for these APIs
-                            is_match = False
-                            if not nums:
-                                continue
-
-                            for num in nums:
-                                # Check normal range
-                                if min_v <= num <= max_v:
-                                    is_match = True
-                                    break
-                                # Check absolute values (for "reduced" mods which are negative in data but positive in text)
-                                if min_v < 0 and max_v < 0:
-                                    if abs(max_v) <= num <= abs(min_v):
-                                        is_match = True
-                                        break
-                            
-                            if is_match:
-                                display_text = candidate
-                                break
-
-                # Fallback: if still no display text, use the mod name
-                if not display_text:
-                    display_text = mod.get("name", "Unknown Modifier")
-
-                # Get magnitude values for reference (re-extracting safely)
-                magnitudes = mod.get("magnitudes", [])
-                min_val = None
-                max_val = None
-                if magnitudes and isinstance(magnitudes, list) and len(magnitudes) > 0:
-                    mag = magnitudes[0]
-                    if isinstance(mag, dict):
-                        min_val = float(mag.get("min", 0)) if mag.get("min") else None
-                        max_val = float(mag.get("max", 0)) if mag.get("max") else None
-
-                if display_text:
-                    modifiers.append({
-                        "name": mod.get("name", ""),
-                        "tier": tier,
-                        "mod_type": group,
-                        "rarity": rarity,
-                        "item_name": item_name,
-                        "display_text": display_text,
-                        "magnitude_min": min_val,
-                        "magnitude_max": max_val
-                    })
-        
-        return modifiers
+        return listing.t1_modifiers()
 
     def _get_average_price(self, api, query, item_validator=None, target_count=5, max_items_to_check=100, min_price_filter=None):
         # ... existing implementation for backward compatibility ...
@@ -918,33 +727,29 @@ class PriceAnalyzer:
                 else:
                     items = fetch_results.get("result", [])
                 
-                for item in items:
-                    if not isinstance(item, dict):
+                listings = [parse_listing(item) for item in items]
+                batch_prices = self._listing_prices(listings)
+                for idx, item in enumerate(listings):
+                    if item is None:
                         continue
                         
                     if item_validator and not item_validator(item):
                         continue
-                        
-                    listing = item.get("listing", {})
-                    price_info = listing.get("price", {})
-                    amount = price_info.get("amount")
-                    currency = price_info.get("currency")
-                    
-                    if amount is not None and currency:
-                        exalts_val = self.currency_service.normalize_to_exalted(amount, currency)
-                        if exalts_val > 0:
-                            prices.append(exalts_val)
-                            if len(prices) >= target_count:
-                                break
+
+                    exalts_val = batch_prices[idx]
+                    if exalts_val > 0:
+                        prices.append(exalts_val)
+                        if len(prices) >= target_count:
+                            break
                 
                 # Sleep between batches if more items are needed and available
                 if i + 10 < min(len(all_ids), max_items_to_check) and len(prices) < target_count:
-                    time.sleep(0.5)
+                    pause(0.5)
             
             if len(prices) < target_count:
                 return 0.0
                 
-            return sum(prices) / len(prices)
+            return float(np.mean(prices))
         except Exception as e:
             error_msg = str(e)
             if "502" in error_msg or "Bad Gateway" in error_msg:
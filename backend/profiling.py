@@ -0,0 +1,202 @@
+"""
+Opt-in profiling of jobs and requests.
+
+A request is profiled when it carries `X-Profile: <mode>` or `?profile=<mode>`;
+a job when it was enqueued with params['profile'] = <mode> (the job endpoints
+take a `profile` field or the same header). Modes:
+
+- sample (also 1/true): a sampler thread records the profiled thread's stack
+  every PROFILE_SAMPLE_INTERVAL_MS. Output is folded stacks ('collapsed'), which
+  speedscope and flamegraph.pl render as a flamegraph. Overhead stays low, so
+  it is safe on long batch jobs.
+- cprofile: deterministic cProfile of the thread, stored as a pstats report
+  sorted by cumulative time. Slower, but counts every call.
+
+Profiles are stored as Profile documents and expire after PROFILE_RETENTION_DAYS.
+GET /api/profiles/<id> serves one (raw text by default, for flamegraph viewers),
+GET /api/jobs/<id>/profiles lists a job's profiles (one per run of the job).
+Profiling is off unless PROFILING_ENABLED=true. With PROFILE_TOKEN set, a
+request or job payload is only profiled when it also sends the token in
+X-Profile-Token, so a public deployment can leave profiling on for operators.
+The same check guards reading stored profiles.
+"""
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() in ('1', 'true', 'yes', 'on')
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '5'))
+PROFILE_RETENTION_DAYS = float(os.getenv('PROFILE_RETENTION_DAYS', '7'))
+PROFILE_HEADER = 'X-Profile'
+PROFILE_TOKEN_HEADER = 'X-Profile-Token'
+PROFILE_MODES = ('sample', 'cprofile')
+
+
+def profile_mode(value):
+    """Normalize a profile flag: None when off, else one of PROFILE_MODES. Raises ValueError when unknown."""
+    if value is None or value is False:
+        return None
+    value = str(value).strip().lower()
+    if value in ('', '0', 'false', 'off', 'no'):
+        return None
+    if value in ('1', 'true', 'on', 'yes'):
+        return 'sample'
+    if value not in PROFILE_MODES:
+        raise ValueError(f"profile must be one of {', '.join(PROFILE_MODES)}")
+    return value
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples one thread's stack from a helper thread; result is folded stacks."""
+
+    mode = 'sample'
+    format = 'collapsed'
+
+    def __init__(self, interval_ms=None):
+        self.interval = (PROFILE_SAMPLE_INTERVAL_MS if interval_ms is None else interval_ms) / 1000.0
+        self.stacks = Counter()
+        self.samples = 0
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = self._labels.get(code)
+                if label is None:
+                    label = self._labels[code] = _frame_label(code)
+                stack.append(label)
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def output(self):
+        return '\n'.join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + '\n'
+
+
+class CProfiler:
+    """cProfile of the calling thread; result is a pstats report."""
+
+    mode = 'cprofile'
+    format = 'pstats'
+
+    def __init__(self, limit=80):
+        self.limit = limit
+        self.samples = 0
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+        return self
+
+    def stop(self):
+        self._profile.disable()
+
+    def output(self):
+        buffer = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=buffer)
+        self.samples = stats.total_calls
+        stats.sort_stats('cumulative').print_stats(self.limit)
+        return buffer.getvalue()
+
+
+def start_profiler(mode):
+    """Start profiling the calling thread in the given mode (see profile_mode)."""
+    profiler = CProfiler() if mode == 'cprofile' else SamplingProfiler()
+    profiler.started = time.perf_counter()
+    return profiler.start()
+
+
+def finish_profile(profiler, kind, target, job_id=None):
+    """Stop profiler and store its output. Returns the Profile, or None if it could not be saved."""
+    from backend.database import Profile
+
+    profiler.stop()
+    duration_ms = (time.perf_counter() - profiler.started) * 1000
+    try:
+        data = profiler.output()
+        now = datetime.utcnow()
+        profile = Profile(
+            kind=kind, target=target, job_id=job_id, mode=profiler.mode, format=profiler.format,
+            data=data, samples=profiler.samples, duration_ms=round(duration_ms, 1), created_at=now,
+            expires_at=now + timedelta(days=PROFILE_RETENTION_DAYS) if PROFILE_RETENTION_DAYS > 0 else None
+        )
+        profile.save()
+        print(f"Profiled {kind} {target}: {profile.samples} {'calls' if profiler.mode == 'cprofile' else 'samples'} "
+              f"in {duration_ms:.0f}ms -> profile {profile.id}")
+        return profile
+    except Exception as e:
+        print(f"Could not store profile of {kind} {target}: {e}")
+        return None
+
+
+def profiling_allowed(req):
+    """Whether a Flask request may turn profiling on: enabled, and carrying PROFILE_TOKEN when one is set."""
+    if not PROFILING_ENABLED:
+        return False
+    if not PROFILE_TOKEN:
+        return True
+    return hmac.compare_digest(req.headers.get(PROFILE_TOKEN_HEADER, ''), PROFILE_TOKEN)
+
+
+def request_profile_mode(req):
+    """Profile mode a Flask request asks for (header or query parameter); None when off or not allowed."""
+    if not profiling_allowed(req):
+        return None
+    return profile_mode(req.headers.get(PROFILE_HEADER) or req.args.get('profile'))
+
+
+def init_profiling(app):
+    """Profile requests that opt in and report the stored profile in an X-Profile-Id header."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_profile():
+        try:
+            mode = request_profile_mode(request)
+        except ValueError:
+            mode = None
+        if mode:
+            g._profiler = start_profiler(mode)
+
+    @app.after_request
+    def _finish_request_profile(response):
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            route = request.url_rule.rule if request.url_rule is not None else request.path
+            profile = finish_profile(profiler, 'request', f"{request.method} {route}")
+            if profile is not None:
+                response.headers['X-Profile-Id'] = str(profile.id)
+        return response
+
+    return app
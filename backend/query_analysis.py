@@ -0,0 +1,162 @@
+"""
+Modifier statistics for an ad-hoc trade query (/analyze).
+
+ItemStatsAccumulator folds fetched listings in batch by batch and can produce
+the aggregate at any point, so a query job can publish partial results while
+it keeps fetching. Per modifier it keeps running min/max/sum per value
+position instead of every value, so memory does not grow with the number of
+listings. analyze_items_logic() is the one-shot form of the same aggregation.
+"""
+import re
+
+
+def normalize_mod(mod_text):
+    text = re.sub(r'\d+-\d+', '#-#', mod_text)
+    text = re.sub(r'\d+(\.\d+)?', '#', text)
+    text = text.replace('+', '').replace('-', '')
+    return text.strip()
+
+
+def extract_values(mod_text):
+    return [float(x) for x in re.findall(r'\d+(?:\.\d+)?', mod_text)]
+
+
+def _analysis_item_index():
+    """Catalog-backed item index; falls back to name rules alone if the catalog is unavailable."""
+    from backend.item_index import get_item_index, ItemIndex
+    try:
+        return get_item_index()
+    except Exception as e:
+        print(f"Item index unavailable, categorizing by name only: {e}")
+        return ItemIndex(None)
+
+
+def _affix_lookup(item):
+    affix_lookup = []
+    mods = item.get("extended", {}).get("mods", {})
+    for mod_type in ["explicit", "fractured", "desecrated"]:
+        for mod_def in mods.get(mod_type, []):
+            tier = mod_def.get("tier", "")
+            tier_type = "explicit"
+            if tier.startswith("P"): tier_type = "prefix"
+            elif tier.startswith("S"): tier_type = "suffix"
+
+            magnitudes = mod_def.get("magnitudes", [])
+            if magnitudes:
+                ranges = []
+                for mag in magnitudes:
+                    try:
+                        ranges.append((float(mag.get("min", 0)), float(mag.get("max", 0))))
+                    except (TypeError, ValueError):
+                        pass
+                affix_lookup.append({"type": tier_type, "ranges": ranges, "tier": tier})
+    return affix_lookup
+
+
+def _mod_type(cat_name, clean_mod, mod_values, affix_lookup):
+    if cat_name == "rune":
+        return "bonded" if "Bonded" in clean_mod else "rune"
+    if cat_name in ("explicit", "desecrated"):
+        # Match the first value against the affix magnitude ranges to tell prefixes from suffixes
+        if mod_values:
+            val = mod_values[0]
+            for affix in affix_lookup:
+                if any(min_v <= val <= max_v for (min_v, max_v) in affix["ranges"]):
+                    return affix["type"]
+        return "explicit"
+    return cat_name
+
+
+class ItemStatsAccumulator:
+    """
+    Incremental version of analyze_items_logic.
+    Per category: item count and, per (normalized mod, type), the number of items
+    with it and [min, max, sum, n] for each value position.
+    """
+
+    def __init__(self, item_index=None):
+        self.item_index = item_index or _analysis_item_index()
+        self.categories = {}
+        self.items_seen = 0
+
+    def add(self, items):
+        for entry in items:
+            self.add_item(entry.get("item", {}))
+
+    def add_item(self, item):
+        self.items_seen += 1
+        base_type = item.get("baseType", "Unknown")
+        category = self.categories.setdefault(
+            self.item_index.analysis_category(base_type), {"count": 0, "mods": {}}
+        )
+        category["count"] += 1
+
+        affix_lookup = _affix_lookup(item)
+        mod_categories = {
+            "explicit": item.get("explicitMods", []),
+            "implicit": item.get("implicitMods", []),
+            "fractured": item.get("fracturedMods", []),
+            "rune": item.get("runeMods", []),
+            "desecrated": item.get("desecratedMods", [])
+        }
+
+        seen_mods_for_item = set()
+        for cat_name, mods in mod_categories.items():
+            for mod in mods:
+                clean_mod = re.sub(r'\[([^\|\]]+)\|([^\]]+)\]', r'\2', mod)
+                clean_mod = re.sub(r'\[([^\]]+)\]', r'\1', clean_mod)
+
+                mod_values = extract_values(clean_mod)
+                unique_key = (normalize_mod(clean_mod), _mod_type(cat_name, clean_mod, mod_values, affix_lookup))
+                if unique_key in seen_mods_for_item:
+                    continue
+                seen_mods_for_item.add(unique_key)
+
+                mod_data = category["mods"].get(unique_key)
+                if mod_data is None:
+                    mod_data = category["mods"][unique_key] = {"count": 0, "positions": []}
+                mod_data["count"] += 1
+                positions = mod_data["positions"]
+                for k, value in enumerate(mod_values):
+                    if k == len(positions):
+                        positions.append([value, value, value, 1])
+                    else:
+                        stats = positions[k]
+                        if value < stats[0]: stats[0] = value
+                        if value > stats[1]: stats[1] = value
+                        stats[2] += value
+                        stats[3] += 1
+
+    def result(self):
+        """Aggregate in the /analyze response format."""
+        output_data = {}
+        for w_type, data in self.categories.items():
+            total_items = data["count"]
+            if total_items == 0:
+                continue
+
+            stats_list = []
+            for (mod_name, mod_type), mod_info in data["mods"].items():
+                count = mod_info["count"]
+                stats_list.append({
+                    "name": mod_name,
+                    "type": mod_type,
+                    "count": count,
+                    "percentage": round((count / total_items) * 100, 1),
+                    "values": [
+                        {"min": lo, "max": hi, "avg": round(total / n, 1)}
+                        for lo, hi, total, n in mod_info["positions"]
+                    ]
+                })
+
+            output_data[w_type] = {
+                "total_items": total_items,
+                "stats": sorted(stats_list, key=lambda x: x["count"], reverse=True)
+            }
+        return output_data
+
+
+def analyze_items_logic(items):
+    accumulator = ItemStatsAccumulator()
+    accumulator.add(items)
+    return accumulator.result()
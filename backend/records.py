@@ -0,0 +1,119 @@
+"""
+Compact in-memory records for listings the analyzer works through.
+
+The analyzer used to pass one fresh dict per modifier, each repeating the item's
+rarity and name. Here a modifier is a slotted ModRecord pointing at a shared
+ItemRecord, and the strings every listing repeats (names, tiers, mod groups,
+rarities) are interned, so a bucket sample of 100 items holds one copy of each.
+
+Records stay internal to PriceAnalyzer: to_dict() produces the dicts that
+analyze_gap/analyze_distribution return and save_analysis persists.
+"""
+import sys
+
+_intern = sys.intern
+
+
+def intern_text(value):
+    """Interned str for value (None and non-strings are returned unchanged)."""
+    return _intern(value) if type(value) is str else value
+
+
+class ItemRecord:
+    """The item-level fields modifiers report (shared by every modifier of a listing)."""
+
+    __slots__ = ('rarity', 'name')
+
+    def __init__(self, rarity, name):
+        self.rarity = intern_text(rarity)
+        self.name = intern_text(name)
+
+    @classmethod
+    def from_item_data(cls, item_data):
+        return cls(item_data.get("rarity", "unknown"), item_data.get("name", ""))
+
+
+class ModRecord:
+    """
+    One modifier (or item property) of a listing. magnitudes is (min, max) for
+    extractors that report them, None for those that do not; to_dict() only
+    emits magnitude_min/magnitude_max in the first case.
+    """
+
+    __slots__ = ('name', 'tier', 'mod_type', 'item', 'display_text', 'magnitudes')
+
+    def __init__(self, name, tier, mod_type, item, display_text, magnitudes=None):
+        self.name = intern_text(name)
+        self.tier = intern_text(tier)
+        self.mod_type = intern_text(mod_type)
+        self.item = item
+        self.display_text = display_text
+        self.magnitudes = magnitudes
+
+    @property
+    def rarity(self):
+        return self.item.rarity
+
+    @property
+    def item_name(self):
+        return self.item.name
+
+    @property
+    def key(self):
+        return (self.name, self.tier, self.mod_type)
+
+    def to_dict(self):
+        result = {
+            "name": self.name,
+            "tier": self.tier,
+            "mod_type": self.mod_type,
+            "rarity": self.item.rarity,
+            "item_name": self.item.name,
+            "display_text": self.display_text,
+        }
+        if self.magnitudes is not None:
+            result["magnitude_min"], result["magnitude_max"] = self.magnitudes
+        return result
+
+    def __repr__(self):
+        return f"ModRecord({self.name!r}, {self.tier!r}, {self.mod_type!r}, {self.display_text!r})"
+
+
+class ListingRecord:
+    """A priced listing and the modifiers it was counted with (after exclusions)."""
+
+    __slots__ = ('listing_id', 'price_ex', 'amount', 'currency', 'modifiers')
+
+    def __init__(self, listing_id, price_ex, amount, currency, modifiers):
+        self.listing_id = listing_id
+        self.price_ex = price_ex
+        self.amount = amount
+        self.currency = intern_text(currency)
+        self.modifiers = modifiers
+
+    def to_dict(self):
+        return {
+            "listing_id": self.listing_id,
+            "price_ex": self.price_ex,
+            "amount": self.amount,
+            "currency": self.currency,
+            "modifiers": [m.to_dict() for m in self.modifiers]
+        }
+
+
+def dedupe_mods(mods):
+    """
+    One record per (name, tier, mod_type), keeping the longest display text
+    (a real description beats a bare name or number range). Order of first sight is kept.
+    """
+    unique = {}
+    for mod in mods:
+        key = mod.key
+        current = unique.get(key)
+        if current is None or len(mod.display_text or '') > len(current.display_text or ''):
+            unique[key] = mod
+    return list(unique.values())
+
+
+def to_dicts(records):
+    return [r.to_dict() for r in records]
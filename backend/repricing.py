@@ -0,0 +1,181 @@
+"""
+Bulk re-pricing of stored history against historical currency rates.
+
+Every AnalysisResult keeps the original (amount, currency) listing prices behind its
+averages, and every ModifierObservation keeps its listing price. Together with the
+timestamped CurrencyRateSnapshot documents this lets us recompute Exalted values
+against the rates that were actually in effect, without re-querying the trade site.
+"""
+from datetime import datetime
+
+import numpy as np
+from pymongo import UpdateOne
+
+from backend.currency_service import CurrencyService, CURRENCY_IDS
+from backend.database import AnalysisResult, CurrencyRateSnapshot, ModifierObservation
+
+
+KINDS = ('normal', 'crafting', 'magic')
+KIND_FIELDS = ('normal_avg_ex', 'crafting_avg_ex', 'magic_avg_ex')
+CHUNK_SIZE = 5000
+
+
+class RateHistory:
+    """
+    All persisted rate snapshots as a (snapshot, currency ID) matrix.
+    Row 0 holds CurrencyService.DEFAULT_RATES, which applied before the first snapshot.
+    """
+
+    def __init__(self, snapshots):
+        self.times = np.array([s.created_at for s in snapshots], dtype='datetime64[us]')
+        self._rates = [CurrencyService.DEFAULT_RATES] + [s.rates for s in snapshots]
+        self._matrix = None
+
+    @classmethod
+    def load(cls):
+        return cls(list(CurrencyRateSnapshot.objects.order_by('created_at').only('rates', 'created_at')))
+
+    def __len__(self):
+        return len(self._rates) - 1
+
+    def rows_for(self, timestamps):
+        """Matrix row in effect at each timestamp."""
+        return np.searchsorted(self.times, np.array(timestamps, dtype='datetime64[us]'), side='right')
+
+    def matrix(self):
+        width = len(CURRENCY_IDS)
+        if self._matrix is None or self._matrix.shape[1] != width:
+            vectors = [CURRENCY_IDS.rate_vector(rates) for rates in self._rates]
+            width = len(CURRENCY_IDS)
+            matrix = np.zeros((len(vectors), width), dtype=np.float64)
+            for row, vector in enumerate(vectors):
+                matrix[row, :len(vector)] = vector
+            self._matrix = matrix
+        return self._matrix
+
+    def normalize(self, amounts, currencies, timestamps):
+        """Vectorized conversion of each (amount, currency) at its own timestamp."""
+        ids = CURRENCY_IDS.ids(currencies)
+        rows = self.rows_for(timestamps)
+        return np.asarray(amounts, dtype=np.float64) * self.matrix()[rows, ids]
+
+
+def _chunks(cursor, size=CHUNK_SIZE):
+    chunk = []
+    for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _reprice_analysis_chunk(docs, history):
+    doc_idx, kind_idx, amounts, currencies, timestamps = [], [], [], [], []
+    for i, doc in enumerate(docs):
+        for sample in doc.get('price_samples', []):
+            if sample.get('kind') not in KINDS:
+                continue
+            doc_idx.append(i)
+            kind_idx.append(KINDS.index(sample['kind']))
+            amounts.append(sample.get('amount') or 0.0)
+            currencies.append(sample.get('currency'))
+            # Samples merged into a daily roll-up carry their own analysis time
+            timestamps.append(sample.get('created_at') or doc['created_at'])
+
+    if not doc_idx:
+        return []
+
+    n = len(docs)
+    flat = np.asarray(doc_idx) * len(KINDS) + np.asarray(kind_idx)
+    values = history.normalize(amounts, currencies, timestamps)
+    valid = values > 0
+
+    shape = (n, len(KINDS))
+    sums = np.bincount(flat, weights=np.where(valid, values, 0.0), minlength=n * len(KINDS)).reshape(shape)
+    counts = np.bincount(flat, weights=valid.astype(np.float64), minlength=n * len(KINDS)).reshape(shape)
+    averages = np.round(np.divide(sums, counts, out=np.zeros(shape), where=counts > 0), 2)
+
+    now = datetime.utcnow()
+    ops = []
+    for i, doc in enumerate(docs):
+        # A kind whose samples all normalize to 0 (e.g. a currency missing from the
+        # snapshot) keeps its stored average rather than being zeroed
+        if not (counts[i] > 0).any():
+            continue
+        updates = {}
+        for k, field in enumerate(KIND_FIELDS):
+            if counts[i, k] > 0:
+                updates[field] = float(averages[i, k])
+        magic = updates.get('magic_avg_ex', doc.get('magic_avg_ex') or 0.0)
+        crafting = updates.get('crafting_avg_ex', doc.get('crafting_avg_ex') or 0.0)
+        updates['gap_ex'] = round(magic - crafting, 2)
+
+        if any(doc.get(field) != value for field, value in updates.items()):
+            updates['repriced_at'] = now
+            ops.append(UpdateOne({'_id': doc['_id']}, {'$set': updates}))
+    return ops
+
+
+def _reprice_observation_chunk(docs, history):
+    values = history.normalize(
+        [d.get('price_amount') or 0.0 for d in docs],
+        [d.get('price_currency') for d in docs],
+        [d['ts'] for d in docs]
+    )
+    ops = []
+    for doc, value in zip(docs, np.round(values, 4).tolist()):
+        if value > 0 and doc.get('price_ex') != value:
+            ops.append(UpdateOne({'_id': doc['_id']}, {'$set': {'price_ex': value}}))
+    return ops
+
+
+def reprice_history(base_type: str = None, since: datetime = None, dry_run: bool = False) -> dict:
+    """
+    Recompute Exalted-normalized prices of stored analyses and modifier
+    observations against the rate snapshot in effect at their timestamp.
+    Documents saved before price samples were recorded are left untouched.
+    Compacted daily roll-ups are re-priced from their merged samples, each at the
+    time of the analysis it came from.
+    """
+    history = RateHistory.load()
+    report = {
+        'snapshots': len(history),
+        'analyses_scanned': 0,
+        'analyses_updated': 0,
+        'observations_scanned': 0,
+        'observations_updated': 0,
+        'dry_run': dry_run
+    }
+
+    analysis_query = {'price_samples': {'$exists': True, '$ne': []}}
+    observation_query = {'price_currency': {'$ne': None}}
+    if base_type:
+        analysis_query['base_type'] = base_type
+        observation_query['base_type'] = base_type
+    if since:
+        analysis_query['created_at'] = {'$gte': since}
+        observation_query['ts'] = {'$gte': since}
+
+    analyses = AnalysisResult._get_collection()
+    cursor = analyses.find(analysis_query, {'created_at': 1, 'price_samples': 1, **{f: 1 for f in KIND_FIELDS}, 'gap_ex': 1})
+    for chunk in _chunks(cursor):
+        report['analyses_scanned'] += len(chunk)
+        ops = _reprice_analysis_chunk(chunk, history)
+        report['analyses_updated'] += len(ops)
+        if ops and not dry_run:
+            analyses.bulk_write(ops, ordered=False)
+
+    observations = ModifierObservation._get_collection()
+    cursor = observations.find(observation_query, {'ts': 1, 'price_amount': 1, 'price_currency': 1, 'price_ex': 1})
+    for chunk in _chunks(cursor):
+        report['observations_scanned'] += len(chunk)
+        ops = _reprice_observation_chunk(chunk, history)
+        report['observations_updated'] += len(ops)
+        if ops and not dry_run:
+            observations.bulk_write(ops, ordered=False)
+
+    print(f"Re-pricing finished: {report['analyses_updated']}/{report['analyses_scanned']} analyses, "
+          f"{report['observations_updated']}/{report['observations_scanned']} observations updated")
+    return report
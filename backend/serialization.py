@@ -0,0 +1,177 @@
+"""
+Fast JSON path for API responses.
+
+FastJSONProvider replaces Flask's default provider and encodes with orjson when
+it is installed (stdlib json otherwise). Any datetime that reaches the encoder
+is written as ISO 8601 in both cases, matching the models' to_dict(), instead
+of Flask's default HTTP-date format.
+
+The *_wire() functions turn raw pymongo documents (QuerySet.as_pymongo()) into
+the same structures as AnalysisResult.to_dict()/ItemAnalysis.to_dict() in one
+pass, skipping mongoengine document construction and the intermediate dict
+copies. List endpoints use them; single-document routes keep to_dict().
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the stdlib encoder
+    orjson = None
+
+
+def _default(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if hasattr(obj, 'tolist'):  # numpy scalars/arrays
+        return obj.tolist()
+    if hasattr(obj, 'to_dict'):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson when available."""
+
+    sort_keys = False
+    default = staticmethod(_default)
+
+    def _pretty(self):
+        return (self.compact is None and self._app.debug) or self.compact is False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            kwargs.setdefault('default', _default)
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+
+    def dumps_bytes(self, obj, pretty=False):
+        if orjson is None:
+            indent = 2 if pretty else None
+            separators = None if pretty else (',', ':')
+            return json.dumps(obj, default=_default, ensure_ascii=self.ensure_ascii,
+                              indent=indent, separators=separators).encode('utf-8')
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = self.dumps_bytes(obj, pretty=self._pretty())
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+
+def init_json(app):
+    """Install FastJSONProvider on a Flask app."""
+    app.json = FastJSONProvider(app)
+    return app
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def modifier_wire(mod):
+    get = mod.get
+    return {
+        'name': get('name'),
+        'tier': get('tier'),
+        'mod_type': get('mod_type'),
+        'rarity': get('rarity'),
+        'item_name': get('item_name'),
+        'display_text': get('display_text'),
+        'price_ex': get('price_ex'),
+        'magnitude_min': get('magnitude_min'),
+        'magnitude_max': get('magnitude_max'),
+        'mod_group': get('mod_group')
+    }
+
+
+def analysis_wire(doc):
+    """Raw AnalysisResult document -> AnalysisResult.to_dict() structure."""
+    get = doc.get
+    modifiers, normal, magic = [], [], []
+    for raw in get('modifiers') or ():
+        mod = modifier_wire(raw)
+        modifiers.append(mod)
+        rarity = str(mod['rarity']).lower()
+        if rarity == 'magic':
+            magic.append(mod)
+        elif rarity in ('normal', 'unknown'):
+            normal.append(mod)
+
+    return {
+        'id': str(doc['_id']),
+        'base_type': get('base_type'),
+        'created_at': _iso(get('created_at')),
+        'normal_avg_ex': get('normal_avg_ex'),
+        'crafting_avg_ex': get('crafting_avg_ex', 0.0),
+        'magic_avg_ex': get('magic_avg_ex'),
+        'gap_ex': get('gap_ex'),
+        'search_id': get('search_id'),
+        'magic_search_id': get('magic_search_id'),
+        'crafting_search_id': get('crafting_search_id'),
+        'modifiers': modifiers,
+        'compacted': get('compacted', False),
+        'sample_count': get('sample_count', 1),
+        'price_samples': [
+            {'kind': p.get('kind'), 'amount': p.get('amount'), 'currency': p.get('currency')}
+            for p in get('price_samples') or ()
+        ],
+        'repriced_at': _iso(get('repriced_at')),
+        'request_stats': get('request_stats') or None,
+        'normal_modifiers': normal,
+        'magic_modifiers': magic
+    }
+
+
+def bucket_wire(bucket):
+    get = bucket.get
+    return {
+        'price_range': get('price_range'),
+        'min_price': get('min_price'),
+        'max_price': get('max_price'),
+        'count': get('count'),
+        'avg_price': get('avg_price'),
+        'attributes': get('attributes', {})
+    }
+
+
+def item_analysis_wire(doc):
+    """Raw ItemAnalysis document -> ItemAnalysis.to_dict() structure."""
+    get = doc.get
+    return {
+        'id': str(doc['_id']),
+        'base_type': get('base_type'),
+        'created_at': _iso(get('created_at')),
+        'min_price': get('min_price'),
+        'max_price': get('max_price'),
+        'currency': get('currency', 'exalted'),
+        'buckets': [bucket_wire(b) for b in get('buckets') or ()],
+        'compacted': get('compacted', False)
+    }
+
+
+def serialize_analyses(queryset):
+    """Wire-ready AnalysisResult list; raw_data is never loaded since no response includes it."""
+    return [analysis_wire(doc) for doc in queryset.exclude('raw_data').as_pymongo()]
+
+
+def serialize_item_analyses(queryset):
+    return [item_analysis_wire(doc) for doc in queryset.as_pymongo()]
@@ -1,349 +1,123 @@
+"""
+Flask API for the dashboard. create_app() builds the application; the module-level
+`app` (used by gunicorn as backend.server:app, run_server.py and the tests) is one
+instance of it.
+
+Startup stays cheap: routes live on the `api` blueprint, the analyzer and other
+heavy modules are imported by the code paths that need them, and MongoDB is
+reached in the background (GET /readyz reports when it is). Currency rates and
+the maintenance schedule start the same way.
+"""
 import sys
 import os
-import traceback
 # Add project root to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-try:
-    import dns
-    print("dnspython is installed")
-except ImportError:
-    print("CRITICAL: dnspython is MISSING")
-
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+from flask import Blueprint, Flask, current_app, request, jsonify
 from dotenv import load_dotenv
-import requests
 import json
-import time
-import re
-from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
 # Load environment variables
 load_dotenv()
 
-# Debug logging
-print("Environment loaded.")
-print(f"DEBUG: Loaded modules: {list(sys.modules.keys())}")
-uri = os.getenv('MONGODB_URI')
-if uri:
-    masked = uri.split('@')[-1] if '@' in uri else '***'
-    print(f"Found MONGODB_URI: ...@{masked}")
-else:
-    print("No MONGODB_URI found in environment, using default localhost.")
-
-from backend.price_analyzer import PriceAnalyzer
 from backend.database import (
-    init_db, AnalysisResult, Modifier, ExcludedModifier, CustomCategory,
-    SearchHistory, save_analysis, get_excluded_mods, Job,
-    ItemAnalysis, Bucket
+    init_db, check_db, AnalysisResult, ExcludedModifier, CustomCategory,
+    SearchHistory, get_excluded_mods, Job, Profile, JOB_PRIORITIES
 )
+from backend.http_cache import queryset_etag, is_not_modified, not_modified_response, with_etag
+from backend.serialization import serialize_analyses, serialize_item_analyses
+from backend.jobs import enqueue_job
+from backend.profiling import profile_mode, profiling_allowed, PROFILE_HEADER
 
-app = Flask(__name__, static_folder='../../poe2-trends/dist', static_url_path='/')
-CORS(app)
-
-# Background Job Executor
-executor = ThreadPoolExecutor(max_workers=1)
+api = Blueprint('api', __name__)
 
-# Database configuration
-mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/poe2_trade')
-app.config['MONGODB_URI'] = mongodb_uri
 
-# Initialize database
-init_db(app)
-
-def process_batch_analysis(job_id, bases, session_id, exclusions):
+def create_app(config=None):
     """
-    Background task to process a batch of item base analyses.
+    Build the Flask app: JSON/compression/metrics/profiling hooks, the api blueprint,
+    a deferred MongoDB connection, currency rates and the maintenance schedule.
     """
-    with app.app_context():
-        job = Job.objects(id=job_id).first()
-        if not job:
-            print(f"Job {job_id} not found")
-            return
+    import atexit
+    from flask_cors import CORS
+    from backend.serialization import init_json
+    from backend.http_cache import init_compression
+    from backend.metrics import init_metrics
+    from backend.profiling import init_profiling
+    from backend.jobs import shutdown_job_worker
+    from backend.currency_service import init_currency_service
+    from backend.maintenance import start_maintenance_scheduler
 
-        try:
-            job.status = 'processing'
-            job.save()
+    app = Flask(__name__, static_folder='../../poe2-trends/dist', static_url_path='/')
+    app.config['MONGODB_URI'] = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/poe2_trade')
+    app.config.update(config or {})
+    CORS(app)
 
-            analyzer = PriceAnalyzer()
-            
-            for base in bases:
-                job.current_item = base
-                job.save()
-                
-                print(f"Job {job_id}: Analyzing {base}...")
-                try:
-                    analysis = save_analysis(
-                        analyzer=analyzer,
-                        base_type=base,
-                        session_id=session_id,
-                        excluded_mods=exclusions
-                    )
-                    job.results.append(analysis.to_dict())
-                except Exception as e:
-                    print(f"Job {job_id}: Error analyzing {base}: {e}")
-                    job.results.append({"base_type": base, "error": str(e)})
-
-                job.progress += 1
-                job.save()
-                
-                if job.progress < len(bases):
-                    time.sleep(2) # Rate limit politeness
-
-            job.status = 'completed'
-            job.current_item = None
-            job.save()
-            print(f"Job {job_id} completed successfully")
-
-        except Exception as e:
-            print(f"Job {job_id} failed: {e}")
-            job.status = 'failed'
-            job.error = str(e)
-            job.save()
-
-
-def process_distribution_analysis(job_id, base_type, session_id):
-    """
-    Background task to process item distribution analysis.
-    """
-    with app.app_context():
-        job = Job.objects(id=job_id).first()
-        if not job:
-            print(f"Job {job_id} not found")
-            return
+    # orjson-backed jsonify when available
+    init_json(app)
+    # gzip/brotli for large JSON responses (COMPRESS_MIN_BYTES)
+    init_compression(app)
+    # Prometheus /metrics; registered before init_db so Mongo commands are timed
+    init_metrics(app)
+    # Opt-in profiling: X-Profile header / ?profile= on requests, 'profile' on job payloads
+    init_profiling(app)
+    app.register_blueprint(api)
 
-        try:
-            job.status = 'processing'
-            job.save()
+    # Background jobs run in a JobWorker: on threads here (JOB_MODE=thread) or in backend/worker.py (JOB_MODE=worker)
+    atexit.register(shutdown_job_worker)
 
-            print(f"Job {job_id}: Analyzing distribution for {base_type}...")
-            analyzer = PriceAnalyzer()
-            dist_result = analyzer.analyze_distribution(base_type, session_id)
-            
-            # Create Bucket objects
-            buckets = []
-            for b in dist_result['buckets']:
-                # common_stats is now a list of modifier objects from _extract_all_modifiers
-                # Structure: [{"name": "...", "display_text": "...", ...}, ...]
-                attrs = {}
-                for stat in b.get('common_stats', []):
-                    # Use display_text as the attribute name (includes value like "+15% to Fire Damage")
-                    name = stat.get('display_text') or stat.get('name')
-                    if name:
-                        attrs[name] = attrs.get(name, 0) + 1
-
-                b_min = b['min']
-                b_max = b['max']
-                
-                bucket = Bucket(
-                    price_range=f"{b_min} - {b_max}" if b_max is not None else f"{b_min}+",
-                    min_price=float(b_min),
-                    max_price=float(b_max) if b_max is not None else None,
-                    count=int(b['count']),
-                    avg_price=float(b['avg_price']),
-                    attributes=attrs
-                )
-                buckets.append(bucket)
-            
-            # Save to ItemAnalysis
-            analysis = ItemAnalysis(
-                base_type=base_type,
-                min_price=float(dist_result['min_price']),
-                max_price=float(dist_result['max_price']),
-                currency="exalted",
-                buckets=buckets
-            )
-            analysis.save()
-            
-            # Update Job
-            job.results = [analysis.to_dict()]
-            job.status = 'completed'
-            job.save()
-            print(f"Job {job_id} completed successfully")
+    # Returns immediately; the connection is checked in the background (see /readyz)
+    init_db(app)
+
+    # Shared currency rates: loaded from MongoDB in the background, refreshed from CURRENCY_RATES_SOURCE
+    init_currency_service()
 
-        except Exception as e:
-            print(f"Job {job_id} failed: {e}")
-            traceback.print_exc()
-            job.status = 'failed'
-            job.error = str(e)
-            job.save()
+    # Retention/compaction runs on its own schedule (MAINTENANCE_INTERVAL_HOURS, 0 disables), in one process at a time
+    app.extensions['maintenance_task'] = start_maintenance_scheduler()
+    return app
 
 
-@app.route('/')
+@api.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process serves requests."""
+    return jsonify({"status": "ok"})
+
+
+@api.route('/readyz', methods=['GET'])
+def readyz():
+    """
+    Readiness: 200 while a writable MongoDB server is known, else 503 at once
+    (no server selection wait). Includes the client options and pool statistics.
+    """
+    status = check_db()
+    return jsonify({"ready": status['ready'], "database": status}), 200 if status['ready'] else 503
+
+
+@api.route('/')
 def index():
     try:
-        return app.send_static_file('index.html')
+        return current_app.send_static_file('index.html')
     except Exception as e:
         return f"Error: {e}", 500
 
-@app.route('/<path:path>')
+@api.route('/<path:path>')
 def static_proxy(path):
     try:
-        return app.send_static_file(path)
+        return current_app.send_static_file(path)
     except Exception:
-        return app.send_static_file('index.html')
-
-# Configuration
-SEARCH_URL_BASE = "https://www.pathofexile.com/api/trade2/search/poe2/"
-FETCH_URL_BASE = "https://www.pathofexile.com/api/trade2/fetch/"
+        return current_app.send_static_file('index.html')
 
 def get_session_id():
     """Extract session ID from header or environment."""
     return request.headers.get("X-POESESSID") or os.getenv("POESESSID")
 
-# Default Headers (User-Agent is critical)
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:146.0) Gecko/20100101 Firefox/146.0",
-    "Accept": "application/json",
-    "Content-Type": "application/json",
-    "Cookie": "POESESSID=a41245dcc7722dca4bffcca666812e58" # Ideally this comes from request or is updated
-}
-
-def normalize_mod(mod_text):
-    text = re.sub(r'\d+-\d+', '#-#', mod_text)
-    text = re.sub(r'\d+(\.\d+)?', '#', text)
-    text = text.replace('+', '').replace('-', '') 
-    return text.strip()
-
-def extract_values(mod_text):
-    return [float(x) for x in re.findall(r'\d+(?:\.\d+)?', mod_text)]
-
-def analyze_items_logic(items):
-    # Structure: { "ItemType": { "count": 0, "mods": { (ModText, Type): { "count": 0, "values": [] } } } }
-    analysis = defaultdict(lambda: {"count": 0, "mods": defaultdict(lambda: {"count": 0, "values": []})})
-    
-    for entry in items:
-        item = entry.get("item", {})
-        base_type = item.get("baseType", "Unknown")
-        
-        item_category = base_type
-        if "Bow" in base_type: item_category = "Bow"
-        elif "Wand" in base_type: item_category = "Wand"
-        elif "Staff" in base_type: item_category = "Staff"
-        elif "Crossbow" in base_type: item_category = "Crossbow"
-        elif "Talisman" in base_type: item_category = "Talisman"
-        elif "Quiver" in base_type: item_category = "Quiver"
-        
-        analysis[item_category]["count"] += 1
-        
-        # Build affix map
-        affix_lookup = []
-        if "extended" in item and "mods" in item["extended"]:
-            for mod_type in ["explicit", "fractured", "desecrated"]:
-                if mod_type in item["extended"]["mods"]:
-                    for mod_def in item["extended"]["mods"][mod_type]:
-                        tier = mod_def.get("tier", "")
-                        tier_type = "explicit"
-                        if tier.startswith("P"): tier_type = "prefix"
-                        elif tier.startswith("S"): tier_type = "suffix"
-                        
-                        magnitudes = mod_def.get("magnitudes", [])
-                        if magnitudes:
-                            ranges = []
-                            for mag in magnitudes:
-                                try:
-                                    min_v = float(mag.get("min", 0))
-                                    max_v = float(mag.get("max", 0))
-                                    ranges.append((min_v, max_v))
-                                except: pass
-                            affix_lookup.append({"type": tier_type, "ranges": ranges, "tier": tier})
-
-        mod_categories = {
-            "explicit": item.get("explicitMods", []),
-            "implicit": item.get("implicitMods", []),
-            "fractured": item.get("fracturedMods", []),
-            "rune": item.get("runeMods", []),
-            "desecrated": item.get("desecratedMods", [])
-        }
-        
-        seen_mods_for_item = set()
-        
-        for cat_name, mods in mod_categories.items():
-            for mod in mods:
-                clean_mod = re.sub(r'\[([^\|\]]+)\|([^\]]+)\]', r'\2', mod)
-                clean_mod = re.sub(r'\[([^\]]+)\]', r'\1', clean_mod)
-                
-                normalized = normalize_mod(clean_mod)
-                mod_values = extract_values(clean_mod)
-                
-                final_type = cat_name
-                
-                if cat_name == "rune":
-                    if clean_mod.startswith("Bonded") or "Bonded" in clean_mod:
-                        final_type = "bonded"
-                    else:
-                        final_type = "rune" 
-                elif cat_name == "implicit":
-                    final_type = "implicit"
-                elif cat_name == "fractured":
-                    final_type = "fractured"
-                elif cat_name in ["explicit", "desecrated"]:
-                    best_match = "explicit" 
-                    if mod_values:
-                        for affix in affix_lookup:
-                            if len(mod_values) > 0 and len(affix["ranges"]) > 0:
-                                val = mod_values[0]
-                                match = False
-                                for (min_v, max_v) in affix["ranges"]:
-                                    if min_v <= val <= max_v:
-                                        match = True
-                                        break
-                                if match:
-                                    best_match = affix["type"]
-                                    break
-                    final_type = best_match
-
-                unique_key = (normalized, final_type)
-                if unique_key not in seen_mods_for_item:
-                    mod_data = analysis[item_category]["mods"][unique_key]
-                    mod_data["count"] += 1
-                    mod_data["values"].append(mod_values)
-                    seen_mods_for_item.add(unique_key)
-
-    # Format Output
-    output_data = {}
-    for w_type, data in analysis.items():
-        total_items = data["count"]
-        if total_items == 0: continue
-            
-        stats_list = []
-        for (mod_name, mod_type), mod_info in data["mods"].items():
-            count = mod_info["count"]
-            all_values_lists = mod_info["values"]
-            
-            stats_per_pos = []
-            if all_values_lists:
-                max_len = max(len(lst) for lst in all_values_lists)
-                for k in range(max_len):
-                    vals_at_k = [lst[k] for lst in all_values_lists if k < len(lst)]
-                    if vals_at_k:
-                        stats_per_pos.append({
-                            "min": min(vals_at_k),
-                            "max": max(vals_at_k),
-                            "avg": round(sum(vals_at_k) / len(vals_at_k), 1)
-                        })
-                    else:
-                        stats_per_pos.append({"min": 0, "max": 0, "avg": 0})
-            
-            stats_list.append({
-                "name": mod_name,
-                "type": mod_type,
-                "count": count,
-                "percentage": round((count / total_items) * 100, 1),
-                "values": stats_per_pos
-            })
-            
-        sorted_stats = sorted(stats_list, key=lambda x: x["count"], reverse=True)
-        output_data[w_type] = {
-            "total_items": total_items,
-            "stats": sorted_stats
-        }
-        
-    return output_data
+def job_profile_mode(data):
+    """Profile mode for a job being enqueued (payload 'profile' or X-Profile header). Raises ValueError."""
+    if not profiling_allowed(request):
+        return None
+    return profile_mode(data.get('profile', request.headers.get(PROFILE_HEADER)))
 
-@app.route('/history', methods=['GET'])
+@api.route('/history', methods=['GET'])
 def list_history():
     try:
         # Fetch from MongoDB
@@ -361,7 +135,7 @@ def list_history():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/history/<filename>', methods=['GET'])
+@api.route('/history/<filename>', methods=['GET'])
 def get_history_item(filename):
     try:
         # Fetch by ID from MongoDB (filename is actually the ID now)
@@ -373,7 +147,7 @@ def get_history_item(filename):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/save', methods=['POST'])
+@api.route('/save', methods=['POST'])
 def save_history():
     try:
         data = request.json
@@ -404,8 +178,17 @@ def save_history():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/analyze', methods=['POST'])
+@api.route('/analyze', methods=['POST'])
 def analyze():
+    """
+    Queue a modifier statistics analysis for a pasted trade query.
+    Body: query_text (trade query JSON), league, limit (listings to analyze,
+    default QUERY_ANALYSIS_DEFAULT_LIMIT, capped at QUERY_ANALYSIS_MAX_LIMIT).
+    Returns 202 with the job ID; the job publishes partial aggregates while it
+    fetches. Pass ?stream=true (or Accept: application/x-ndjson) to receive them
+    as JSON lines.
+    """
+    from backend.jobs import QUERY_ANALYSIS_DEFAULT_LIMIT, QUERY_ANALYSIS_MAX_LIMIT
     try:
         data = request.json
         if not data:
@@ -414,71 +197,65 @@ def analyze():
         league = data.get("league", "Fate of the Vaal")
         query_text = data.get("query_text", "")
         
-        # Parse query input
-        # It could be:
-        # 1. A JSON object string
-        # 2. A cURL command (harder, but common)
-        # 3. Just the "query" part of the JSON
-        
+        # Parse query input: either {"query": {...}, ...} or just the "query" part
         try:
-            # Try to parse as JSON
             parsed = json.loads(query_text)
-            
-            # If it has "query" key at root, use it directly
-            if "query" in parsed:
-                query_payload = parsed["query"]
-            else:
-                # Assume the whole thing is the query payload
-                query_payload = parsed
-                
         except json.JSONDecodeError:
             return jsonify({"error": "Invalid JSON format. Please paste a valid PoE Trade query JSON."}), 400
-        
-        # Determine Search URL based on league
-        # Defaulting to poe2/LeagueName
-        search_url = f"{SEARCH_URL_BASE}{league}"
-        
-        print(f"Executing search on {search_url}...")
-        
-        # 1. Execute Search
-        response = requests.post(search_url, headers=HEADERS, json={"query": query_payload, "sort": {"price": "asc"}})
-        response.raise_for_status()
-        search_result = response.json()
-        
-        result_ids = search_result.get("result", [])
-        query_id = search_result.get("id")
-        
-        if not result_ids:
-            return jsonify({"error": "No items found for this query", "raw": search_result}), 404
-            
-        # 2. Fetch Details (Limit to 100 to avoid long waits/bans)
-        LIMIT = 100
-        items_to_fetch = result_ids[:LIMIT]
-        all_items = []
-        
-        batch_size = 10
-        for i in range(0, len(items_to_fetch), batch_size):
-            batch = items_to_fetch[i:i + batch_size]
-            id_string = ",".join(batch)
-            fetch_url = f"{FETCH_URL_BASE}{id_string}?query={query_id}&realm=poe2"
-            
-            print(f"Fetching batch {i}...")
-            r = requests.get(fetch_url, headers=HEADERS)
-            if r.status_code == 200:
-                all_items.extend(r.json().get("result", []))
-            time.sleep(0.5) # Politeness delay
-            
-        # 3. Analyze
-        analysis_result = analyze_items_logic(all_items)
-        
-        return jsonify(analysis_result)
+        if not isinstance(parsed, dict):
+            return jsonify({"error": "Invalid JSON format. Please paste a valid PoE Trade query JSON."}), 400
+        query_payload = parsed["query"] if "query" in parsed else parsed
+
+        try:
+            limit = int(data.get("limit") or QUERY_ANALYSIS_DEFAULT_LIMIT)
+        except (TypeError, ValueError):
+            return jsonify({"error": "limit must be an integer"}), 400
+        limit = max(1, min(limit, QUERY_ANALYSIS_MAX_LIMIT))
+
+        try:
+            profile = job_profile_mode(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        job = enqueue_job(
+            'query_analysis',
+            params={
+                'league': league,
+                'query': query_payload,
+                'limit': limit,
+                'session_id': get_session_id(),
+                'profile': profile
+            },
+            total=limit
+        )
+        job_id = str(job.id)
+
+        wants_stream = request.args.get('stream', 'false').lower() == 'true' or \
+            request.accept_mimetypes.best == 'application/x-ndjson'
+        if wants_stream:
+            return job_stream_response(job_id)
+
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "limit": limit,
+            "status_url": f"/api/jobs/{job_id}",
+            "stream_url": f"/api/jobs/{job_id}/stream"
+        }), 202
 
     except Exception as e:
         print(f"Error: {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/analyze/batch-price', methods=['POST'])
+@api.route('/analyze/batch-price', methods=['POST'])
 def batch_price_analysis():
+    """
+    Queue a batch price analysis and return immediately with the job ID.
+    Poll /api/jobs/<job_id>, or pass ?stream=true (or Accept: application/x-ndjson)
+    to receive each base's result as a JSON line as soon as it is ready.
+    Optional max_age_minutes: reuse analyses of a base younger than this (0 forces a fresh run).
+    Optional priority: 'batch' (default), 'background' for bulk refreshes, or 'interactive'.
+    """
     session_id = get_session_id()
     if not session_id:
         return jsonify({"error": "Session ID required (X-POESESSID header or POESESSID env)"}), 401
@@ -490,34 +267,62 @@ def batch_price_analysis():
     bases = data.get("bases", [])
     if not bases:
         return jsonify({"error": "No bases provided"}), 400
+
+    priority = data.get("priority", "batch")
+    if priority not in JOB_PRIORITIES:
+        return jsonify({"error": f"priority must be one of {', '.join(JOB_PRIORITIES)}"}), 400
+    try:
+        profile = job_profile_mode(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     # Get active exclusions
     exclusions = get_excluded_mods()
     
-    analyzer = PriceAnalyzer()
-    results = []
-    for base in bases:
-        print(f"Analyzing {base}...")
-        try:
-            # Use save_analysis to run analysis AND save to DB
-            analysis = save_analysis(
-                analyzer=analyzer,
-                base_type=base,
-                session_id=session_id,
-                excluded_mods=exclusions
-            )
-        except Exception as e:
-            print(f"Error analyzing {base}: {e}")
-            results.append({"base_type": base, "error": str(e)})
-            continue
+    job = enqueue_job(
+        'batch_analysis',
+        params={
+            'bases': bases,
+            'session_id': session_id,
+            'exclusions': [e.to_dict() for e in exclusions],
+            'max_age_minutes': data.get('max_age_minutes'),  # None -> ANALYSIS_FRESHNESS_MINUTES, 0 -> always re-query
+            'profile': profile
+        },
+        total=len(bases),
+        priority=priority
+    )
+    job_id = str(job.id)
 
-        results.append(analysis.to_dict())
-        time.sleep(2) # Rate limit
-        
-    return jsonify(results)
+    wants_stream = request.args.get('stream', 'false').lower() == 'true' or \
+        request.accept_mimetypes.best == 'application/x-ndjson'
+    if wants_stream:
+        return job_stream_response(job_id)
+
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "status_url": f"/api/jobs/{job_id}",
+        "stream_url": f"/api/jobs/{job_id}/stream"
+    }), 202
 
 
-@app.route('/api/jobs/batch-analysis', methods=['POST'])
+def job_stream_response(job_id):
+    """NDJSON response tailing a job: one line per result/progress/heartbeat event."""
+    from flask import Response, stream_with_context
+    from backend.jobs import stream_job_events
+
+    def generate():
+        for event in stream_job_events(job_id):
+            yield current_app.json.dumps({'job_id': job_id, **event}) + "\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@api.route('/api/jobs/batch-analysis', methods=['POST'])
 def create_batch_job():
     """
     Create a new background job for batch analysis.
@@ -531,24 +336,29 @@ def create_batch_job():
         return jsonify({"error": "No bases provided"}), 400
         
     bases = data.get("bases", [])
+
+    priority = data.get("priority", "batch")
+    if priority not in JOB_PRIORITIES:
+        return jsonify({"error": f"priority must be one of {', '.join(JOB_PRIORITIES)}"}), 400
+    try:
+        profile = job_profile_mode(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     # Get active exclusions
     exclusions = get_excluded_mods()
     
-    # Create job document
-    job = Job(
+    job = enqueue_job(
+        'batch_analysis',
+        params={
+            'bases': bases,
+            'session_id': session_id,
+            'exclusions': [e.to_dict() for e in exclusions],  # Pass as dicts for safety
+            'max_age_minutes': data.get('max_age_minutes'),
+            'profile': profile
+        },
         total=len(bases),
-        status='queued'
-    )
-    job.save()
-    
-    # Submit to executor
-    executor.submit(
-        process_batch_analysis, 
-        str(job.id), 
-        bases, 
-        session_id, 
-        [e.to_dict() for e in exclusions] # Pass as dicts for safety
+        priority=priority
     )
     
     return jsonify({
@@ -557,7 +367,7 @@ def create_batch_job():
     })
 
 
-@app.route('/api/analyze/distribution', methods=['POST'])
+@api.route('/api/analyze/distribution', methods=['POST'])
 def analyze_distribution_job():
     """
     Create a new background job for distribution analysis.
@@ -571,22 +381,18 @@ def analyze_distribution_job():
         return jsonify({"error": "No base_type provided"}), 400
         
     base_type = data.get("base_type")
+
+    try:
+        profile = job_profile_mode(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    # Create job document
-    job = Job(
+    job = enqueue_job(
+        'distribution',
+        params={'base_type': base_type, 'session_id': session_id, 'profile': profile},
         total=1,
-        status='queued',
         current_item=base_type
     )
-    job.save()
-    
-    # Submit to executor
-    executor.submit(
-        process_distribution_analysis, 
-        str(job.id), 
-        base_type, 
-        session_id
-    )
     
     return jsonify({
         "success": True,
@@ -594,85 +400,224 @@ def analyze_distribution_job():
     })
 
 
-@app.route('/api/jobs/<job_id>', methods=['GET'])
+@api.route('/api/jobs/<job_id>', methods=['GET'])
 def get_job_status(job_id):
     """
     Get the status of a background job.
     """
     try:
-        job = Job.objects(id=job_id).first()
+        query = Job.objects(id=job_id)
+        etag = queryset_etag(query, fields=Job.API_FIELDS)
+        if is_not_modified(etag):
+            return not_modified_response(current_app, etag)
+
+        job = query.first()
         if not job:
             return jsonify({"error": "Job not found"}), 404
             
-        return jsonify(job.to_dict())
+        return with_etag(jsonify(job.to_dict()), etag)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@api.route('/api/jobs/queue', methods=['GET'])
+def get_job_queue():
+    """
+    Queue depth per status and the workers currently holding job leases.
+    """
+    from backend.jobs import queue_stats
+    try:
+        return jsonify({"success": True, "data": queue_stats()})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@api.route('/api/jobs/<job_id>/stream', methods=['GET'])
+def stream_job(job_id):
+    """
+    Stream a job's results as newline-delimited JSON until it finishes.
+    """
+    try:
+        if not Job.objects(id=job_id).only('id').first():
+            return jsonify({"error": "Job not found"}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    return job_stream_response(job_id)
+
+
+@api.route('/api/jobs/<job_id>/profiles', methods=['GET'])
+def list_job_profiles(job_id):
+    """
+    Profiles recorded for a job, newest first (one per run when the job was resumed).
+    Needs the same permission as starting a profile (see profiling_allowed).
+    """
+    if not profiling_allowed(request):
+        return jsonify({"success": False, "error": "Profiling is not available"}), 403
+    try:
+        profiles = Profile.objects(job_id=job_id).exclude('data').order_by('-created_at')
+        return jsonify({"success": True, "data": [p.to_dict() for p in profiles]})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@api.route('/api/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """
+    A stored profile. Returns the raw output as text/plain (folded stacks load
+    directly into speedscope or flamegraph.pl); ?format=json wraps it with its metadata.
+    Profiles expose server stacks and paths, so reading one needs profiling_allowed too.
+    """
+    if not profiling_allowed(request):
+        return jsonify({"success": False, "error": "Profiling is not available"}), 403
+    try:
+        profile = Profile.objects(id=profile_id).first()
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    if not profile:
+        return jsonify({"success": False, "error": "Profile not found"}), 404
+
+    if request.args.get('format') == 'json':
+        return jsonify({"success": True, "data": profile.to_dict(include_data=True)})
+    extension = 'folded' if profile.format == 'collapsed' else 'txt'
+    return current_app.response_class(
+        profile.data or '',
+        mimetype='text/plain',
+        headers={'Content-Disposition': f'inline; filename="profile-{profile.id}.{extension}"'}
+    )
+
+
 # Currency rates endpoint - fetch from poe.ninja
 
-@app.route('/api/currency/rates', methods=['GET'])
+@api.route('/api/currency/rates', methods=['GET'])
 def get_currency_rates():
     """
     Get current currency exchange rates.
     Returns rates normalized to Exalted Orbs.
     """
-    from backend.currency_service import CurrencyService
-    service = CurrencyService()
-    return jsonify(service.get_rates())
+    from backend.currency_service import get_currency_service
+    return jsonify(get_currency_service().get_rates())
 
-@app.route('/api/currency/rates', methods=['POST'])
+@api.route('/api/currency/rates', methods=['POST'])
 def refresh_currency_rates():
     """
     Refresh currency rates from poe.ninja.
     POST body: {"rates": {"exalted": 1.0, "divine": 0.5, ...}}
+    Without a body, pulls from the configured rate source (if any).
+    Updated rates are persisted and used by all subsequent analyses.
     Returns updated rates.
     """
-    from backend.currency_service import CurrencyService
+    from backend.currency_service import get_currency_service, get_rate_source
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
         if data and "rates" in data:
-            service = CurrencyService()
-            success = service.refresh_from_poe_ninja(data["rates"])
+            success = get_currency_service().refresh_from_poe_ninja(data["rates"], source="api", persist=True)
             if success:
-                return jsonify({"success": True, "rates": service.get_rates()})
+                return jsonify({"success": True, "rates": get_currency_service().get_rates()})
             else:
                 return jsonify({"success": False, "error": "Invalid rates format"}), 400
-        else:
-            # If no rates provided, just return current rates
-            service = CurrencyService()
-            return jsonify({"success": True, "rates": service.get_rates()})
+
+        source = get_rate_source()
+        if source:
+            get_currency_service().refresh_from_source(source)
+        return jsonify({"success": True, "rates": get_currency_service().get_rates()})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
-# Items endpoint - proxy to PoE trade API to get item list
-@app.route('/api/items', methods=['GET'])
+@api.route('/api/currency/status', methods=['GET'])
+def get_currency_status():
+    """
+    Get where the current rates came from and when they were last updated.
+    """
+    from backend.currency_service import get_currency_service
+    return jsonify({"success": True, "data": get_currency_service().status()})
+
+# Items endpoint - cached copy of the PoE trade item list
+@api.route('/api/items', methods=['GET'])
 def get_items():
     """
-    Fetch item list from PoE trade API.
+    Get the item list from the PoE trade API (cached server-side).
     Returns categorized items for the batch analysis tree selector.
+    Supports If-None-Match (304) and gzip transfer encoding.
+    While only the bundled partial stub is available the response carries X-Catalog-Degraded.
     """
+    from backend.item_catalog import get_item_catalog, CatalogUnavailable
     try:
-        response = requests.get(
-            "https://www.pathofexile.com/api/trade2/data/items",
-            headers={
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:146.0) Gecko/20100101 Firefox/146.0",
-                "Accept": "*/*",
-                "X-Requested-With": "XMLHttpRequest"
-            },
-            timeout=30
-        )
-        if response.status_code == 200:
-            return jsonify(response.json())
-        else:
-            return jsonify({"error": f"Failed to fetch items: {response.status_code}"}), response.status_code
+        catalog = get_item_catalog().get()
+    except CatalogUnavailable as e:
+        return jsonify({"error": str(e)}), e.status_code
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+    headers = {
+        "Cache-Control": "public, max-age=300, must-revalidate",
+        "Vary": "Accept-Encoding"
+    }
+    if catalog.degraded:
+        # Partial offline stub: flag it and keep clients from caching it
+        headers["Cache-Control"] = "no-cache"
+        headers["X-Catalog-Degraded"] = "fixture"
+    if request.if_none_match.contains(catalog.etag):
+        response = current_app.response_class(status=304, headers=headers)
+    elif request.accept_encodings["gzip"] > 0:  # Honours q-values, so gzip;q=0 is a refusal
+        headers["Content-Encoding"] = "gzip"
+        response = current_app.response_class(catalog.gzip_body, mimetype="application/json", headers=headers)
+    else:
+        response = current_app.response_class(catalog.body, mimetype="application/json", headers=headers)
+    response.set_etag(catalog.etag)
+    return response
+
+
+@api.route('/api/items/search', methods=['GET'])
+def search_items():
+    """
+    Prefix search over item names, matching the start of any word.
+    Query params: q (required), limit (default 20, max 100)
+    """
+    from backend.item_index import get_item_index
+    from backend.item_catalog import CatalogUnavailable
+    try:
+        query = request.args.get('q', '')
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        index = get_item_index()
+        results = index.search(query, limit=limit)
+        return jsonify({
+            "success": True,
+            "data": [info.to_dict() for info in results],
+            "count": len(results)
+        })
+    except CatalogUnavailable as e:
+        return jsonify({"success": False, "error": str(e)}), e.status_code
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@api.route('/api/items/tree', methods=['GET'])
+def get_item_tree():
+    """
+    Get items grouped as category -> item class -> names, built once per catalog version.
+    Supports If-None-Match (304) with the catalog ETag.
+    """
+    from backend.item_index import get_item_index
+    from backend.item_catalog import CatalogUnavailable
+    try:
+        index = get_item_index()
+    except CatalogUnavailable as e:
+        return jsonify({"success": False, "error": str(e)}), e.status_code
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    if request.if_none_match.contains(index.version):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify({"success": True, "data": index.tree})
+    response.set_etag(index.version)
+    response.headers["Cache-Control"] = "public, max-age=300, must-revalidate"
+    return response
+
 
 # ============== Database API Endpoints ==============
 
-@app.route('/api/db/analyses', methods=['GET'])
+@api.route('/api/db/analyses', methods=['GET'])
 def get_analyses():
     """
     Get all saved analysis results.
@@ -693,11 +638,16 @@ def get_analyses():
         else:
             analyses = get_analyses(base_type=base_type, limit=limit)
 
-        return jsonify({
+        etag = queryset_etag(analyses)
+        if is_not_modified(etag):
+            return not_modified_response(current_app, etag)
+
+        data = serialize_analyses(analyses)
+        return with_etag(jsonify({
             'success': True,
-            'data': [a.to_dict() for a in analyses],
-            'count': len(analyses)
-        })
+            'data': data,
+            'count': len(data)
+        }), etag)
     except Exception as e:
         print(f"ERROR in get_analyses: {e}")
         import traceback
@@ -705,7 +655,7 @@ def get_analyses():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/db/item-analyses', methods=['GET'])
+@api.route('/api/db/item-analyses', methods=['GET'])
 def get_item_analyses_endpoint():
     """
     Get saved deep dive distribution analysis results.
@@ -720,11 +670,16 @@ def get_item_analyses_endpoint():
         from backend.database import get_item_analyses
         analyses = get_item_analyses(base_type=base_type, limit=limit)
 
-        return jsonify({
+        etag = queryset_etag(analyses)
+        if is_not_modified(etag):
+            return not_modified_response(current_app, etag)
+
+        data = serialize_item_analyses(analyses)
+        return with_etag(jsonify({
             'success': True,
-            'data': [a.to_dict() for a in analyses],
-            'count': len(analyses)
-        })
+            'data': data,
+            'count': len(data)
+        }), etag)
     except Exception as e:
         print(f"ERROR in get_item_analyses_endpoint: {e}")
         import traceback
@@ -732,25 +687,30 @@ def get_item_analyses_endpoint():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/db/analyses/<string:analysis_id>', methods=['GET'])
+@api.route('/api/db/analyses/<string:analysis_id>', methods=['GET'])
 def get_analysis(analysis_id):
     """
     Get a specific analysis result by ID.
     """
     try:
-        analysis = AnalysisResult.objects(id=analysis_id).first()
+        query = AnalysisResult.objects(id=analysis_id)
+        etag = queryset_etag(query)
+        if is_not_modified(etag):
+            return not_modified_response(current_app, etag)
+
+        analysis = query.first()
         if not analysis:
             return jsonify({'success': False, 'error': 'Analysis not found'}), 404
 
-        return jsonify({
+        return with_etag(jsonify({
             'success': True,
             'data': analysis.to_dict()
-        })
+        }), etag)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/db/exclusions', methods=['GET'])
+@api.route('/api/db/exclusions', methods=['GET'])
 def get_exclusions():
     """
     Get all active excluded modifier rules.
@@ -768,7 +728,7 @@ def get_exclusions():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/db/exclusions', methods=['POST'])
+@api.route('/api/db/exclusions', methods=['POST'])
 def add_exclusion():
     """
     Add a new excluded modifier rule.
@@ -799,7 +759,7 @@ def add_exclusion():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/db/exclusions/<string:exclusion_id>', methods=['DELETE'])
+@api.route('/api/db/exclusions/<string:exclusion_id>', methods=['DELETE'])
 def remove_exclusion(exclusion_id):
     """
     Remove (deactivate) an excluded modifier rule.
@@ -817,7 +777,7 @@ def remove_exclusion(exclusion_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/db/exclusions/<string:exclusion_id>', methods=['PUT'])
+@api.route('/api/db/exclusions/<string:exclusion_id>', methods=['PUT'])
 def update_exclusion(exclusion_id):
     """
     Update an excluded modifier rule.
@@ -852,9 +812,142 @@ def update_exclusion(exclusion_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@api.route('/api/db/modifiers/top', methods=['GET'])
+def get_top_modifiers():
+    """
+    Aggregate modifier observations across analyses.
+    Query params:
+        - by: "frequency" (default) or "uplift"
+        - base_type, rarity, mod_type: Filters
+        - tier_rank: Numeric tier, e.g. 1 for P1/S1
+        - min_price: Only listings priced at or above this (exalted)
+        - since_days: Only observations from the last N days
+        - min_count: Minimum observations per modifier (uplift only, default 3)
+        - limit: Maximum results (default 20)
+    """
+    try:
+        from backend.database import get_top_modifiers_by_frequency, get_top_modifiers_by_uplift
+
+        by = request.args.get('by', 'frequency')
+        tier_rank = request.args.get('tier_rank')
+        min_price = request.args.get('min_price')
+        since_days = request.args.get('since_days')
+        filters = {
+            'base_type': request.args.get('base_type'),
+            'rarity': request.args.get('rarity'),
+            'mod_type': request.args.get('mod_type'),
+            'tier_rank': int(tier_rank) if tier_rank else None,
+            'min_price': float(min_price) if min_price else None,
+            'since': datetime.utcnow() - timedelta(days=float(since_days)) if since_days else None,
+        }
+        limit = int(request.args.get('limit', 20))
+
+        if by == 'uplift':
+            data = get_top_modifiers_by_uplift(
+                limit=limit, min_count=int(request.args.get('min_count', 3)), **filters
+            )
+        elif by == 'frequency':
+            data = get_top_modifiers_by_frequency(limit=limit, **filters)
+        else:
+            return jsonify({'success': False, 'error': f"Unknown ordering '{by}'"}), 400
+
+        return jsonify({'success': True, 'data': data, 'count': len(data)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/api/db/request-costs', methods=['GET'])
+def get_request_costs_endpoint():
+    """
+    Trade request cost per base type, to find the bases that burn the rate budget.
+    Query params:
+        - limit: Max bases to return (default 20)
+        - since_days: Only analyses from the last N days
+        - sort: Cost field to rank by (default 'requests'; e.g. status_429, rate_wait_seconds, bytes)
+    """
+    try:
+        from backend.database import get_request_costs
+
+        since_days = request.args.get('since_days')
+        data = get_request_costs(
+            limit=int(request.args.get('limit', 20)),
+            since=datetime.utcnow() - timedelta(days=float(since_days)) if since_days else None,
+            sort=request.args.get('sort', 'requests')
+        )
+        return jsonify({'success': True, 'data': data, 'count': len(data)})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/api/db/reprice', methods=['POST'])
+def reprice_history_endpoint():
+    """
+    Recompute stored Exalted prices against the currency snapshot in effect
+    at each analysis' timestamp.
+    Body (all optional):
+        - base_type: Only re-price this base
+        - since_days: Only re-price the last N days
+        - dry_run: Report what would change without writing
+    """
+    try:
+        from backend.repricing import reprice_history
+
+        data = request.get_json(silent=True) or {}
+        since_days = data.get('since_days')
+        report = reprice_history(
+            base_type=data.get('base_type'),
+            since=datetime.utcnow() - timedelta(days=float(since_days)) if since_days else None,
+            dry_run=bool(data.get('dry_run', False))
+        )
+        return jsonify({'success': True, 'data': report})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/api/currency/snapshots', methods=['GET'])
+def get_currency_snapshots():
+    """
+    List persisted currency rate snapshots, newest first.
+    Query params:
+        - limit: Maximum results (default 50)
+    """
+    try:
+        from backend.database import CurrencyRateSnapshot
+
+        limit = int(request.args.get('limit', 50))
+        snapshots = CurrencyRateSnapshot.objects.order_by('-created_at').limit(limit)
+        return jsonify({'success': True, 'data': [s.to_dict() for s in snapshots], 'count': len(snapshots)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/api/db/maintenance', methods=['GET'])
+def get_maintenance_report():
+    """
+    Get the report of the last retention/compaction run in this process.
+    """
+    from backend.maintenance import get_last_report
+    return jsonify({'success': True, 'data': get_last_report()})
+
+
+@api.route('/api/db/maintenance', methods=['POST'])
+def run_maintenance_now():
+    """
+    Run retention and compaction immediately.
+    Returns a report including bytes reclaimed per collection.
+    """
+    try:
+        from backend.maintenance import run_maintenance
+        return jsonify({'success': True, 'data': run_maintenance()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 # ============== Custom Category API Endpoints ==============
 
-@app.route('/api/db/custom-categories', methods=['GET'])
+@api.route('/api/db/custom-categories', methods=['GET'])
 def get_custom_categories():
     """
     Get all user-defined custom categories.
@@ -870,7 +963,7 @@ def get_custom_categories():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/db/custom-categories', methods=['POST'])
+@api.route('/api/db/custom-categories', methods=['POST'])
 def create_custom_category():
     """
     Create a new custom category.
@@ -897,7 +990,7 @@ def create_custom_category():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/db/custom-categories/<string:category_id>', methods=['DELETE'])
+@api.route('/api/db/custom-categories/<string:category_id>', methods=['DELETE'])
 def delete_custom_category(category_id):
     """
     Delete a custom category by ID.
@@ -912,6 +1005,8 @@ def delete_custom_category(category_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+app = create_app()
+
 
 if __name__ == '__main__':
     print("Starting server on port 5000...")
@@ -0,0 +1,27 @@
+from backend.benchmarks.analyzer import (
+    DEFAULT_BASES, DEFAULT_CASSETTE, bench_distribution, bench_fetch_decode, bench_gap, bench_modifier_memory,
+    cassette_items
+)
+from backend.trade_replay import Cassette
+
+
+def test_benchmark_cassette_replays_without_misses():
+    cassette = Cassette.load(DEFAULT_CASSETTE)
+
+    gap = bench_gap(cassette, DEFAULT_BASES, repeat=1, latency=0)
+    assert gap["replay_misses"] == 0
+    assert gap["requests_per_base"] >= 4  # 3 searches and at least one fetch
+
+    distribution = bench_distribution(cassette, ["Gemini Bow"], repeat=1, latency=0)
+    assert distribution["Gemini Bow"]["requests"] > 0
+    assert len(cassette_items(cassette)) > 100
+
+    memory = bench_modifier_memory(cassette_items(cassette))
+    assert memory["modifiers"] > 0 and memory["record_bytes"] < memory["dict_bytes"]
+
+
+def test_fetch_decode_reports_each_decoder():
+    decode = bench_fetch_decode(cassette_items(Cassette.load(DEFAULT_CASSETTE)), repeat=1)
+    assert decode["listings"] == 10 and decode["json"]["us"] > 0
+    if "orjson" in decode:
+        assert decode["orjson"]["us"] > 0 and decode["orjson"]["retained_bytes"] > 0
@@ -0,0 +1,121 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+from mongoengine import connect, disconnect
+
+import backend.coalescing as coalescing
+from backend.coalescing import analysis_key, coalesced_analysis
+from backend.database import AnalysisInFlight, AnalysisResult
+
+LEAGUE = "Fate of the Vaal"
+
+
+@pytest.fixture
+def db():
+    disconnect()
+    connect('mongoenginetest', mongo_client_class=mongomock.MongoClient)
+    AnalysisResult.objects.delete()
+    AnalysisInFlight.objects.delete()
+    yield
+    disconnect()
+
+
+def _saver(calls, delay=0.0):
+    def run(key):
+        calls.append(key)
+        time.sleep(delay)
+        analysis = AnalysisResult(base_type="Gemini Bow", normal_avg_ex=1.0, magic_avg_ex=2.0, gap_ex=1.0,
+                                  league=LEAGUE, analysis_key=key)
+        analysis.save()
+        return analysis
+    return run
+
+
+def test_analysis_key_ignores_exclusion_order_and_ids():
+    a = {'id': '1', 'mod_name_pattern': 'Life', 'mod_tier': None, 'mod_type': 'prefix'}
+    b = {'id': '2', 'mod_name_pattern': 'Mana', 'mod_tier': 'P1', 'mod_type': None}
+    assert analysis_key("Gemini Bow", LEAGUE, [a, b]) == analysis_key("Gemini Bow", LEAGUE, [dict(b, id='9'), a])
+    assert analysis_key("Gemini Bow", LEAGUE, [a]) != analysis_key("Gemini Bow", LEAGUE, [a, b])
+    assert analysis_key("Gemini Bow", LEAGUE) != analysis_key("Gemini Bow", "Standard")
+
+
+def test_fresh_result_is_reused_within_window(db):
+    calls = []
+    first, source = coalesced_analysis("Gemini Bow", _saver(calls), LEAGUE)
+    assert source == 'analyzed'
+
+    again, source = coalesced_analysis("Gemini Bow", _saver(calls), LEAGUE)
+    assert source == 'fresh' and again.id == first.id
+
+    _, source = coalesced_analysis("Gemini Bow", _saver(calls), LEAGUE, max_age_minutes=0)
+    assert source == 'analyzed'
+    assert len(calls) == 2
+    assert AnalysisInFlight.objects.count() == 0
+
+
+def test_concurrent_identical_runs_share_one_analysis(db):
+    calls, results = [], []
+
+    def submit():
+        results.append(coalesced_analysis("Gemini Bow", _saver(calls, delay=0.3), LEAGUE, max_age_minutes=0))
+
+    threads = [threading.Thread(target=submit) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert sorted(source for _, source in results) == ['analyzed', 'coalesced', 'coalesced']
+    assert len({analysis.id for analysis, _ in results}) == 1
+
+
+def test_waits_for_run_in_another_process(db):
+    key = analysis_key("Gemini Bow", LEAGUE)
+    AnalysisInFlight(key=key, owner='other', started_at=datetime.utcnow(),
+                     expires_at=datetime.utcnow() + timedelta(minutes=5)).save()
+
+    def other_process_finishes():
+        time.sleep(0.2)
+        _saver([])(key)
+        AnalysisInFlight.objects(key=key).delete()
+
+    threading.Thread(target=other_process_finishes).start()
+    calls = []
+    analysis, source = coalesced_analysis("Gemini Bow", _saver(calls), LEAGUE, max_age_minutes=0, poll_seconds=0.05)
+    assert source == 'coalesced' and analysis.analysis_key == key
+    assert calls == []
+
+
+def test_expired_marker_is_taken_over(db):
+    key = analysis_key("Gemini Bow", LEAGUE)
+    AnalysisInFlight(key=key, owner='dead', started_at=datetime.utcnow() - timedelta(hours=1),
+                     expires_at=datetime.utcnow() - timedelta(minutes=1)).save()
+    calls = []
+    _, source = coalesced_analysis("Gemini Bow", _saver(calls), LEAGUE, max_age_minutes=0)
+    assert source == 'analyzed' and calls == [key]
+
+
+def test_failed_run_raises_in_waiters(db):
+    errors = []
+
+    def failing(key):
+        time.sleep(0.2)
+        raise RuntimeError("trade site down")
+
+    def submit():
+        try:
+            coalesced_analysis("Gemini Bow", failing, LEAGUE, max_age_minutes=0)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=submit) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == ["trade site down"] * 2
+    assert not coalescing._inflight and AnalysisInFlight.objects.count() == 0
@@ -34,3 +34,80 @@ def test_normalize_to_exalted_case_insensitive():
     service = CurrencyService()
     assert service.normalize_to_exalted(1, "DIVINE") == 320.0
     assert service.normalize_to_exalted(1, "CHAOS") == 7.8
+
+def test_refresh_swaps_rates_without_mutating_previous_snapshot():
+    service = CurrencyService()
+    before = service.get_rates()
+    assert service.refresh_from_poe_ninja({"Exalted": 1, "Divine": 400}) is True
+    assert service.normalize_to_exalted(1, "divine") == 400.0
+    # Readers holding the old dict keep a consistent view
+    assert before["divine"] == 320.0
+
+def test_refresh_rejects_invalid_rates():
+    service = CurrencyService()
+    assert service.refresh_from_poe_ninja({"divine": "lots"}) is False
+    assert service.refresh_from_poe_ninja(None) is False
+    assert service.normalize_to_exalted(1, "divine") == 320.0
+
+def test_file_source_and_persisted_snapshot(tmp_path):
+    import json
+    import mongomock
+    from mongoengine import connect, disconnect
+    from backend.currency_service import FileRateSource
+    from backend.database import CurrencyRateSnapshot
+
+    disconnect()
+    connect('mongoenginetest', mongo_client_class=mongomock.MongoClient)
+    CurrencyRateSnapshot.objects.delete()
+
+    path = tmp_path / "rates.json"
+    path.write_text(json.dumps({"rates": {"exalted": 1.0, "divine": 250.0}}))
+
+    service = CurrencyService()
+    assert service.refresh_from_source(FileRateSource(str(path))) is True
+    assert service.normalize_to_exalted(2, "divine") == 500.0
+    assert CurrencyRateSnapshot.objects.count() == 1
+
+    # A fresh process loads the persisted snapshot instead of the defaults
+    restarted = CurrencyService()
+    assert restarted.load_latest() is True
+    assert restarted.normalize_to_exalted(1, "divine") == 250.0
+    disconnect()
+
+def test_shared_service_is_used_by_analyzer():
+    from backend.currency_service import get_currency_service
+    from backend.price_analyzer import PriceAnalyzer
+    assert PriceAnalyzer().currency_service is get_currency_service()
+
+def test_normalize_batch_matches_scalar():
+    service = CurrencyService()
+    amounts = [1, 2.5, 10, 3, None]
+    currencies = ["divine", "CHAOS", "unknown_currency", None, "exalted"]
+    result = service.normalize_batch(amounts, currencies)
+    expected = [service.normalize_to_exalted(a or 0, c) for a, c in zip(amounts, currencies)]
+    assert result.tolist() == pytest.approx(expected)
+
+def test_normalize_batch_uses_refreshed_rates():
+    service = CurrencyService()
+    assert service.normalize_batch([1], ["divine"])[0] == 320.0
+    service.refresh_from_poe_ninja({"exalted": 1.0, "divine": 400.0})
+    assert service.normalize_batch([1, 1], ["divine", "chaos"]).tolist() == [400.0, 0.0]
+
+def test_sync_latest_follows_snapshots_from_other_processes():
+    import mongomock
+    from mongoengine import connect, disconnect
+    from backend.database import CurrencyRateSnapshot
+
+    disconnect()
+    connect('mongoenginetest', mongo_client_class=mongomock.MongoClient)
+    CurrencyRateSnapshot.objects.delete()
+
+    web, worker = CurrencyService(), CurrencyService()
+    assert worker.sync_latest() is False  # Nothing persisted yet
+
+    web.refresh_from_poe_ninja({"exalted": 1.0, "divine": 275.0}, source="api", persist=True)
+    assert worker.sync_latest() is True
+    assert worker.normalize_to_exalted(1, "divine") == 275.0
+    assert worker.sync_latest() is False  # Already current
+    assert web.sync_latest() is False  # Its own snapshot is not newer
+    disconnect()
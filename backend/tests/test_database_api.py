@@ -148,3 +148,102 @@ def test_custom_category_crud(client):
     assert len(response.get_json()['data']) == 0
 
 
+
+
+def test_modifier_observations_aggregation(client):
+    """Test that save_analysis flattens observations and the top-mods endpoint aggregates them."""
+    from backend.database import save_analysis, ModifierObservation
+    from unittest.mock import MagicMock
+
+    ModifierObservation.objects.delete()
+
+    def listing(listing_id, price, names):
+        return {
+            "listing_id": listing_id,
+            "price_ex": price,
+            "modifiers": [{"name": n, "tier": "P1", "mod_type": "explicit", "rarity": "magic"} for n in names]
+        }
+
+    mock_analyzer = MagicMock()
+    mock_analyzer.analyze_gap.return_value = {
+        "normal_avg_ex": 1.0,
+        "magic_avg_ex": 40.0,
+        "gap_ex": 39.0,
+        "normal_modifiers": [],
+        "magic_modifiers": [],
+        "observations": [
+            listing("a", 100.0, ["Life", "Speed"]),
+            listing("b", 100.0, ["Life"]),
+            listing("c", 10.0, ["Mana"]),
+            listing("d", 10.0, ["Mana", "Speed"]),
+        ]
+    }
+    save_analysis(mock_analyzer, "Test Ring", "sessid", excluded_mods=[])
+    assert ModifierObservation.objects.count() == 6
+
+    response = client.get('/api/db/modifiers/top?base_type=Test Ring&tier_rank=1')
+    data = response.get_json()['data']
+    assert {(d['name'], d['count']) for d in data} == {("Life", 2), ("Speed", 2), ("Mana", 2)}
+    assert data[0]['share'] == 0.5
+
+    response = client.get('/api/db/modifiers/top?by=uplift&base_type=Test Ring&min_count=2')
+    data = response.get_json()['data']
+    assert data[0]['name'] == "Life"
+    assert data[0]['baseline_ex'] == 55.0
+    assert data[0]['uplift_ex'] == 45.0
+    assert data[-1]['name'] == "Mana"
+
+def test_analyses_etag_and_compression(client):
+    """History endpoints answer conditional GETs with 304 and compress large bodies."""
+    import gzip
+    from backend.database import Modifier
+    mods = [Modifier(name=f'+# to Stat {i}', tier='P1', mod_type='explicit', rarity='magic') for i in range(50)]
+    analysis = AnalysisResult(base_type='Expert Hunter Bow', normal_avg_ex=1.0, magic_avg_ex=5.0, gap_ex=4.0, modifiers=mods)
+    analysis.save()
+
+    response = client.get('/api/db/analyses', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'].startswith('W/')
+    body = gzip.decompress(response.data)
+    assert b'Expert Hunter Bow' in body
+
+    etag = response.headers['ETag']
+    response = client.get('/api/db/analyses', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    # Re-pricing changes the representation, so the validator changes too
+    analysis.repriced_at = analysis.created_at
+    analysis.save()
+    response = client.get('/api/db/analyses', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_request_costs_per_base(client):
+    """save_analysis records the trade requests of the run; the endpoint ranks bases by cost."""
+    from backend.database import save_analysis
+    from backend.trade_api import record
+    from unittest.mock import MagicMock
+
+    def analyze(requests_made):
+        def run(*args, **kwargs):
+            record(searches=1, fetches=requests_made - 1, requests=requests_made, status_429=1, rate_wait_seconds=1.5)
+            return {"normal_avg_ex": 1.0, "magic_avg_ex": 2.0, "gap_ex": 1.0}
+        analyzer = MagicMock()
+        analyzer.analyze_gap.side_effect = run
+        return analyzer
+
+    cheap = save_analysis(analyze(3), "Cheap Bow")
+    save_analysis(analyze(12), "Costly Wand")
+    save_analysis(analyze(8), "Costly Wand")
+    assert cheap.request_stats['requests'] == 3
+    assert cheap.to_dict()['request_stats']['rate_wait_seconds'] == 1.5
+
+    data = client.get('/api/db/request-costs').get_json()['data']
+    assert [row['base_type'] for row in data] == ["Costly Wand", "Cheap Bow"]
+    assert data[0]['analyses'] == 2
+    assert data[0]['totals']['requests'] == 20 and data[0]['per_analysis']['requests'] == 10
+    assert data[0]['totals']['status_429'] == 2
+
+    assert client.get('/api/db/request-costs?sort=nope').status_code == 400
@@ -0,0 +1,115 @@
+import gzip
+import json
+import pytest
+import requests_mock
+from backend.item_catalog import ItemCatalog, ITEMS_URL, CatalogUnavailable
+
+CATALOG = {"result": [{"id": "weapon", "label": "Weapons", "entries": [{"type": "Expert Hunter Bow"}]}]}
+
+
+def test_cold_start_fetches_and_persists(tmp_path):
+    cache_path = tmp_path / "catalog.json"
+    catalog = ItemCatalog(cache_path=str(cache_path), fixture_path=str(tmp_path / "missing.json"))
+
+    with requests_mock.Mocker() as m:
+        m.get(ITEMS_URL, json=CATALOG, headers={"ETag": 'W/"abc"'})
+        version = catalog.get()
+        catalog.get()
+        assert m.call_count == 1
+
+    assert version.data == CATALOG
+    assert json.loads(gzip.decompress(version.gzip_body)) == CATALOG
+    assert len(version.etag) == 32
+
+    # A new process starts from disk without touching the network
+    restarted = ItemCatalog(cache_path=str(cache_path), ttl=3600)
+    with requests_mock.Mocker() as m:
+        assert restarted.get().etag == version.etag
+        assert m.call_count == 0
+
+
+def test_revalidation_uses_upstream_validators(tmp_path):
+    catalog = ItemCatalog(cache_path=str(tmp_path / "catalog.json"), fixture_path="")
+
+    with requests_mock.Mocker() as m:
+        m.get(ITEMS_URL, json=CATALOG, headers={"ETag": 'W/"abc"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"})
+        first = catalog.get()
+
+        m.get(ITEMS_URL, status_code=304)
+        assert catalog.refresh() is first
+        assert m.request_history[-1].headers["If-None-Match"] == 'W/"abc"'
+        assert m.request_history[-1].headers["If-Modified-Since"] == "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+def test_fixture_seeds_offline(tmp_path):
+    fixture = tmp_path / "items.json"
+    fixture.write_text(json.dumps(CATALOG))
+    catalog = ItemCatalog(cache_path=str(tmp_path / "catalog.json"), fixture_path=str(fixture), ttl=float("inf"))
+    assert catalog.get().source == "fixture"
+
+
+def test_unavailable_without_cache(tmp_path):
+    catalog = ItemCatalog(cache_path=str(tmp_path / "catalog.json"), fixture_path="")
+    with requests_mock.Mocker() as m:
+        m.get(ITEMS_URL, status_code=503)
+        with pytest.raises(CatalogUnavailable) as exc:
+            catalog.get()
+    assert exc.value.status_code == 503
+
+
+def test_items_endpoint_returns_304(tmp_path, monkeypatch):
+    import backend.item_catalog as item_catalog
+    from backend.server import app
+
+    fixture = tmp_path / "items.json"
+    fixture.write_text(json.dumps(CATALOG))
+    monkeypatch.setattr(item_catalog, "_catalog", ItemCatalog(
+        cache_path=str(tmp_path / "catalog.json"), fixture_path=str(fixture), ttl=float("inf")
+    ))
+
+    with app.test_client() as client:
+        response = client.get('/api/items', headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert json.loads(gzip.decompress(response.data)) == CATALOG
+
+        etag = response.headers["ETag"]
+        response = client.get('/api/items', headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.data == b""
+
+
+def test_fixture_is_degraded_and_retried_with_backoff(tmp_path, monkeypatch):
+    import backend.item_catalog as item_catalog
+    from backend.server import app
+
+    fixture = tmp_path / "items.json"
+    fixture.write_text(json.dumps(CATALOG))
+    catalog = ItemCatalog(cache_path=str(tmp_path / "catalog.json"), fixture_path=str(fixture),
+                          retry_min=10, retry_max=25)
+    monkeypatch.setattr(catalog, "_revalidate_in_background", lambda: None)
+    monkeypatch.setattr(item_catalog, "_catalog", catalog)
+
+    with app.test_client() as client:
+        response = client.get('/api/items', headers={"Accept-Encoding": "gzip;q=0, identity"})
+        assert response.headers["X-Catalog-Degraded"] == "fixture"
+        assert response.headers["Cache-Control"] == "no-cache"
+        assert "Content-Encoding" not in response.headers
+        assert json.loads(response.data) == CATALOG
+
+    with requests_mock.Mocker() as m:
+        m.get(ITEMS_URL, status_code=503)
+        delays = []
+        for _ in range(3):
+            catalog.refresh()
+            delays.append(catalog._backoff())
+        assert delays == [10, 20, 25]
+        assert catalog._retry_at > 0
+
+        m.get(ITEMS_URL, json=CATALOG)
+        live = catalog.refresh()
+    assert not live.degraded and live.source == "upstream"
+    assert catalog._retry_at == 0.0
+
+    with app.test_client() as client:
+        assert "X-Catalog-Degraded" not in client.get('/api/items').headers
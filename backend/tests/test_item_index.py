@@ -0,0 +1,69 @@
+import json
+from backend.item_catalog import ItemCatalog
+from backend.item_index import ItemIndex, item_class_for
+
+CATALOG = {"result": [
+    {"id": "weapon", "label": "Weapons", "entries": [
+        {"type": "Expert Hunter Bow"},
+        {"type": "Expert Bombard Crossbow"},
+        {"type": "Expert Dualstring Bow"},
+        {"type": "Expert Crackling Quarterstaff"},
+        {"type": "Expert Hunter Bow", "name": "Widowhail", "flags": {"unique": True}}
+    ]},
+    {"id": "accessory", "label": "Accessories", "entries": [{"type": "Gold Ring"}]}
+]}
+
+
+def test_item_class_rules():
+    assert item_class_for("Expert Bombard Crossbow") == "Crossbow"
+    assert item_class_for("Expert Talisman of the Wolf") == "Talisman"
+    assert item_class_for("Waystone (Tier 15)") == "Waystone"
+    assert item_class_for("Expert Hexer's Robe") is None
+
+
+def test_analysis_category_matches_legacy_grouping():
+    index = ItemIndex(CATALOG)
+    assert index.analysis_category("Expert Hunter Bow") == "Bow"
+    assert index.analysis_category("Expert Bombard Crossbow") == "Crossbow"
+    assert index.analysis_category("Expert Crackling Quarterstaff") == "Expert Crackling Quarterstaff"
+    assert index.analysis_category("Gold Ring") == "Gold Ring"
+    # Bases missing from the catalog still categorize by name
+    assert index.analysis_category("Attuned Wand") == "Wand"
+
+
+def test_search_prefix_on_any_word():
+    index = ItemIndex(CATALOG)
+    assert [i.name for i in index.search("expert h")] == ["Expert Hunter Bow"]
+    assert [i.name for i in index.search("hunt")] == ["Expert Hunter Bow"]
+    assert [i.name for i in index.search("bow")] == ["Expert Dualstring Bow", "Expert Hunter Bow"]
+    assert [i.name for i in index.search("widow")] == ["Widowhail"]
+    assert index.search("   ") == []
+
+
+def test_tree_groups_by_category_and_class():
+    index = ItemIndex(CATALOG)
+    weapons = next(c for c in index.tree if c["id"] == "weapon")
+    assert weapons["count"] == 5
+    classes = {c["name"]: c["items"] for c in weapons["classes"]}
+    assert classes["Crossbow"] == ["Expert Bombard Crossbow"]
+    assert "Widowhail" in classes["Bow"]
+
+
+def test_search_and_tree_endpoints(tmp_path, monkeypatch):
+    import backend.item_catalog as item_catalog
+    from backend.server import app
+
+    fixture = tmp_path / "items.json"
+    fixture.write_text(json.dumps(CATALOG))
+    monkeypatch.setattr(item_catalog, "_catalog", ItemCatalog(
+        cache_path=str(tmp_path / "catalog.json"), fixture_path=str(fixture), ttl=float("inf")
+    ))
+
+    with app.test_client() as client:
+        response = client.get('/api/items/search?q=cross')
+        assert response.json["data"][0]["item_class"] == "Crossbow"
+
+        response = client.get('/api/items/tree')
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+        assert client.get('/api/items/tree', headers={"If-None-Match": etag}).status_code == 304
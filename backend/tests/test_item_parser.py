@@ -0,0 +1,60 @@
+from backend.item_parser import parse_listing
+
+
+def _listing(explicit, explicit_texts=(), implicit=()):
+    return {
+        "id": "l1",
+        "listing": {"price": {"amount": 3, "currency": "divine"}},
+        "item": {
+            "rarity": "Magic",
+            "name": "",
+            "explicitMods": list(explicit_texts),
+            "extended": {"mods": {"explicit": explicit, "implicit": list(implicit)}}
+        }
+    }
+
+
+def test_one_parse_yields_price_tiers_and_t1_flag():
+    listing = parse_listing(_listing(
+        [{"name": "Fleet", "tier": "P1", "magnitudes": [{"min": 13, "max": 15}]},
+         {"name": "of Skill", "tier": "S1", "magnitudes": [{"min": 8, "max": 12}]}],
+        ["14% increased Movement Speed", "9% increased Attack Speed"],
+        implicit=[{"name": "", "tier": "", "magnitudes": [{"min": 3, "max": 3}]}]
+    ))
+    assert listing.price == (3, "divine")
+    assert listing.listing_id == "l1"
+    assert [tier for _, tier, _ in listing.mods] == ["P1", "S1", ""]
+    # A non-T1 implicit does not stop a magic item from counting as T1
+    assert listing.t1_magic is True and listing.rejected_tier is None
+    assert parse_listing(listing) is listing
+
+    mods = listing.t1_modifiers()
+    assert [(m.display_text, m.magnitudes) for m in mods] == [
+        ("14% increased Movement Speed", (13.0, 15.0)),
+        ("9% increased Attack Speed", (8.0, 12.0)),
+    ]
+    assert mods[0].item is listing.item
+
+
+def test_candidate_numbers_are_parsed_once_per_item():
+    listing = parse_listing(_listing(
+        [{"name": "Thirsty", "tier": "P1", "magnitudes": [{"min": -25, "max": -15}]},
+         {"name": "of Plenty", "tier": "S2", "magnitudes": [{"min": 1, "max": 2}]}],
+        ["20% reduced Charm Charges used", "No numbers here"]
+    ))
+    numbers = listing.candidate_numbers("explicit")
+    assert numbers == [("20% reduced Charm Charges used", [20.0])]
+    assert listing.candidate_numbers("explicit") is numbers
+    assert listing.candidate_numbers("fractured") == []
+
+    # "reduced" mods are negative in the data but positive in the text
+    assert [m.display_text for m in listing.t1_modifiers()] == ["20% reduced Charm Charges used"]
+    assert listing.t1_magic is False and listing.rejected_tier == "S2"
+
+
+def test_malformed_listings():
+    assert parse_listing(None) is None
+    unpriced = parse_listing({"id": "l2", "item": ["not", "a", "dict"]})
+    assert unpriced.price == (0.0, None)
+    assert unpriced.item_data is None and unpriced.mods == [] and unpriced.t1_magic is False
+    assert parse_listing({"item": {"extended": {"mods": []}}}).t1_modifiers() == []
@@ -0,0 +1,392 @@
+import mongomock
+import pytest
+from mongoengine import connect, disconnect
+
+import backend.jobs as jobs
+from backend.database import Job
+from backend.jobs import JobWorker, claim_next_job, enqueue_job, job_handler
+
+
+@pytest.fixture
+def db(monkeypatch):
+    disconnect()
+    connect('mongoenginetest', mongo_client_class=mongomock.MongoClient)
+    monkeypatch.setattr(jobs, 'JOB_MODE', 'worker')  # Enqueue only; tests drive the worker
+    Job.objects.delete()
+    yield
+    disconnect()
+
+
+@job_handler('test_steps')
+def _run_steps(job, worker):
+    for step in job.params['steps'][job.progress:]:
+        worker.checkpoint()
+        job.results.append({'step': step})
+        job.progress += 1
+        job.save()
+
+
+@job_handler('test_preemptible_steps')
+def _run_preemptible_steps(job, worker):
+    for step in job.params['steps'][job.progress:]:
+        worker.checkpoint(preemptible=True)
+        job.results.append({'step': step})
+        job.progress += 1
+        job.save()
+        if step == 1:
+            # Someone opens a base in the UI while the batch runs
+            enqueue_job('test_steps', {'steps': ['ui']}, priority='interactive')
+
+
+def test_claim_is_fifo_and_exclusive(db):
+    first = enqueue_job('test_steps', {'steps': [1]})
+    second = enqueue_job('test_steps', {'steps': [2]})
+
+    claimed = claim_next_job()
+    assert claimed.id == first.id and claimed.status == 'processing'
+    assert claim_next_job().id == second.id
+    assert claim_next_job() is None
+
+
+def test_run_job_completes(db):
+    enqueue_job('test_steps', {'steps': [1, 2, 3]}, total=3)
+    worker = JobWorker(workers=1)
+    worker.run_job(claim_next_job())
+
+    job = Job.objects.first()
+    assert job.status == 'completed'
+    assert job.finished_at is not None
+    assert [r['step'] for r in job.results] == [1, 2, 3]
+    assert 'params' not in job.to_dict()
+    assert job.to_dict()['request_stats']['requests'] == 0
+
+
+def test_interrupted_job_is_requeued_and_resumes(db):
+    enqueue_job('test_steps', {'steps': [1, 2, 3]}, total=3)
+    worker = JobWorker(workers=1)
+
+    calls = []
+
+    def checkpoint():
+        calls.append(1)
+        if len(calls) == 2:
+            raise jobs.JobInterrupted()
+
+    worker.checkpoint = checkpoint
+    worker.run_job(claim_next_job())
+    job = Job.objects.first()
+    assert job.status == 'queued'
+    assert job.progress == 1
+
+    JobWorker(workers=1).run_job(claim_next_job())
+    job.reload()
+    assert job.status == 'completed'
+    assert [r['step'] for r in job.results] == [1, 2, 3]
+
+
+def test_unknown_kind_rejected(db):
+    with pytest.raises(ValueError):
+        enqueue_job('nope')
+
+
+def test_batch_job_endpoint_enqueues(db, monkeypatch):
+    from backend.server import app
+    with app.test_client() as client:
+        response = client.post('/api/jobs/batch-analysis', json={'bases': ['Expert Hunter Bow']},
+                               headers={'X-POESESSID': 'abc'})
+        assert response.status_code == 200
+        job = Job.objects(id=response.get_json()['job_id']).first()
+        assert job.kind == 'batch_analysis'
+        assert job.status == 'queued'
+        assert job.params['bases'] == ['Expert Hunter Bow']
+
+
+def test_batch_price_returns_job_and_streams(db):
+    import json
+    from backend.server import app
+    from backend.jobs import stream_job_events
+
+    with app.test_client() as client:
+        response = client.post('/analyze/batch-price', json={'bases': ['A', 'B']}, headers={'X-POESESSID': 'abc'})
+        assert response.status_code == 202
+        job_id = response.get_json()['job_id']
+
+        # Simulate a worker finishing the job
+        job = Job.objects(id=job_id).first()
+        job.results = [{'base_type': 'A'}, {'base_type': 'B'}]
+        job.progress = 2
+        job.status = 'completed'
+        job.save()
+
+        response = client.get(f'/api/jobs/{job_id}/stream')
+        assert response.mimetype == 'application/x-ndjson'
+        events = [json.loads(line) for line in response.data.decode().splitlines()]
+
+    assert [e['result']['base_type'] for e in events if e['event'] == 'result'] == ['A', 'B']
+    assert events[-1] == {'job_id': job_id, 'event': 'end', 'status': 'completed', 'error': None}
+    assert list(stream_job_events('0' * 24))[-1]['status'] == 'missing'
+
+
+def test_query_analysis_walks_prices_past_the_page_cap(db, monkeypatch):
+    import re
+    import requests_mock
+    from backend.trade_api import TradeAPI
+
+    monkeypatch.setattr(jobs, 'QUERY_FETCH_DELAY_SECONDS', 0)
+    monkeypatch.setattr(jobs, 'QUERY_PARTIAL_EVERY', 10)
+    listings = {f"id{i}": i + 1 for i in range(25)}  # listing id -> price in exalted
+
+    def search(request, context):
+        price = request.json()['query'].get('filters', {}).get('trade_filters', {}) \
+            .get('filters', {}).get('price', {})
+        matching = [k for k, v in listings.items() if v >= price.get('min', 0)]
+        return {'id': 'q1', 'result': matching[:10], 'total': len(matching)}  # Page cap of 10
+
+    def fetch(request, context):
+        ids = request.path.rsplit('/', 1)[-1].split(',')
+        return {'result': [{
+            'id': i,
+            'listing': {'price': {'amount': listings[i], 'currency': 'exalted'}},
+            'item': {'baseType': 'Expert Hunter Bow', 'explicitMods': [f'+{listings[i]} to Dexterity']}
+        } for i in ids]}
+
+    enqueue_job('query_analysis', {'query': {'status': {'option': 'online'}}, 'limit': 25})
+    with requests_mock.Mocker() as m:
+        m.post(re.compile(re.escape(TradeAPI.SEARCH_URL_BASE)), json=search)
+        m.get(re.compile(re.escape(TradeAPI.FETCH_URL_BASE)), json=fetch)
+        JobWorker(workers=1).run_job(claim_next_job())
+
+    job = Job.objects.first()
+    assert job.status == 'completed', job.error
+    assert job.progress == 25
+    assert job.partial_seq >= 2
+    bow = job.results[0]['Bow']
+    assert bow['total_items'] == 25
+    assert bow['stats'][0]['values'][0] == {'min': 1.0, 'max': 25.0, 'avg': 13.0}
+
+
+def test_expired_lease_is_reclaimed_and_resumes(db):
+    from datetime import datetime, timedelta
+    from mongoengine.errors import SaveConditionError
+
+    enqueue_job('test_steps', {'steps': [1, 2, 3]}, total=3)
+    crashed = claim_next_job('worker-a')
+    crashed.results.append({'step': 1})
+    crashed.progress = 1
+    crashed.save()
+
+    # Lease still valid: nobody else can take the job
+    assert claim_next_job('worker-b') is None
+
+    # worker-a dies; its lease runs out
+    Job.objects(id=crashed.id).update(set__lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+    recovered = claim_next_job('worker-b')
+    assert recovered.id == crashed.id
+    assert recovered.attempts == 2
+
+    # The stale worker can no longer write to the job
+    crashed.progress = 3
+    with pytest.raises(SaveConditionError):
+        crashed.save()
+
+    JobWorker(workers=1).run_job(recovered)
+    job = Job.objects.first()
+    assert job.status == 'completed'
+    assert [r['step'] for r in job.results] == [1, 2, 3]
+    assert job.worker_id == 'worker-b'
+
+
+def test_jobs_exhausting_attempts_are_failed(db, monkeypatch):
+    from datetime import datetime, timedelta
+
+    monkeypatch.setattr(jobs, 'JOB_MAX_ATTEMPTS', 1)
+    enqueue_job('test_steps', {'steps': [1]})
+    job = claim_next_job('worker-a')
+    Job.objects(id=job.id).update(set__lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+
+    assert claim_next_job('worker-b') is None
+    assert jobs.fail_exhausted_jobs() == 1
+    assert Job.objects.first().status == 'failed'
+    assert jobs.queue_stats()['failed'] == 1
+
+
+def test_queue_endpoint(db):
+    from backend.server import app
+    enqueue_job('test_steps', {'steps': [1]})
+    claim_next_job('worker-a')
+    enqueue_job('test_steps', {'steps': [2]})
+    with app.test_client() as client:
+        data = client.get('/api/jobs/queue').get_json()['data']
+    assert data['queued'] == 1 and data['processing'] == 1
+    assert data['queued_by_priority'] == {'interactive': 0, 'batch': 1, 'background': 0}
+    assert data['active_workers'] == ['worker-a']
+
+
+def test_claim_prefers_more_urgent_priority(db):
+    background = enqueue_job('test_steps', {'steps': [1]}, priority='background')
+    batch = enqueue_job('test_steps', {'steps': [2]})
+    interactive = enqueue_job('test_steps', {'steps': [3]}, priority='interactive')
+
+    assert [claim_next_job().id for _ in range(3)] == [interactive.id, batch.id, background.id]
+    assert interactive.to_dict()['priority'] == 'interactive'
+    with pytest.raises(ValueError):
+        enqueue_job('test_steps', priority='urgent')
+
+
+def test_batch_job_yields_to_interactive_between_units(db, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_PREEMPT_GRACE_SECONDS', 0)
+    batch = enqueue_job('test_preemptible_steps', {'steps': [1, 2, 3]}, total=3)
+    worker = JobWorker(workers=1)
+
+    worker.run_job(claim_next_job())
+    batch.reload()
+    assert batch.status == 'queued' and batch.progress == 1
+    assert batch.attempts == 0
+
+    ui = claim_next_job()
+    assert ui.priority_class == 'interactive'
+    worker.run_job(ui)
+
+    worker.run_job(claim_next_job())
+    batch.reload()
+    assert batch.status == 'completed'
+    assert [r['step'] for r in batch.results] == [1, 2, 3]
+
+
+def test_job_status_etag_covers_every_returned_field(db):
+    from datetime import datetime
+    from backend.server import app
+    job = enqueue_job('test_steps', {'steps': [1, 2]})
+    with app.test_client() as client:
+        etag = client.get(f'/api/jobs/{job.id}').headers['ETag']
+        assert client.get(f'/api/jobs/{job.id}', headers={'If-None-Match': etag}).status_code == 304
+
+        # Same progress, but a new current item, partial aggregate and heartbeat
+        Job.objects(id=job.id).update(set__current_item='Gemini Bow', set__partial={'count': 3},
+                                      inc__partial_seq=1, set__heartbeat_at=datetime.utcnow())
+        response = client.get(f'/api/jobs/{job.id}', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.get_json()['current_item'] == 'Gemini Bow'
+
+
+def test_query_analysis_walk_neither_skips_nor_stalls_on_ties(db, monkeypatch):
+    import re
+    import requests_mock
+    from backend.trade_api import TradeAPI
+
+    monkeypatch.setattr(jobs, 'QUERY_FETCH_DELAY_SECONDS', 0)
+    # Rounding 1.006 up to 1.01 used to skip 'b'; the three listings at 2.0 fill a page on their own
+    listings = {'a': 1.0, 'b': 1.007, 'c': 1.006, 'd': 1.2, 't0': 2.0, 't1': 2.0, 't2': 2.0, 'e': 3.0}
+
+    def search(request, context):
+        price = request.json()['query'].get('filters', {}).get('trade_filters', {}) \
+            .get('filters', {}).get('price', {})
+        matching = sorted((k for k, v in listings.items() if v >= price.get('min', 0)), key=listings.get)
+        return {'id': 'q1', 'result': matching[:3], 'total': len(matching)}  # Page cap of 3
+
+    def fetch(request, context):
+        ids = request.path.rsplit('/', 1)[-1].split(',')
+        return {'result': [{
+            'id': i,
+            'listing': {'price': {'amount': listings[i], 'currency': 'exalted'}},
+            'item': {'baseType': 'Expert Hunter Bow', 'explicitMods': ['+5 to Dexterity']}
+        } for i in ids]}
+
+    enqueue_job('query_analysis', {'query': {'status': {'option': 'online'}}, 'limit': 50})
+    with requests_mock.Mocker() as m:
+        m.post(re.compile(re.escape(TradeAPI.SEARCH_URL_BASE)), json=search)
+        m.get(re.compile(re.escape(TradeAPI.FETCH_URL_BASE)), json=fetch)
+        JobWorker(workers=1).run_job(claim_next_job())
+        fetched = {i for r in m.request_history if r.url.startswith(TradeAPI.FETCH_URL_BASE)
+                   for i in r.path.rsplit('/', 1)[-1].split(',')}
+
+    job = Job.objects.first()
+    assert job.status == 'completed', job.error
+    assert fetched == set(listings)
+    assert job.progress == len(listings)
+
+
+def test_batch_analysis_applies_stored_exclusions(db, monkeypatch):
+    from unittest.mock import MagicMock
+    import backend.price_analyzer as price_analyzer
+
+    api = MagicMock()
+    api.search.return_value = {'id': 'q1', 'result': [f'l{i}' for i in range(5)]}
+    api.fetch.return_value = {'result': [{
+        'id': f'l{i}',
+        'listing': {'price': {'amount': 4, 'currency': 'exalted'}},
+        'item': {'rarity': 'Normal', 'baseType': 'Gemini Bow', 'extended': {'mods': {'explicit': [
+            {'name': 'Fleet', 'tier': 'P1', 'magnitudes': [{'min': 10, 'max': 15}]},
+            {'name': 'of Skill', 'tier': 'S1', 'magnitudes': [{'min': 8, 'max': 12}]}
+        ]}}}
+    } for i in range(5)]}
+    monkeypatch.setattr(price_analyzer, 'TradeAPI', lambda *args, **kwargs: api)
+    monkeypatch.setattr(price_analyzer, 'pause', lambda seconds: None)
+
+    # Routes store exclusions as dicts in the job params
+    exclusion = {'id': 'e1', 'mod_name_pattern': 'Fleet', 'mod_tier': None, 'mod_type': None,
+                 'reason': None, 'is_active': True}
+    enqueue_job('batch_analysis', {'bases': ['Gemini Bow'], 'exclusions': [exclusion]}, total=1)
+    JobWorker(workers=1).run_job(claim_next_job())
+
+    job = Job.objects.first()
+    assert job.status == 'completed', job.error
+    result = job.results[0]
+    assert 'error' not in result, result
+    assert result['normal_avg_ex'] > 0
+    assert 'Fleet' not in [m['name'] for m in result['modifiers']]
+
+
+def test_query_analysis_walk_keeps_user_price_filter_and_listing_currency(db, monkeypatch):
+    import re
+    import requests_mock
+    from backend.trade_api import TradeAPI
+
+    monkeypatch.setattr(jobs, 'QUERY_FETCH_DELAY_SECONDS', 0)
+    site_rates = {'exalted': 1.0, 'divine': 100.0}  # What the trade site converts and sorts with
+    listings = {f'x{i}': (i + 1, 'exalted') for i in range(10)}
+    listings.update({f'd{i}': (i + 1, 'divine') for i in range(4)})
+    searches = []
+
+    def value(amount, currency):
+        return amount * site_rates[currency]
+
+    def search(request, context):
+        price = request.json()['query'].get('filters', {}).get('trade_filters', {}) \
+            .get('filters', {}).get('price', {})
+        searches.append(dict(price))
+        unit = site_rates[price.get('option', 'exalted')]
+        low, high = price.get('min', 0) * unit, price.get('max', float('inf')) * unit
+        matching = sorted((k for k, v in listings.items() if low <= value(*v) <= high), key=lambda k: value(*listings[k]))
+        return {'id': 'q1', 'result': matching[:3], 'total': len(matching)}  # Page cap of 3
+
+    def fetch(request, context):
+        ids = request.path.rsplit('/', 1)[-1].split(',')
+        return {'result': [{
+            'id': i,
+            'listing': {'price': {'amount': listings[i][0], 'currency': listings[i][1]}},
+            'item': {'baseType': 'Expert Hunter Bow', 'explicitMods': ['+5 to Dexterity']}
+        } for i in ids]}
+
+    def run(query):
+        searches.clear()
+        Job.objects.delete()
+        enqueue_job('query_analysis', {'query': query, 'limit': 50})
+        with requests_mock.Mocker() as m:
+            m.post(re.compile(re.escape(TradeAPI.SEARCH_URL_BASE)), json=search)
+            m.get(re.compile(re.escape(TradeAPI.FETCH_URL_BASE)), json=fetch)
+            JobWorker(workers=1).run_job(claim_next_job())
+        job = Job.objects.first()
+        assert job.status == 'completed', job.error
+        return job
+
+    # The user's ceiling and currency survive every page, and the walk stops past the ceiling
+    price = {'option': 'exalted', 'max': 6}
+    job = run({'filters': {'trade_filters': {'filters': {'price': price}}}})
+    assert job.progress == 6
+    assert all(s.get('max') == 6 and s.get('option') == 'exalted' for s in searches)
+
+    # Without a user filter the next min is the last listing's price in its own currency
+    job = run({'status': {'option': 'online'}})
+    assert job.progress == len(listings)
+    assert {'min': 1.0, 'option': 'divine'} in searches
@@ -0,0 +1,120 @@
+import pytest
+import mongomock
+from datetime import datetime, timedelta
+from mongoengine import connect, disconnect
+from backend.database import AnalysisResult, ItemAnalysis, Bucket, Job, Modifier, SearchHistory
+from backend.maintenance import run_maintenance, compact_analyses
+
+
+@pytest.fixture
+def db():
+    disconnect()
+    connect('mongoenginetest', mongo_client_class=mongomock.MongoClient)
+    AnalysisResult.objects.delete()
+    ItemAnalysis.objects.delete()
+    Job.objects.delete()
+    SearchHistory.objects.delete()
+    yield
+    disconnect()
+
+
+def make_analysis(base_type, created_at, magic_avg):
+    analysis = AnalysisResult(
+        base_type=base_type,
+        created_at=created_at,
+        normal_avg_ex=1.0,
+        magic_avg_ex=magic_avg,
+        gap_ex=magic_avg - 1.0,
+        raw_data="x" * 500,
+        modifiers=[Modifier(name="Mod", tier="P1", mod_type="explicit", rarity="magic")]
+    )
+    analysis.save()
+    return analysis
+
+
+def test_compact_analyses_rolls_up_per_day(db):
+    now = datetime(2024, 6, 1, 12, 0)
+    old_day = now - timedelta(days=40)
+    make_analysis("Bow", old_day, 10.0)
+    make_analysis("Bow", old_day + timedelta(hours=2), 20.0)
+    make_analysis("Bow", old_day + timedelta(days=1), 30.0)
+    recent = make_analysis("Bow", now - timedelta(days=1), 50.0)
+
+    report = compact_analyses(now, retention_days=30)
+
+    assert report['groups'] == 2
+    assert report['deleted'] == 1
+    assert report['bytes_reclaimed'] > 0
+
+    docs = list(AnalysisResult.objects.order_by('created_at'))
+    assert len(docs) == 3
+    assert docs[0].compacted is True
+    assert docs[0].sample_count == 2
+    assert docs[0].magic_avg_ex == 15.0
+    assert docs[0].modifiers == []
+    assert docs[0].raw_data is None
+
+    # Recent analyses keep their raw data
+    fresh = AnalysisResult.objects(id=recent.id).first()
+    assert fresh.compacted is False
+    assert len(fresh.modifiers) == 1
+
+
+def test_run_maintenance_expires_finished_jobs(db):
+    now = datetime.utcnow()
+    Job(status='completed', finished_at=now - timedelta(days=30)).save()
+    Job(status='processing', created_at=now - timedelta(days=30)).save()
+    Job(status='completed', finished_at=now).save()
+
+    ItemAnalysis(
+        base_type="Bow",
+        created_at=now - timedelta(days=60),
+        buckets=[Bucket(price_range="1 - 10", min_price=1, max_price=10, count=3, avg_price=5,
+                        attributes={"+10 to Life": 3})]
+    ).save()
+
+    report = run_maintenance(now)
+
+    # Expired either by the TTL index or by the sweep; unfinished jobs are kept
+    assert Job.objects.count() == 2
+    assert Job.objects(status='processing').count() == 1
+    assert report['item_analyses']['compacted'] == 1
+    assert ItemAnalysis.objects.first().buckets[0].attributes == {}
+    assert report['bytes_reclaimed'] > 0
+
+
+def test_compaction_keeps_leagues_and_exclusion_sets_apart(db):
+    now = datetime(2024, 6, 1, 12, 0)
+    day = now - timedelta(days=40)
+    for hours, league, key, magic in ((1, "Standard", "k1", 10.0), (2, "Standard", "k1", 20.0),
+                                      (3, "Standard", "k2", 100.0), (4, "Hardcore", "k1", 300.0)):
+        AnalysisResult(base_type="Bow", created_at=day + timedelta(hours=hours), league=league, analysis_key=key,
+                       normal_avg_ex=1.0, magic_avg_ex=magic, gap_ex=magic - 1.0,
+                       request_stats={'requests': 3, 'searches': 1, 'wait_seconds': 0.25}).save()
+
+    report = compact_analyses(now, retention_days=30)
+    assert report['groups'] == 3 and report['deleted'] == 1
+
+    rollups = {(d.league, d.analysis_key): d for d in AnalysisResult.objects}
+    assert set(rollups) == {("Standard", "k1"), ("Standard", "k2"), ("Hardcore", "k1")}
+    merged = rollups[("Standard", "k1")]
+    assert merged.magic_avg_ex == 15.0 and merged.sample_count == 2
+    # The deleted run's trade requests still count
+    assert merged.request_stats == {'requests': 6, 'searches': 2, 'wait_seconds': 0.5}
+    assert rollups[("Hardcore", "k1")].magic_avg_ex == 300.0
+
+
+def test_exclusive_task_runs_in_one_process(db):
+    from backend.database import TaskLease
+    from backend.periodic import PeriodicTask
+
+    TaskLease.objects.delete()
+    first = PeriodicTask('maintenance', 60, lambda: None, exclusive=True)
+    second = PeriodicTask('maintenance', 60, lambda: None, exclusive=True)
+    assert first.holds_lease() and first.holds_lease()
+    assert not second.holds_lease()
+
+    # The holder died: once its lease runs out another process takes over
+    TaskLease.objects(name='maintenance').update(set__expires_at=datetime.utcnow() - timedelta(seconds=1))
+    assert second.holds_lease() and not first.holds_lease()
+    assert PeriodicTask('adhoc', 60, lambda: None).holds_lease()
@@ -0,0 +1,100 @@
+import re
+
+import mongomock
+import pytest
+import requests_mock
+from mongoengine import connect, disconnect
+
+from backend import metrics
+from backend.server import app
+from backend.trade_api import TradeAPI
+
+
+@pytest.fixture
+def client():
+    disconnect()
+    connect('mongoenginetest', mongo_client_class=mongomock.MongoClient)
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+    disconnect()
+
+
+def _sample(text, name, **labels):
+    wanted = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    pattern = rf'^{re.escape(name)}{{{re.escape(wanted)}}} (\S+)$' if labels else rf'^{re.escape(name)} (\S+)$'
+    match = re.search(pattern, text, re.M)
+    return float(match.group(1)) if match else None
+
+
+def test_histogram_exposition():
+    h = metrics.Histogram("demo_seconds", "Demo", ("route",), buckets=(0.1, 1.0))
+    h.observe(0.05, route="/a")
+    h.observe(0.5, route="/a")
+    h.observe(5, route="/a")
+    text = "\n".join(h.render())
+    assert _sample(text, "demo_seconds_bucket", route="/a", le="0.1") == 1
+    assert _sample(text, "demo_seconds_bucket", route="/a", le="1") == 2
+    assert _sample(text, "demo_seconds_bucket", route="/a", le="+Inf") == 3
+    assert _sample(text, "demo_seconds_count", route="/a") == 3
+    assert _sample(text, "demo_seconds_sum", route="/a") == pytest.approx(5.55)
+
+
+def test_metrics_endpoint_reports_routes_trade_calls_and_queue(client, monkeypatch):
+    monkeypatch.setattr("time.sleep", lambda s: None)
+    client.get('/api/db/exclusions')
+
+    with requests_mock.Mocker() as m:
+        m.post(re.compile(re.escape(TradeAPI.SEARCH_URL_BASE)), [
+            {"status_code": 429, "headers": {"Retry-After": "0"}},
+            {"json": {"id": "q", "result": [], "total": 0}},
+        ])
+        TradeAPI().search({"type": "Gemini Bow"})
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+
+    assert _sample(text, "http_request_duration_seconds_count",
+                   method="GET", route="/api/db/exclusions", status="200") >= 1
+    assert _sample(text, "trade_api_requests_total", endpoint="search", status="429") >= 1
+    assert _sample(text, "trade_api_requests_total", endpoint="search", status="200") >= 1
+    assert _sample(text, "trade_rate_limiter_wait_seconds_count", priority="interactive") >= 2
+    assert _sample(text, "job_queue_depth", priority="interactive") == 0
+    assert _sample(text, "job_worker_utilization") is not None
+
+
+def test_multiprocess_dir_sums_processes(tmp_path):
+    import json
+    import os
+
+    registry = metrics.Registry()
+    counter = registry.register(metrics.Counter("demo_total", "Demo", ("route",)))
+    histogram = registry.register(metrics.Histogram("demo_seconds", "Demo", ("route",), buckets=(0.1, 1.0)))
+    registry.register_collector(lambda: [("demo_threads", "gauge", "Threads", [({}, 2)]),
+                                         ("demo_checkouts_total", "counter", "Checkouts", [({}, 5)])],
+                                per_process=True)
+    counter.inc(3, route="/a")
+    histogram.observe(0.05, route="/a")
+
+    # Another live worker (our parent stands in for it) and one that has exited
+    other = {"metrics": {"demo_total": [[["/a"], 4.0]], "demo_seconds": [[["/a"], [[0, 1], 0.5, 1]]]},
+             "families": [["demo_threads", "gauge", "Threads", [[{}, 8]]],
+                          ["demo_checkouts_total", "counter", "Checkouts", [[{}, 1]]]]}
+    dead_pid = 2 ** 22 + 1
+    assert not metrics._pid_alive(dead_pid)
+    (tmp_path / f"metrics-{os.getppid()}.json").write_text(json.dumps(other))
+    (tmp_path / f"metrics-{dead_pid}.json").write_text(json.dumps(other))
+
+    text = registry.render(str(tmp_path))
+    assert (tmp_path / f"metrics-{os.getpid()}.json").exists()
+    assert _sample(text, "demo_total", route="/a") == 11
+    assert _sample(text, "demo_seconds_count", route="/a") == 3
+    assert _sample(text, "demo_seconds_bucket", route="/a", le="0.1") == 1
+    assert _sample(text, "demo_seconds_sum", route="/a") == pytest.approx(1.05)
+    # Counters of the exited worker still count; its gauges are gone
+    assert _sample(text, "demo_checkouts_total") == 7
+    assert _sample(text, "demo_threads", pid=os.getpid()) == 2
+    assert _sample(text, "demo_threads", pid=os.getppid()) == 8
+    assert _sample(text, "demo_threads", pid=dead_pid) is None
@@ -1,4 +1,5 @@
 import pytest
+import numpy as np
 from unittest.mock import MagicMock, patch
 from backend.price_analyzer import PriceAnalyzer
 
@@ -7,6 +8,10 @@ def mock_currency_service():
     service = MagicMock()
     # Mock normalize_to_exalted: 1 unit of any currency = 0.1 exalts for simplicity in tests
     service.normalize_to_exalted.side_effect = lambda amount, currency: amount * 0.1 if currency == "divine" else float(amount) * 0.00556  # chaos converted
+    # Batch path: same conversion, unpriced listings (currency None) normalize to 0
+    service.normalize_batch.side_effect = lambda amounts, currencies: np.array([
+        service.normalize_to_exalted(a, c) if c else 0.0 for a, c in zip(amounts, currencies)
+    ])
     return service
 
 @patch("backend.price_analyzer.TradeAPI")
@@ -0,0 +1,102 @@
+import time
+
+import mongomock
+import pytest
+from mongoengine import connect, disconnect
+
+import backend.jobs as jobs
+import backend.profiling as profiling
+from backend.database import Job, Profile
+from backend.jobs import JobWorker, claim_next_job, enqueue_job, job_handler
+from backend.profiling import profile_mode
+from backend.server import app
+
+
+@pytest.fixture
+def client(monkeypatch):
+    disconnect()
+    connect('mongoenginetest', mongo_client_class=mongomock.MongoClient)
+    monkeypatch.setattr(jobs, 'JOB_MODE', 'worker')
+    monkeypatch.setattr(profiling, 'PROFILING_ENABLED', True)
+    Job.objects.delete()
+    Profile.objects.delete()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+    disconnect()
+
+
+def _busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+@job_handler('test_profiled')
+def _run_profiled(job, worker):
+    _busy_wait(0.1)
+
+
+def test_profile_mode_flags():
+    assert profile_mode(None) is None and profile_mode('0') is None
+    assert profile_mode('1') == 'sample' and profile_mode(True) == 'sample'
+    assert profile_mode('cProfile') == 'cprofile'
+    with pytest.raises(ValueError):
+        profile_mode('perf')
+
+
+def test_profiled_job_stores_folded_stacks(client):
+    job = enqueue_job('test_profiled', {'profile': 'sample'})
+    JobWorker(workers=1).run_job(claim_next_job())
+
+    listing = client.get(f'/api/jobs/{job.id}/profiles').get_json()['data']
+    assert len(listing) == 1 and listing[0]['format'] == 'collapsed' and listing[0]['samples'] > 0
+
+    folded = client.get(f"/api/profiles/{listing[0]['id']}")
+    assert folded.mimetype == 'text/plain'
+    assert '_busy_wait (test_profiling.py' in folded.get_data(as_text=True)
+
+
+def test_unprofiled_job_and_request_store_nothing(client):
+    enqueue_job('test_profiled', {})
+    JobWorker(workers=1).run_job(claim_next_job())
+    assert client.get('/api/db/exclusions').headers.get('X-Profile-Id') is None
+    assert Profile.objects.count() == 0
+
+
+def test_profiled_request_returns_profile_id(client):
+    response = client.get('/api/db/exclusions', headers={'X-Profile': 'cprofile'})
+    profile_id = response.headers['X-Profile-Id']
+
+    profile = client.get(f'/api/profiles/{profile_id}?format=json').get_json()['data']
+    assert profile['kind'] == 'request' and profile['target'] == 'GET /api/db/exclusions'
+    assert profile['format'] == 'pstats' and 'cumulative' in profile['data']
+
+
+def test_job_endpoint_rejects_unknown_profile_mode(client):
+    response = client.post('/api/analyze/distribution', json={'base_type': 'Gemini Bow', 'profile': 'perf'},
+                           headers={'X-POESESSID': 'x'})
+    assert response.status_code == 400
+
+
+def test_profiling_is_off_by_default_and_token_gated(client, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILING_ENABLED', False)
+    assert client.get('/api/db/exclusions', headers={'X-Profile': 'cprofile'}).headers.get('X-Profile-Id') is None
+
+    monkeypatch.setattr(profiling, 'PROFILING_ENABLED', True)
+    monkeypatch.setattr(profiling, 'PROFILE_TOKEN', 's3cret')
+    for headers in ({'X-Profile': 'cprofile'}, {'X-Profile': 'cprofile', 'X-Profile-Token': 'guess'}):
+        assert client.get('/api/db/exclusions', headers=headers).headers.get('X-Profile-Id') is None
+    assert Profile.objects.count() == 0
+
+    response = client.get('/api/db/exclusions', headers={'X-Profile': 'cprofile', 'X-Profile-Token': 's3cret'})
+    profile_id = response.headers['X-Profile-Id']
+
+    # Stored profiles are only readable with the token as well
+    assert client.get(f'/api/profiles/{profile_id}').status_code == 403
+    assert client.get('/api/jobs/0123456789abcdef01234567/profiles').status_code == 403
+    authorized = client.get(f'/api/profiles/{profile_id}', headers={'X-Profile-Token': 's3cret'})
+    assert authorized.status_code == 200 and 'cumulative' in authorized.get_data(as_text=True)
+
+    monkeypatch.setattr(profiling, 'PROFILING_ENABLED', False)
+    assert client.get(f'/api/profiles/{profile_id}', headers={'X-Profile-Token': 's3cret'}).status_code == 403
@@ -0,0 +1,38 @@
+from backend.item_index import ItemIndex
+from backend.query_analysis import ItemStatsAccumulator
+
+
+def _item(base, mods, runes=()):
+    return {"item": {
+        "baseType": base,
+        "explicitMods": mods,
+        "runeMods": list(runes),
+        "extended": {"mods": {"explicit": [
+            {"tier": "P1", "magnitudes": [{"min": 1, "max": 50}]},
+            {"tier": "S2", "magnitudes": [{"min": 60, "max": 90}]}
+        ]}}
+    }}
+
+
+def test_incremental_matches_one_shot():
+    items = [
+        _item("Expert Hunter Bow", ["+10 to [Dexterity|Dexterity]", "75% increased Attack Speed"], ["Bonded: +5 to x"]),
+        _item("Expert Dualstring Bow", ["+40 to Dexterity"]),
+        _item("Gold Ring", ["+20 to Dexterity", "+20 to Dexterity"]),
+    ]
+    one_shot = ItemStatsAccumulator(ItemIndex(None))
+    one_shot.add(items)
+    incremental = ItemStatsAccumulator(ItemIndex(None))
+    for item in items:
+        incremental.add([item])
+    assert incremental.result() == one_shot.result()
+
+    result = one_shot.result()
+    bow = {(s["name"], s["type"]): s for s in result["Bow"]["stats"]}
+    assert result["Bow"]["total_items"] == 2
+    assert bow[("# to Dexterity", "prefix")]["values"] == [{"min": 10.0, "max": 40.0, "avg": 25.0}]
+    assert bow[("# to Dexterity", "prefix")]["percentage"] == 100.0
+    assert ("#% increased Attack Speed", "suffix") in bow
+    assert ("Bonded: # to x", "bonded") in bow
+    # Duplicate mods count once per item
+    assert result["Gold Ring"]["stats"][0]["count"] == 1
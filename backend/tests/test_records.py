@@ -0,0 +1,49 @@
+from backend.currency_service import CurrencyService
+from backend.price_analyzer import PriceAnalyzer
+from backend.records import ItemRecord, ModRecord, dedupe_mods
+
+
+def _listing():
+    return {
+        "id": "l1",
+        "item": {
+            "rarity": "Magic",
+            "name": "Storm " + "Song",  # Built at runtime, so only interning makes it shared
+            "ilvl": 82,
+            "extended": {"mods": {"explicit": [
+                {"name": "Fleet", "tier": "P1", "magnitudes": [{"min": 10, "max": 15}]},
+                {"name": "of Skill", "tier": "S1", "magnitudes": [{"min": 8, "max": 12}]}
+            ]}},
+            "explicitMods": ["12% increased Movement Speed", "10% increased Attack Speed"]
+        }
+    }
+
+
+def test_modifiers_share_one_interned_item_record():
+    mods = PriceAnalyzer(currency_service=CurrencyService())._extract_modifiers(_listing())
+    assert len(mods) == 2
+    assert mods[0].item is mods[1].item
+    assert not hasattr(mods[0], '__dict__')
+    assert mods[0].item_name is PriceAnalyzer(currency_service=CurrencyService())._extract_modifiers(_listing())[0].item_name
+
+    assert mods[0].to_dict() == {
+        "name": "Fleet", "tier": "P1", "mod_type": "explicit", "rarity": "Magic", "item_name": "Storm Song",
+        "display_text": "12% increased Movement Speed", "magnitude_min": 10.0, "magnitude_max": 15.0
+    }
+
+
+def test_properties_without_magnitudes_keep_their_dict_shape():
+    mods = PriceAnalyzer(currency_service=CurrencyService())._extract_all_modifiers(_listing())
+    level = next(m for m in mods if m.name == "Item Level")
+    assert level.to_dict() == {
+        "name": "Item Level", "tier": "", "mod_type": "property", "rarity": "Magic",
+        "item_name": "Storm Song", "display_text": "82"
+    }
+
+
+def test_dedupe_keeps_first_position_and_longest_text():
+    item = ItemRecord("Magic", "")
+    short = ModRecord("Fleet", "P1", "explicit", item, "10 to 15")
+    other = ModRecord("of Skill", "S1", "explicit", item, "8 to 12")
+    longer = ModRecord("Fleet", "P1", "explicit", item, "12% increased Movement Speed")
+    assert dedupe_mods([short, other, longer]) == [longer, other]
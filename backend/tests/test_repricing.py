@@ -0,0 +1,119 @@
+import pytest
+import mongomock
+from datetime import datetime, timedelta
+from mongoengine import connect, disconnect
+from backend.database import AnalysisResult, CurrencyRateSnapshot, ModifierObservation, PriceSample
+from backend.repricing import reprice_history, RateHistory
+
+
+@pytest.fixture
+def db():
+    disconnect()
+    connect('mongoenginetest', mongo_client_class=mongomock.MongoClient)
+    AnalysisResult.objects.delete()
+    CurrencyRateSnapshot.objects.delete()
+    ModifierObservation.objects.delete()
+    yield
+    disconnect()
+
+
+def test_rate_history_picks_snapshot_in_effect(db):
+    t0 = datetime(2024, 1, 1)
+    CurrencyRateSnapshot(rates={"exalted": 1.0, "divine": 100.0}, created_at=t0).save()
+    CurrencyRateSnapshot(rates={"exalted": 1.0, "divine": 200.0}, created_at=t0 + timedelta(days=10)).save()
+
+    history = RateHistory.load()
+    values = history.normalize(
+        [1, 1, 1, 2],
+        ["divine", "divine", "divine", "exalted"],
+        [t0 - timedelta(days=1), t0 + timedelta(days=1), t0 + timedelta(days=11), t0]
+    )
+    # Before the first snapshot the defaults apply
+    assert values.tolist() == [320.0, 100.0, 200.0, 2.0]
+
+
+def test_reprice_history_updates_averages_and_observations(db):
+    t0 = datetime(2024, 1, 1)
+    CurrencyRateSnapshot(rates={"exalted": 1.0, "divine": 100.0, "chaos": 10.0}, created_at=t0).save()
+
+    analysis = AnalysisResult(
+        base_type="Bow",
+        created_at=t0 + timedelta(hours=1),
+        normal_avg_ex=1.0,
+        crafting_avg_ex=2.0,
+        magic_avg_ex=320.0,
+        gap_ex=318.0,
+        price_samples=[
+            PriceSample(kind="crafting", amount=1, currency="chaos"),
+            PriceSample(kind="crafting", amount=3, currency="chaos"),
+            PriceSample(kind="magic", amount=1, currency="divine"),
+        ]
+    )
+    analysis.save()
+    legacy = AnalysisResult(base_type="Bow", normal_avg_ex=1.0, magic_avg_ex=2.0, gap_ex=1.0)
+    legacy.save()
+    ModifierObservation(base_type="Bow", name="Life", price_ex=320.0, price_amount=1,
+                        price_currency="divine", ts=t0 + timedelta(hours=1)).save()
+
+    report = reprice_history(dry_run=True)
+    assert report['analyses_updated'] == 1
+    assert AnalysisResult.objects(id=analysis.id).first().magic_avg_ex == 320.0
+
+    report = reprice_history()
+    assert report['analyses_scanned'] == 1
+    assert report['observations_updated'] == 1
+
+    updated = AnalysisResult.objects(id=analysis.id).first()
+    assert updated.magic_avg_ex == 100.0
+    assert updated.crafting_avg_ex == 20.0
+    assert updated.normal_avg_ex == 1.0  # No samples: left as stored
+    assert updated.gap_ex == 80.0
+    assert updated.repriced_at is not None
+    assert ModifierObservation.objects.first().price_ex == 100.0
+
+
+def test_reprice_keeps_averages_without_valid_samples(db):
+    t0 = datetime(2024, 1, 1)
+    CurrencyRateSnapshot(rates={"exalted": 1.0, "divine": 100.0}, created_at=t0).save()
+
+    analysis = AnalysisResult(
+        base_type="Bow", created_at=t0 + timedelta(hours=1),
+        normal_avg_ex=1.0, crafting_avg_ex=5.0, magic_avg_ex=320.0, gap_ex=315.0,
+        price_samples=[
+            PriceSample(kind="crafting", amount=2, currency="chaos"),  # Not in the snapshot
+            PriceSample(kind="magic", amount=1, currency="divine"),
+        ]
+    )
+    analysis.save()
+
+    report = reprice_history()
+    assert report['analyses_scanned'] == 1 and report['analyses_updated'] == 1
+
+    repriced = AnalysisResult.objects(id=analysis.id).first()
+    assert repriced.crafting_avg_ex == 5.0
+    assert repriced.magic_avg_ex == 100.0
+    assert repriced.gap_ex == 95.0
+
+
+def test_reprice_rollups_at_each_sample_time(db):
+    from backend.maintenance import compact_analyses
+
+    t0 = datetime(2024, 1, 1)
+    CurrencyRateSnapshot(rates={"exalted": 1.0, "divine": 100.0}, created_at=t0).save()
+    CurrencyRateSnapshot(rates={"exalted": 1.0, "divine": 200.0}, created_at=t0 + timedelta(hours=12)).save()
+    for hours in (1, 13):
+        AnalysisResult(
+            base_type="Bow", created_at=t0 + timedelta(hours=hours),
+            normal_avg_ex=1.0, magic_avg_ex=320.0, gap_ex=319.0,
+            price_samples=[PriceSample(kind="magic", amount=1, currency="divine")]
+        ).save()
+
+    compact_analyses(t0 + timedelta(days=40), retention_days=30)
+    rollup = AnalysisResult.objects.get()
+    assert rollup.compacted is True
+    assert [p.created_at for p in rollup.price_samples] == [t0 + timedelta(hours=1), t0 + timedelta(hours=13)]
+
+    report = reprice_history()
+    assert report['analyses_updated'] == 1
+    # 1 divine at 100 ex in the morning and at 200 ex in the afternoon, not both at the roll-up's time
+    assert AnalysisResult.objects.get().magic_avg_ex == 150.0
@@ -0,0 +1,44 @@
+import json
+from datetime import datetime
+
+import mongomock
+import pytest
+from mongoengine import connect, disconnect
+
+from backend.database import AnalysisResult, ItemAnalysis, Modifier, PriceSample, Bucket
+from backend.serialization import FastJSONProvider, serialize_analyses, serialize_item_analyses
+
+
+@pytest.fixture
+def db():
+    disconnect()
+    connect('mongoenginetest', mongo_client_class=mongomock.MongoClient)
+    AnalysisResult.objects.delete()
+    ItemAnalysis.objects.delete()
+    yield
+    disconnect()
+
+
+def test_wire_matches_to_dict(db):
+    AnalysisResult(
+        base_type='Expert Hunter Bow', normal_avg_ex=1.0, magic_avg_ex=5.0, gap_ex=4.0,
+        modifiers=[
+            Modifier(name='+# to Dexterity', tier='S1', mod_type='explicit', rarity='magic', price_ex=5.0),
+            Modifier(name='#% increased Attack Speed', tier='S2', mod_type='explicit', rarity='normal'),
+        ],
+        price_samples=[PriceSample(kind='magic', amount=1.0, currency='divine')],
+        repriced_at=datetime(2024, 1, 2, 3, 4, 5),
+        raw_data='{}'
+    ).save()
+    ItemAnalysis(base_type='Expert Hunter Bow', buckets=[Bucket(price_range='0-10', count=3, attributes={'a': 1})]).save()
+
+    assert serialize_analyses(AnalysisResult.objects) == [a.to_dict() for a in AnalysisResult.objects]
+    assert serialize_item_analyses(ItemAnalysis.objects) == [a.to_dict() for a in ItemAnalysis.objects]
+
+
+def test_provider_writes_iso_datetimes():
+    from flask import Flask
+    provider = FastJSONProvider(Flask(__name__))
+    when = datetime(2024, 1, 2, 3, 4, 5, 678000)
+    assert json.loads(provider.dumps_bytes({'at': when})) == {'at': when.isoformat()}
+    assert json.loads(provider.dumps({'at': when, 1: 'x'})) == {'at': when.isoformat(), '1': 'x'}
@@ -0,0 +1,99 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+import mongomock
+import pytest
+from mongoengine import connect, disconnect
+
+from backend import database
+from backend.server import app, create_app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Cold import of backend.server in a fresh interpreter, with MongoDB unreachable
+STARTUP_BUDGET_SECONDS = float(os.getenv('STARTUP_BUDGET_SECONDS', '3'))
+HEAVY_MODULES = ('numpy', 'requests', 'backend.price_analyzer', 'backend.trade_api', 'backend.query_analysis')
+
+# The report goes to a file: background threads (the database waiter) print to stdout concurrently
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import backend.server
+elapsed = time.perf_counter() - started
+with open(sys.argv[1], "w") as f:
+    json.dump({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}, f)
+""" % (HEAVY_MODULES,)
+
+
+def test_cold_start_is_fast_and_does_not_wait_for_mongo(tmp_path):
+    env = dict(os.environ, MONGODB_URI='mongodb://127.0.0.1:9/unreachable', MAINTENANCE_INTERVAL_HOURS='0',
+               CURRENCY_RATES_SOURCE='', PYTHONPATH=ROOT)
+    report_path = tmp_path / 'report.json'
+    out = subprocess.run([sys.executable, '-c', _PROBE, str(report_path)], cwd=ROOT, env=env,
+                         capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0, out.stderr
+    report = json.loads(report_path.read_text())
+    assert report['loaded'] == []
+    assert report['seconds'] < STARTUP_BUDGET_SECONDS
+
+
+def test_readiness_follows_database():
+    disconnect()
+    connect('mongoenginetest', mongo_client_class=mongomock.MongoClient)
+    try:
+        assert database.check_db()['ready']
+        response = app.test_client().get('/readyz')
+        assert response.status_code == 200 and response.get_json()['ready'] is True
+        assert app.test_client().get('/healthz').status_code == 200
+    finally:
+        disconnect()
+
+
+def test_create_app_returns_independent_apps():
+    other = create_app({'TESTING': True})
+    assert other is not app and other.config['TESTING']
+    assert {'/readyz', '/api/jobs/<job_id>'} <= {r.rule for r in other.url_map.iter_rules()}
+
+
+def test_client_options_from_env_and_settings(monkeypatch):
+    monkeypatch.setenv('MONGO_MAX_POOL_SIZE', '25')
+    monkeypatch.setenv('MONGO_WRITE_CONCERN', 'majority')
+    monkeypatch.setenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '3000')
+    options = database.mongo_client_options({'serverSelectionTimeoutMS': 500})
+    assert options == {'maxPoolSize': 25, 'w': 'majority', 'serverSelectionTimeoutMS': 500}
+
+    monkeypatch.setenv('MONGO_MAX_POOL_SIZE', 'lots')
+    with pytest.raises(ValueError, match='MONGO_MAX_POOL_SIZE'):
+        database.mongo_client_options()
+
+
+def test_pool_stats_track_checkouts():
+    stats = database.PoolStats()
+    address = ('db', 27017)
+    stats.connection_created(SimpleNamespace(address=address))
+    stats.connection_checked_out(SimpleNamespace(address=address, duration=0.02))
+    stats.connection_checked_out(SimpleNamespace(address=address, duration=0.04))
+    stats.connection_checked_in(SimpleNamespace(address=address))
+    stats.connection_check_out_failed(SimpleNamespace(address=address))
+
+    server = stats.snapshot()['db:27017']
+    assert server['open'] == 1 and server['in_use'] == 1
+    assert server['checkouts'] == 2 and server['checkout_failures'] == 1
+    assert server['wait_seconds_max'] == 0.04
+    assert server['wait_seconds_avg'] == pytest.approx(0.03)
+
+
+def test_readiness_fails_fast_when_mongo_is_unreachable():
+    disconnect()
+    try:
+        database.connect_db('mongodb://127.0.0.1:9/unreachable', {'serverSelectionTimeoutMS': 30000})
+        started = time.perf_counter()
+        response = app.test_client().get('/readyz')
+        assert response.status_code == 503
+        assert time.perf_counter() - started < 1
+        assert response.get_json()['database']['options']['serverSelectionTimeoutMS'] == 30000
+    finally:
+        disconnect()
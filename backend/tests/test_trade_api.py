@@ -76,3 +76,11 @@ def test_search_handles_429_retry():
         
         assert result["id"] == "query1"
         assert m.call_count == 2
+
+def test_fetch_wraps_list_responses():
+    api = TradeAPI()
+    listing = {"id": "item1", "listing": {"price": {"amount": 2, "currency": "chaos"}}}
+
+    with requests_mock.Mocker() as m:
+        m.get("https://www.pathofexile.com/api/trade2/fetch/item1?realm=poe2", json=[listing])
+        assert api.fetch(["item1"]) == {"result": [listing]}
@@ -139,3 +139,46 @@ def test_max_retries_on_502():
         
         # Should have tried 4 times
         assert m.call_count == 4
+
+
+def test_rate_budget_keeps_reserve_for_interactive():
+    """Bulk requests leave the interactive reserve untouched."""
+    from backend.trade_api import RateBudget
+
+    budget = RateBudget(rate=0.001, burst=4, interactive_reserve=0.5)
+    budget.acquire("batch")
+    budget.acquire("batch")
+    assert budget.tokens < 3
+
+    import threading
+    blocked = threading.Thread(target=budget.acquire, args=("batch",), daemon=True)
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive()  # Only the reserve is left
+
+    assert budget.acquire("interactive") < 0.1
+    assert budget.acquire("interactive") < 0.1
+
+
+def test_request_accounting_counts_retries_and_bytes():
+    """Every attempt, retry, 502 and its backoff is accounted to the active scope."""
+    from backend.trade_api import request_accounting
+
+    api = TradeAPI()
+    with requests_mock.Mocker() as m:
+        m.register_uri('POST', "https://www.pathofexile.com/api/trade2/search/poe2/Fate%20of%20the%20Vaal", [
+            {'json': {'error': 'Bad Gateway'}, 'status_code': 502},
+            {'json': {'result': ['item1'], 'id': 'query1'}, 'status_code': 200}
+        ])
+        import time
+        with pytest.MonkeyPatch().context() as mp:
+            mp.setattr(time, "sleep", lambda x: None)
+            with request_accounting() as outer:
+                with request_accounting() as inner:
+                    api.search({})
+
+    stats = inner.to_dict()
+    assert stats['searches'] == 1 and stats['requests'] == 2 and stats['retries'] == 1
+    assert stats['status_502'] == 1 and stats['backoff_seconds'] == 5
+    assert stats['bytes'] > 0
+    assert outer.to_dict() == stats
@@ -0,0 +1,108 @@
+import re
+
+import numpy as np
+import pytest
+import requests_mock
+
+from backend.price_analyzer import PriceAnalyzer
+from backend.trade_api import TradeAPI
+from backend.trade_replay import Cassette, ReplayMiss, ReplayTransport
+from backend.trade_standin import create_standin_app
+
+
+class FlatRates:
+    """Every currency is worth one Exalted."""
+
+    def normalize_batch(self, amounts, currencies):
+        return np.array([float(a) if c else 0.0 for a, c in zip(amounts, currencies)])
+
+
+def _listing(listing_id, amount):
+    return {
+        "id": listing_id,
+        "listing": {"price": {"amount": amount, "currency": "exalted"}},
+        "item": {
+            "rarity": "Magic",
+            "extended": {"mods": {"explicit": [
+                {"name": "Fleet", "tier": "P1", "magnitudes": [{"min": 10, "max": 15}]},
+                {"name": "of Skill", "tier": "S1", "magnitudes": [{"min": 8, "max": 12}]}
+            ]}},
+            "explicitMods": ["10% increased Movement Speed", "12% increased Attack Speed"]
+        }
+    }
+
+
+def _live_site(m):
+    searches = []
+
+    def search(request, context):
+        searches.append(request.json())
+        n = len(searches)
+        return {"id": f"q{n}", "result": [f"l{n}-{i}" for i in range(10)], "total": 10}
+
+    def fetch(request, context):
+        ids = request.path.rsplit("/", 1)[1].split(",")
+        return {"result": [_listing(i, 2.0 + int(i.split("-")[1])) for i in ids]}
+
+    m.post(re.compile(re.escape(TradeAPI.SEARCH_URL_BASE)), json=search,
+           headers={"X-Rate-Limit-Ip": "8:10:60", "X-Rate-Limit-Ip-State": "1:10:0"})
+    m.get(re.compile(re.escape(TradeAPI.FETCH_URL_BASE)), json=fetch)
+
+
+def test_recorded_analysis_replays_offline(tmp_path, monkeypatch):
+    monkeypatch.setattr("time.sleep", lambda s: None)
+    path = str(tmp_path / "gemini.jsonl.gz")
+
+    monkeypatch.setenv("TRADE_RECORD_PATH", path)
+    with requests_mock.Mocker() as m:
+        _live_site(m)
+        live = PriceAnalyzer(currency_service=FlatRates()).analyze_gap("Gemini Bow", session_id="secret")
+    monkeypatch.delenv("TRADE_RECORD_PATH")
+
+    cassette = Cassette.load(path)
+    assert len(cassette) == 6  # 3 searches + 3 fetches
+    assert cassette.exchanges[0]["headers"]["X-Rate-Limit-Ip"] == "8:10:60"
+    assert "secret" not in str(cassette.exchanges)
+
+    # No requests_mock active: any real request would fail
+    transport = ReplayTransport(cassette, strict=True)
+    monkeypatch.setattr("backend.trade_api.default_transport", lambda: transport)
+    replayed = PriceAnalyzer(currency_service=FlatRates()).analyze_gap("Gemini Bow")
+    assert replayed == live
+    assert transport.calls == 6 and transport.misses == 0
+
+
+def test_replay_serves_fetches_per_listing_and_reports_misses():
+    cassette = Cassette([{
+        "method": "GET", "path": "fetch/a,b", "params": {"realm": "poe2"}, "body": None,
+        "status": 200, "headers": {}, "response": {"result": [_listing("a", 1), _listing("b", 2)]}
+    }])
+    api = TradeAPI(transport=ReplayTransport(cassette))
+    assert [r["id"] for r in api.fetch(["b"])["result"]] == ["b"]
+
+    with pytest.raises(ReplayMiss):
+        TradeAPI(transport=ReplayTransport(cassette, strict=True)).search({"type": "Gemini Bow"})
+
+
+def test_standin_replays_with_rate_limit_and_injected_errors():
+    cassette = Cassette([{
+        "method": "POST", "path": "search/poe2/Fate of the Vaal", "params": {},
+        "body": {"query": {"type": "Gemini Bow"}, "sort": {"price": "asc"}},
+        "status": 200, "headers": {}, "response": {"id": "q1", "result": ["a"], "total": 1}
+    }])
+    body = {"query": {"type": "Gemini Bow"}, "sort": {"price": "asc"}}
+
+    client = create_standin_app(cassette, rate_limit="2:10:30").test_client()
+    first = client.post("/search/poe2/Fate%20of%20the%20Vaal", json=body)
+    assert first.status_code == 200 and first.get_json()["id"] == "q1"
+    assert first.headers["X-Rate-Limit-Ip"] == "2:10:30"
+    assert first.headers["X-Rate-Limit-Ip-State"] == "1:10:0"
+    client.post("/search/poe2/Fate%20of%20the%20Vaal", json=body)
+    limited = client.post("/search/poe2/Fate%20of%20the%20Vaal", json=body)
+    assert limited.status_code == 429 and limited.headers["Retry-After"] == "30"
+    assert client.post("/search/poe2/Fate%20of%20the%20Vaal", json={"query": {}}).status_code == 429
+
+    flaky = create_standin_app(cassette, p502=1.0, seed=1).test_client()
+    assert flaky.post("/search/poe2/Fate%20of%20the%20Vaal", json=body).status_code == 502
+    assert flaky.get("/_standin/stats").get_json()["injected_502"] == 1
+    assert create_standin_app(cassette).test_client().get("/fetch/zzz").status_code == 404
@@ -1,13 +1,196 @@
-import requests
+import os
+import threading
 import time
+from contextlib import contextmanager
+
+import requests
+
+from backend import metrics
+from backend.trade_json import decode_response
+
+DEFAULT_LEAGUE = "Fate of the Vaal"
+DEFAULT_BASE_URL = "https://www.pathofexile.com/api/trade2"
+
+
+class RateBudget:
+    """
+    Token bucket shared by every TradeAPI in the process: `rate` requests per
+    second with bursts of up to `burst`. The top `interactive_reserve` share of
+    the bucket can only be spent by interactive requests, and non-interactive
+    requests also wait while an interactive one is waiting, so bulk jobs cannot
+    starve the UI. rate <= 0 disables the budget.
+    """
+
+    def __init__(self, rate, burst, interactive_reserve=0.0):
+        self.rate = rate
+        self.capacity = max(1.0, float(burst))
+        self.reserve = self.capacity * min(max(interactive_reserve, 0.0), 1.0)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._interactive_waiting = 0
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority="interactive"):
+        """Take one request token, blocking until the priority class may spend one. Returns seconds waited."""
+        if self.rate <= 0:
+            return 0.0
+        interactive = priority == "interactive"
+        # Bulk work leaves the reserve untouched (at least one whole token of it)
+        floor = 1.0 if interactive else min(self.capacity, max(1.0, self.reserve + 1.0))
+        started = time.monotonic()
+        with self._cond:
+            if interactive:
+                self._interactive_waiting += 1
+            try:
+                while True:
+                    self._refill()
+                    if self.tokens >= floor and (interactive or not self._interactive_waiting):
+                        self.tokens -= 1.0
+                        return time.monotonic() - started
+                    self._cond.wait(max(0.01, (floor - self.tokens) / self.rate))
+            finally:
+                if interactive:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+
+
+_budget = None
+_budget_lock = threading.Lock()
+_context = threading.local()
+
+
+def get_rate_budget():
+    """Process-wide RateBudget configured from TRADE_RATE_PER_SECOND, TRADE_RATE_BURST and TRADE_INTERACTIVE_RESERVE."""
+    global _budget
+    if _budget is None:
+        with _budget_lock:
+            if _budget is None:
+                _budget = RateBudget(
+                    rate=float(os.getenv("TRADE_RATE_PER_SECOND", "1")),
+                    burst=float(os.getenv("TRADE_RATE_BURST", "10")),
+                    interactive_reserve=float(os.getenv("TRADE_INTERACTIVE_RESERVE", "0.3"))
+                )
+    return _budget
+
+
+def current_priority():
+    """Priority class of trade requests made on this thread (request threads are interactive)."""
+    return getattr(_context, "priority", "interactive")
+
+
+class RequestStats:
+    """
+    Trade request accounting for one scope (an analysis, a job): logical
+    searches/fetches, HTTP attempts, retries, 429/502 responses, bytes received,
+    and where the time went (rate-budget waits, network, JSON parsing, retry
+    backoff, politeness sleeps).
+    """
+
+    COUNTS = ("searches", "fetches", "requests", "retries", "status_429", "status_502", "errors", "bytes")
+    SECONDS = ("rate_wait_seconds", "network_seconds", "parse_seconds", "backoff_seconds", "sleep_seconds")
+
+    def __init__(self, initial=None):
+        for field in self.COUNTS + self.SECONDS:
+            setattr(self, field, 0)
+        if initial:
+            self.add(**{k: v for k, v in initial.items() if k in self.COUNTS + self.SECONDS})
+
+    def add(self, **deltas):
+        for field, value in deltas.items():
+            setattr(self, field, getattr(self, field) + (value or 0))
+
+    def to_dict(self):
+        data = {field: int(getattr(self, field)) for field in self.COUNTS}
+        data.update({field: round(getattr(self, field), 3) for field in self.SECONDS})
+        return data
+
+
+def _accounting_stack():
+    stack = getattr(_context, "accounting", None)
+    if stack is None:
+        stack = _context.accounting = []
+    return stack
+
+
+@contextmanager
+def request_accounting(stats=None):
+    """
+    Count trade requests made on this thread inside the block into `stats`
+    (a new RequestStats by default). Scopes nest: a job's totals include its analyses.
+    """
+    stats = stats if stats is not None else RequestStats()
+    stack = _accounting_stack()
+    stack.append(stats)
+    try:
+        yield stats
+    finally:
+        stack.remove(stats)
+
+
+def record(**deltas):
+    """Add to every active request_accounting scope on this thread."""
+    for stats in getattr(_context, "accounting", None) or ():
+        stats.add(**deltas)
+
+
+def pause(seconds):
+    """time.sleep for politeness delays, accounted as sleep_seconds."""
+    record(sleep_seconds=seconds)
+    time.sleep(seconds)
+
+
+@contextmanager
+def request_priority(priority):
+    """Charge trade requests made on this thread inside the block to `priority`."""
+    previous = current_priority()
+    _context.priority = priority
+    try:
+        yield
+    finally:
+        _context.priority = previous
+
+
+def http_transport(method, url, **kwargs):
+    """Default transport: a real HTTP request."""
+    return requests.request(method, url, **kwargs)
+
+
+def default_transport():
+    """
+    Transport for new TradeAPI instances: replays TRADE_REPLAY_PATH or records to
+    TRADE_RECORD_PATH when set (see backend/trade_replay.py), live HTTP otherwise.
+    """
+    replay_path = os.getenv("TRADE_REPLAY_PATH")
+    record_path = os.getenv("TRADE_RECORD_PATH")
+    if replay_path or record_path:
+        from backend.trade_replay import shared_transport
+        return shared_transport(replay_path=replay_path, record_path=record_path)
+    return http_transport
+
 
 class TradeAPI:
-    SEARCH_URL_BASE = "https://www.pathofexile.com/api/trade2/search/poe2/"
-    FETCH_URL_BASE = "https://www.pathofexile.com/api/trade2/fetch/"
+    # TRADE_API_BASE_URL points the client at another server, e.g. backend/trade_standin.py
+    BASE_URL = os.getenv("TRADE_API_BASE_URL", DEFAULT_BASE_URL).rstrip("/")
+    SEARCH_URL_BASE = f"{BASE_URL}/search/poe2/"
+    FETCH_URL_BASE = f"{BASE_URL}/fetch/"
     DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:146.0) Gecko/20100101 Firefox/146.0"
 
-    def __init__(self, session_id=None):
+    def __init__(self, session_id=None, base_url=None, transport=None):
+        """
+        transport(method, url, headers=..., **kwargs) returns a requests-style response;
+        defaults to default_transport().
+        """
         self.session_id = session_id
+        if base_url:
+            base_url = base_url.rstrip("/")
+            self.SEARCH_URL_BASE = f"{base_url}/search/poe2/"
+            self.FETCH_URL_BASE = f"{base_url}/fetch/"
+        self.transport = transport or default_transport()
         self.headers = {
             "User-Agent": self.DEFAULT_USER_AGENT,
             "Accept": "application/json",
@@ -17,13 +200,30 @@ class TradeAPI:
             self.headers["Cookie"] = f"POESESSID={self.session_id}"
 
     def _request(self, method, url, **kwargs):
+        """Send with retries on 429/502; returns the decoded JSON (orjson when installed, see trade_json)."""
         max_retries = 4  # 4 total attempts (3 retries + 1 initial)
         retry_delay_429 = 2  # Base delay for 429 (rate limit)
         retry_delay_502 = 5  # Base delay for 502 (server error)
         last_response = None
 
+        endpoint = "search" if method.upper() == "POST" else "fetch"
+
         for attempt in range(max_retries):
-            response = requests.request(method, url, headers=self.headers, **kwargs)
+            priority = current_priority()
+            waited = get_rate_budget().acquire(priority)
+            metrics.TRADE_RATE_WAIT.observe(waited, priority=priority)
+            started = time.perf_counter()
+            response = self.transport(method, url, headers=self.headers, **kwargs)
+            elapsed = time.perf_counter() - started
+            metrics.TRADE_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+            metrics.TRADE_REQUEST_DURATION.observe(elapsed, endpoint=endpoint, status=response.status_code)
+            record(
+                requests=1,
+                retries=1 if attempt else 0,
+                rate_wait_seconds=waited,
+                network_seconds=elapsed,
+                bytes=len(response.content or b"")
+            )
             last_response = response
             
             if response.status_code == 429:
@@ -36,23 +236,31 @@ class TradeAPI:
                         pass
                 
                 print(f"Rate limited (429). Waiting {wait_time}s before retry {attempt + 1}/{max_retries}...")
+                record(status_429=1, backoff_seconds=wait_time)
                 time.sleep(wait_time)
                 continue
             
             if response.status_code == 502:
                 wait_time = retry_delay_502 * (2 ** attempt)
                 print(f"502 Bad Gateway from GGG server. Waiting {wait_time}s before retry {attempt + 1}/{max_retries}...")
+                record(status_502=1, backoff_seconds=wait_time)
                 time.sleep(wait_time)
                 continue
             
+            if response.status_code >= 400:
+                record(errors=1)
             response.raise_for_status()
-            return response.json()
+            started = time.perf_counter()
+            data = decode_response(response)
+            record(parse_seconds=time.perf_counter() - started)
+            return data
         
         if last_response is not None:
+            record(errors=1)
             last_response.raise_for_status()
         raise Exception("Request failed after maximum retries")
 
-    def search(self, query, league="Fate of the Vaal"):
+    def search(self, query, league=DEFAULT_LEAGUE):
         import urllib.parse
         encoded_league = urllib.parse.quote(league)
         url = f"{self.SEARCH_URL_BASE}{encoded_league}"
@@ -64,6 +272,7 @@ class TradeAPI:
             "query": query,
             "sort": sort
         }
+        record(searches=1)
         response = self._request("POST", url, json=payload)
         
         if isinstance(response, list):
@@ -80,6 +289,7 @@ class TradeAPI:
         if query_id:
             params["query"] = query_id
             
+        record(fetches=1)
         response = self._request("GET", url, params=params)
         
         if isinstance(response, list):
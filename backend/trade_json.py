@@ -0,0 +1,27 @@
+"""
+Decoding of trade API responses.
+
+decode_response() parses a response body with orjson when it is installed (the
+stdlib json module otherwise); this is the hot path for every trade request.
+Listings are kept as decoded: reducing them to the fields the analyzer reads
+took a Python walk per listing that cost more than the decode itself (see the
+fetch_decode benchmark), so there is no projection step.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # Optional: stdlib json
+    orjson = None
+
+
+def loads(content):
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def decode_response(response):
+    """JSON body of a requests-style response."""
+    content = response.content
+    return loads(content) if content else response.json()
@@ -0,0 +1,237 @@
+"""
+Record/replay transports for TradeAPI, for offline end-to-end runs and benchmarks.
+
+A cassette is a gzip-compressed JSON-lines file with one trade exchange per line:
+
+    {"method": "POST", "path": "search/poe2/Fate of the Vaal", "params": {},
+     "body": {...}, "status": 200, "headers": {...}, "response": {...}, "elapsed_ms": 84.2}
+
+Paths are relative to the trade API base URL, so a cassette recorded against the
+live site replays unchanged through ReplayTransport or the stand-in server
+(backend/trade_standin.py). Session cookies are never written.
+
+- RecordingTransport(path) performs real requests and appends each exchange.
+- ReplayTransport(cassette) answers from a cassette. Repeated identical requests
+  get the recorded responses in order (the last one repeats). Fetches are also
+  answered per listing id, so a different fetch batching still replays.
+
+TRADE_RECORD_PATH / TRADE_REPLAY_PATH switch every new TradeAPI to these
+transports (see trade_api.default_transport).
+"""
+import gzip
+import json
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Response headers worth keeping: retry hints and the trade site's rate-limit state
+RECORDED_HEADERS = (
+    "Retry-After",
+    "X-Rate-Limit-Policy",
+    "X-Rate-Limit-Rules",
+    "X-Rate-Limit-Ip",
+    "X-Rate-Limit-Ip-State",
+    "X-Rate-Limit-Account",
+    "X-Rate-Limit-Account-State",
+)
+
+
+class ReplayMiss(LookupError):
+    """A strict ReplayTransport was asked for an exchange the cassette does not have."""
+
+
+def split_url(url, params=None):
+    """(path relative to the trade API base, merged query params) for a request URL."""
+    parsed = urllib.parse.urlsplit(url)
+    path = urllib.parse.unquote(parsed.path)
+    for marker in ("/search/", "/fetch/"):
+        idx = path.find(marker)
+        if idx != -1:
+            path = path[idx + 1:]
+            break
+    else:
+        path = path.lstrip("/")
+    merged = dict(urllib.parse.parse_qsl(parsed.query))
+    merged.update({k: str(v) for k, v in (params or {}).items() if v is not None})
+    return path, merged
+
+
+def exchange_key(method, path, params, body):
+    return json.dumps([method.upper(), path, sorted(params.items()), body], sort_keys=True, separators=(",", ":"))
+
+
+class ReplayResponse:
+    """The subset of requests.Response that TradeAPI uses."""
+
+    def __init__(self, status_code, payload=None, headers=None, url=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.url = url
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return json.dumps(self._payload) if self._payload is not None else ""
+
+    @property
+    def content(self):
+        return self.text.encode("utf-8")
+
+    def json(self):
+        if self._payload is None:
+            raise ValueError("No JSON body")
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error (replayed) for url: {self.url}", response=self)
+
+
+class Cassette:
+    def __init__(self, exchanges=None):
+        self.exchanges = []
+        self._by_key = {}
+        self._cursor = {}
+        self._listings = {}  # listing id -> fetch result entry
+        self._lock = threading.Lock()
+        for exchange in exchanges or []:
+            self.add(exchange)
+
+    @classmethod
+    def load(cls, path):
+        exchanges = []
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    exchanges.append(json.loads(line))
+        return cls(exchanges)
+
+    def save(self, path):
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            for exchange in self.exchanges:
+                f.write(json.dumps(exchange, separators=(",", ":")) + "\n")
+
+    def add(self, exchange):
+        self.exchanges.append(exchange)
+        key = exchange_key(exchange["method"], exchange["path"], exchange.get("params") or {}, exchange.get("body"))
+        self._by_key.setdefault(key, []).append(exchange)
+        response = exchange.get("response")
+        if exchange["path"].startswith("fetch/") and exchange.get("status") == 200 and isinstance(response, dict):
+            for entry in response.get("result") or []:
+                if isinstance(entry, dict) and entry.get("id"):
+                    self._listings[entry["id"]] = entry
+
+    def __len__(self):
+        return len(self.exchanges)
+
+    def respond(self, method, path, params=None, body=None):
+        """(status, headers, payload) recorded for a request, or None if the cassette does not have it."""
+        params = params or {}
+        key = exchange_key(method, path, params, body)
+        with self._lock:
+            recorded = self._by_key.get(key)
+            if recorded:
+                idx = self._cursor.get(key, 0)
+                self._cursor[key] = idx + 1
+                exchange = recorded[min(idx, len(recorded) - 1)]
+                return exchange.get("status", 200), exchange.get("headers") or {}, exchange.get("response")
+
+        if method.upper() == "GET" and path.startswith("fetch/"):
+            ids = [i for i in path[len("fetch/"):].split(",") if i]
+            if ids and all(i in self._listings for i in ids):
+                return 200, {}, {"result": [self._listings[i] for i in ids]}
+        return None
+
+    def reset(self):
+        """Replay repeated requests from their first recorded response again."""
+        with self._lock:
+            self._cursor.clear()
+
+
+class RecordingTransport:
+    """Performs requests through `transport` (live HTTP by default) and appends each exchange to a cassette file."""
+
+    def __init__(self, path, transport=None):
+        from backend.trade_api import http_transport
+
+        self.path = path
+        self.transport = transport or http_transport
+        self._lock = threading.Lock()
+
+    def __call__(self, method, url, **kwargs):
+        started = time.perf_counter()
+        response = self.transport(method, url, **kwargs)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        path, merged = split_url(url, kwargs.get("params"))
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = None
+        exchange = {
+            "method": method.upper(),
+            "path": path,
+            "params": merged,
+            "body": kwargs.get("json"),
+            "status": response.status_code,
+            "headers": {h: response.headers[h] for h in RECORDED_HEADERS if h in response.headers},
+            "response": payload,
+            "elapsed_ms": round(elapsed_ms, 1),
+        }
+        line = json.dumps(exchange, separators=(",", ":")) + "\n"
+        with self._lock:
+            # Each write is its own gzip member; readers see them as one stream
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+        return response
+
+
+class ReplayTransport:
+    """
+    Answers TradeAPI requests from a cassette without network access.
+    latency (seconds) is slept per request; a request the cassette does not have
+    gets a 404 response, or raises ReplayMiss when strict.
+    """
+
+    def __init__(self, cassette, latency=0.0, strict=False):
+        self.cassette = cassette if isinstance(cassette, Cassette) else Cassette.load(cassette)
+        self.latency = latency
+        self.strict = strict
+        self.calls = 0
+        self.misses = 0
+
+    def __call__(self, method, url, **kwargs):
+        path, merged = split_url(url, kwargs.get("params"))
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        recorded = self.cassette.respond(method, path, merged, kwargs.get("json"))
+        if recorded is None:
+            self.misses += 1
+            if self.strict:
+                raise ReplayMiss(f"No recorded exchange for {method.upper()} {path}")
+            return ReplayResponse(404, {"error": {"code": 404, "message": "Not recorded"}}, url=url)
+        status, response_headers, payload = recorded
+        return ReplayResponse(status, payload, response_headers, url=url)
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_transport(replay_path=None, record_path=None):
+    """Process-wide transport for TRADE_REPLAY_PATH / TRADE_RECORD_PATH (replay wins if both are set)."""
+    key = (replay_path, None if replay_path else record_path)
+    with _shared_lock:
+        transport = _shared.get(key)
+        if transport is None:
+            transport = ReplayTransport(replay_path) if replay_path else RecordingTransport(record_path)
+            _shared[key] = transport
+    return transport
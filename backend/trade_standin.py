@@ -0,0 +1,145 @@
+"""
+Local stand-in for the trade API that replays a recorded cassette (see
+backend/trade_replay.py), with configurable latency, injected 429/502 errors
+and the trade site's rate-limit headers.
+
+    python -m backend.trade_standin backend/fixtures/trade/benchmark.jsonl.gz --port 8765 \\
+        --latency-ms 80 --p429 0.02 --p502 0.01 --rate-limit 8:10:60,15:60:120 --seed 1
+
+then point the backend at it with TRADE_API_BASE_URL=http://127.0.0.1:8765.
+"""
+import argparse
+import random
+import threading
+import time
+from collections import deque
+
+from flask import Flask, jsonify, request
+
+from backend.trade_replay import Cassette
+
+
+def parse_rules(spec):
+    """'hits:period:penalty,...' (the X-Rate-Limit-Ip format) -> [(hits, period, penalty)]."""
+    rules = []
+    for part in (spec or "").split(","):
+        if part.strip():
+            hits, period, penalty = (int(x) for x in part.split(":"))
+            rules.append((hits, period, penalty))
+    return rules
+
+
+class RateLimiter:
+    """Sliding-window limiter that reports its state like the trade site does."""
+
+    def __init__(self, rules):
+        self.rules = rules
+        self._hits = [deque() for _ in rules]
+        self._restricted_until = [0.0 for _ in rules]
+        self._lock = threading.Lock()
+
+    def hit(self, now=None):
+        """Count a request. Returns (retry_after_seconds or None, headers)."""
+        now = time.monotonic() if now is None else now
+        retry_after = None
+        with self._lock:
+            for i, (hits, period, penalty) in enumerate(self.rules):
+                window = self._hits[i]
+                while window and window[0] <= now - period:
+                    window.popleft()
+                if self._restricted_until[i] > now:
+                    retry_after = max(retry_after or 0, self._restricted_until[i] - now)
+                    continue
+                window.append(now)
+                if len(window) > hits:
+                    self._restricted_until[i] = now + penalty
+                    retry_after = max(retry_after or 0, penalty)
+            headers = self.headers(now)
+        return retry_after, headers
+
+    def headers(self, now):
+        if not self.rules:
+            return {}
+        state = ",".join(
+            f"{len(self._hits[i])}:{period}:{max(0, int(round(self._restricted_until[i] - now)))}"
+            for i, (_, period, _) in enumerate(self.rules)
+        )
+        return {
+            "X-Rate-Limit-Policy": "trade-search-request-limit",
+            "X-Rate-Limit-Rules": "Ip",
+            "X-Rate-Limit-Ip": ",".join(f"{h}:{p}:{t}" for h, p, t in self.rules),
+            "X-Rate-Limit-Ip-State": state,
+        }
+
+
+def create_standin_app(cassette, latency_ms=0.0, p429=0.0, p502=0.0, rate_limit=None, seed=None):
+    """Flask app serving /search/poe2/<league> and /fetch/<ids> from a cassette (path or Cassette)."""
+    if not isinstance(cassette, Cassette):
+        cassette = Cassette.load(cassette)
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    limiter = RateLimiter(parse_rules(rate_limit))
+    app = Flask(__name__)
+    app.config["stats"] = stats = {"requests": 0, "injected_429": 0, "injected_502": 0, "limited": 0, "misses": 0}
+
+    def respond(method, path, params, body):
+        stats["requests"] += 1
+        if latency_ms:
+            time.sleep(latency_ms / 1000.0)
+
+        retry_after, limit_headers = limiter.hit()
+        if retry_after is not None:
+            stats["limited"] += 1
+            headers = {**limit_headers, "Retry-After": str(int(retry_after + 0.999))}
+            return jsonify({"error": {"code": 3, "message": "Rate limit exceeded"}}), 429, headers
+
+        with rng_lock:
+            roll = rng.random()
+        if roll < p429:
+            stats["injected_429"] += 1
+            return jsonify({"error": {"code": 3, "message": "Rate limit exceeded"}}), 429, {**limit_headers, "Retry-After": "1"}
+        if roll < p429 + p502:
+            stats["injected_502"] += 1
+            return "Bad Gateway", 502, limit_headers
+
+        recorded = cassette.respond(method, path, params, body)
+        if recorded is None:
+            stats["misses"] += 1
+            return jsonify({"error": {"code": 404, "message": "Not recorded"}}), 404, limit_headers
+        status, headers, payload = recorded
+        return jsonify(payload), status, {**headers, **limit_headers}
+
+    @app.route("/search/poe2/<path:league>", methods=["POST"])
+    def search(league):
+        return respond("POST", f"search/poe2/{league}", request.args.to_dict(), request.get_json(silent=True))
+
+    @app.route("/fetch/<ids>", methods=["GET"])
+    def fetch(ids):
+        return respond("GET", f"fetch/{ids}", request.args.to_dict(), None)
+
+    @app.route("/_standin/stats", methods=["GET"])
+    def standin_stats():
+        return jsonify(stats)
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded trade API cassette over HTTP")
+    parser.add_argument("cassette", help="gzip JSON-lines cassette written by RecordingTransport")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added latency per request")
+    parser.add_argument("--p429", type=float, default=0.0, help="Probability of an injected 429")
+    parser.add_argument("--p502", type=float, default=0.0, help="Probability of an injected 502")
+    parser.add_argument("--rate-limit", default=None, help="Rules as hits:period:penalty[,...], e.g. 8:10:60,15:60:120")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for error injection")
+    args = parser.parse_args(argv)
+
+    app = create_standin_app(args.cassette, args.latency_ms, args.p429, args.p502, args.rate_limit, args.seed)
+    print(f"Trade API stand-in on http://{args.host}:{args.port} (set TRADE_API_BASE_URL to use it)")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
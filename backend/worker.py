@@ -0,0 +1,49 @@
+"""
+Standalone analysis job worker for JOB_MODE=worker deployments.
+
+Runs JOB_WORKERS job threads that claim queued jobs from MongoDB, so analyses
+never compete with the web workers for request threads. Several worker
+processes can run side by side; each job is claimed by exactly one of them.
+
+    python -m backend.worker
+"""
+import os
+import signal
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def main():
+    from backend.currency_service import init_currency_service
+    from backend.database import connect_db
+    from backend.jobs import get_job_worker, JOB_WORKERS
+
+    # Before connect() so Mongo commands are timed
+    metrics_port = os.getenv('METRICS_PORT')
+    if metrics_port:
+        from backend.metrics import serve_metrics
+        serve_metrics(int(metrics_port))
+        print(f"Metrics on :{metrics_port}/metrics")
+
+    # Pool/timeout options from MONGO_* (see backend.database.MONGO_CLIENT_OPTIONS); size the pool for JOB_WORKERS
+    connect_db(os.getenv('MONGODB_URI'), wait=True)
+    init_currency_service()
+
+    worker = get_job_worker()
+
+    def handle_term(signum, frame):
+        # Drain on SIGTERM (docker stop / orchestrators) the same way as on Ctrl+C
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, handle_term)
+    print(f"Job worker started with {JOB_WORKERS} thread(s)")
+    worker.run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,11 @@
 import React, { useState, useEffect } from 'react';
 import { Link, useLocation } from 'react-router-dom';
 import type { Data } from '../types';
+import { getAnalysisStatus } from '../services/analysis';
+
+// Opt-in NDJSON streaming of analysis jobs; polling is the default
+const STREAM_ANALYSIS = import.meta.env.VITE_ANALYZE_STREAM === 'true';
+const JOB_POLL_MS = 1500;
 
 interface Props {
   data: Data | null;
@@ -20,6 +25,8 @@ export const Sidebar: React.FC<Props> = ({ data, activeType, onSelect, onDataRef
   const [queryInput, setQueryInput] = useState('');
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const [analyzeLimit, setAnalyzeLimit] = useState(100);
+  const [progress, setProgress] = useState<{ done: number; total: number } | null>(null);
   
   const [savedSearches, setSavedSearches] = useState<SavedSearch[]>([]);
   const [saveName, setSaveName] = useState('');
@@ -52,11 +59,18 @@ export const Sidebar: React.FC<Props> = ({ data, activeType, onSelect, onDataRef
     setError(null);
     setShowSaveInput(false);
     
+    setProgress(null);
+    
     try {
-      const response = await fetch('/analyze', {
+      // The analysis runs as a background job: 202 with its ID, then poll /api/jobs/<id>.
+      // VITE_ANALYZE_STREAM=true streams NDJSON instead, holding a server request open for the whole job.
+      const response = await fetch(STREAM_ANALYSIS ? '/analyze?stream=true' : '/analyze', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ query_text: queryInput }),
+        headers: {
+          'Content-Type': 'application/json',
+          'Accept': STREAM_ANALYSIS ? 'application/x-ndjson' : 'application/json',
+        },
+        body: JSON.stringify({ query_text: queryInput, limit: analyzeLimit }),
       });
 
       if (!response.ok) {
@@ -64,14 +78,64 @@ export const Sidebar: React.FC<Props> = ({ data, activeType, onSelect, onDataRef
         throw new Error(errData.error || 'Analysis failed');
       }
 
-      const newData = await response.json();
-      if (onDataRefresh) {
-        onDataRefresh(newData);
+      if (STREAM_ANALYSIS && response.body) {
+        await readAnalysisStream(response.body);
+      } else {
+        const { job_id } = await response.json();
+        await pollAnalysisJob(job_id);
       }
     } catch (err) {
       setError(err instanceof Error ? err.message : 'An unknown error occurred');
     } finally {
       setLoading(false);
+      setProgress(null);
+    }
+  };
+
+  const pollAnalysisJob = async (jobId: string) => {
+    let partialSeq = 0;
+    for (;;) {
+      const job = await getAnalysisStatus(jobId);
+      setProgress({ done: job.progress, total: job.total });
+      if (job.status === 'completed') {
+        if (onDataRefresh && job.results.length > 0) onDataRefresh(job.results[0] as unknown as Data);
+        return;
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Analysis failed');
+      }
+      const stats = job.partial?.stats;
+      if (onDataRefresh && stats && (job.partial_seq ?? 0) > partialSeq) {
+        partialSeq = job.partial_seq ?? 0;
+        onDataRefresh(stats);
+      }
+      await new Promise(resolve => setTimeout(resolve, JOB_POLL_MS));
+    }
+  };
+
+  const readAnalysisStream = async (body: ReadableStream<Uint8Array>) => {
+    const reader = body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop() ?? '';
+      for (const line of lines) {
+        if (!line.trim()) continue;
+        const event = JSON.parse(line);
+        if (event.event === 'progress') {
+          setProgress({ done: event.progress, total: event.total });
+        } else if (event.event === 'partial' && onDataRefresh) {
+          onDataRefresh(event.data.stats);
+        } else if (event.event === 'result' && onDataRefresh) {
+          onDataRefresh(event.result);
+        } else if (event.event === 'end' && event.status !== 'completed') {
+          throw new Error(event.error || 'Analysis failed');
+        }
+      }
     }
   };
 
@@ -133,6 +197,18 @@ export const Sidebar: React.FC<Props> = ({ data, activeType, onSelect, onDataRef
           value={queryInput}
           onChange={(e) => setQueryInput(e.target.value)}
         />
+        <div className="flex items-center gap-2 mb-2">
+          <label className="text-[10px] text-gray-400 uppercase font-bold">Listings</label>
+          <input
+            type="number"
+            min={10}
+            max={5000}
+            step={100}
+            className="flex-1 bg-black/40 border border-poe-border/30 rounded p-1 text-xs text-gray-300 focus:border-poe-gold focus:outline-none"
+            value={analyzeLimit}
+            onChange={(e) => setAnalyzeLimit(Number(e.target.value) || 100)}
+          />
+        </div>
         <button 
           onClick={handleAnalyze}
           disabled={loading || !queryInput}
@@ -142,7 +218,7 @@ export const Sidebar: React.FC<Props> = ({ data, activeType, onSelect, onDataRef
               : 'bg-poe-red/20 text-poe-red hover:bg-poe-red hover:text-white border border-poe-red/30'
             }`}
         >
-          {loading ? 'Analyzing...' : 'Analyze'}
+          {loading ? (progress ? `Analyzing ${progress.done}/${progress.total}...` : 'Analyzing...') : 'Analyze'}
         </button>
         
         {/* Save Button */}
@@ -88,6 +88,8 @@ export interface JobResponse {
   total: number;
   current_item: string | null;
   results: BatchResult[] | ItemAnalysis[];
+  partial?: { items_analyzed?: number; stats?: Data } | null;
+  partial_seq?: number;
   error: string | null;
   created_at: string;
 }
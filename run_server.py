@@ -2,8 +2,17 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from backend.server import app
+
+def run_production():
+    """Serve with gunicorn (see backend/gunicorn.conf.py) instead of the Flask dev server."""
+    config = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend", "gunicorn.conf.py")
+    os.execvp("gunicorn", ["gunicorn", "-c", config, "backend.server:app"])
+
 
 if __name__ == "__main__":
-    print("Starting server on port 5000...")
-    app.run(debug=True, port=5000)
+    if "--production" in sys.argv or os.getenv("SERVER_MODE") == "production":
+        run_production()
+
+    from backend.server import app
+    print("Starting development server on port 5000 (use --production for gunicorn)...")
+    app.run(debug=True, port=5000, threaded=True)
@@ -0,0 +1,33 @@
+import os
+import sys
+import argparse
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from mongoengine import connect
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.repricing import reprice_history
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-price stored analyses against historical currency snapshots.")
+    parser.add_argument("--base-type", help="Only re-price this base type")
+    parser.add_argument("--since-days", type=float, help="Only re-price the last N days")
+    parser.add_argument("--dry-run", action="store_true", help="Report changes without writing")
+    args = parser.parse_args()
+
+    load_dotenv()
+    uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/poe2_trade')
+    print(f"Connecting to MongoDB at: {uri}")
+    connect(host=uri)
+
+    since = datetime.utcnow() - timedelta(days=args.since_days) if args.since_days else None
+    report = reprice_history(base_type=args.base_type, since=since, dry_run=args.dry_run)
+    for key, value in report.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()